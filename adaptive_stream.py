@@ -0,0 +1,139 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from frame_bus import EncodedFrame
+
+# Quality ladder for adaptive MJPEG. Level 0 is the capture branch's own
+# JPEG, passed through untouched; lower levels are encoded at the same size
+# from the camera's full-size raw tap, so they cost no decode and a level
+# change never changes the frame size.
+QUALITY_LEVELS = [None, 70, 50, 30]
+FPS_STEPS = [30, 15, 10, 5]
+
+# Rough size of each level relative to level 0, used until measured
+LEVEL_SIZE_RATIO = [1.0, 0.6, 0.4, 0.25]
+
+
+class LevelEncoder:
+    """
+    Encodes raw frames at a given JPEG quality at most once per frame.
+    Clients on the same level await the same future, so N clients on a level
+    cost one encode; encodes run off the event loop.
+    """
+
+    def __init__(self, max_workers=2, histogram=None):
+        self.histogram = histogram
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="level-encoder")
+        self._futures = {}  # (seq, quality) -> concurrent.futures.Future
+        self._seq = 0
+        self.encodes = 0
+
+    def _encode(self, array, quality, pts, arrival):
+        started = time.perf_counter()
+        ret, buffer = cv2.imencode('.jpg', array, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ret:
+            raise ValueError(f"JPEG encode failed at quality {quality}")
+        if self.histogram is not None:
+            self.histogram.observe(time.perf_counter() - started)
+        self.encodes += 1
+        return EncodedFrame(buffer, pts, arrival)
+
+    async def get(self, seq, raw_frame, quality):
+        if seq != self._seq:
+            # Only the newest frame is worth keeping
+            self._seq = seq
+            self._futures = {}
+        key = (seq, quality)
+        future = self._futures.get(key)
+        if future is None:
+            future = self._executor.submit(
+                self._encode, raw_frame.array, quality, raw_frame.pts, raw_frame.timestamp
+            )
+            self._futures[key] = future
+        return await asyncio.wrap_future(future)
+
+
+class AdaptiveController:
+    """
+    Picks a quality level and frame rate for one client so a frame drains
+    within target_latency. The drain rate is measured from how long each
+    send takes; the controller steps down at once and steps up only after
+    a run of comfortable sends.
+    """
+
+    def __init__(self, target_latency=0.15, headroom=0.8, upgrade_after=30):
+        self.target_latency = target_latency
+        self.headroom = headroom
+        self.upgrade_after = upgrade_after
+        self.level = 0
+        self.fps = FPS_STEPS[0]
+        self.drain_rate = None  # bytes/s, EWMA
+        self.frame_sizes = {}  # level -> bytes, EWMA
+        self._good_sends = 0
+
+    def _ewma(self, old, new, alpha=0.3):
+        return new if old is None else old + alpha * (new - old)
+
+    def _estimated_size(self, level):
+        if level in self.frame_sizes:
+            return self.frame_sizes[level]
+        base = self.frame_sizes.get(0)
+        if base is None:
+            known_level, known_size = next(iter(self.frame_sizes.items()))
+            base = known_size / LEVEL_SIZE_RATIO[known_level]
+        return base * LEVEL_SIZE_RATIO[level]
+
+    def record(self, level, size, send_time):
+        self.frame_sizes[level] = self._ewma(self.frame_sizes.get(level), size)
+        # Sends that complete instantly only went to the kernel buffer
+        self.drain_rate = self._ewma(self.drain_rate, size / max(send_time, 0.001))
+        self._choose(send_time)
+
+    def _choose(self, send_time):
+        budget = self.drain_rate * self.headroom
+        best_level = len(QUALITY_LEVELS) - 1
+        for level in range(len(QUALITY_LEVELS)):
+            if self._estimated_size(level) / budget <= self.target_latency:
+                best_level = level
+                break
+        size = self._estimated_size(best_level)
+        best_fps = FPS_STEPS[-1]
+        for fps in FPS_STEPS:
+            if size * fps <= budget:
+                best_fps = fps
+                break
+
+        better = (best_level, -best_fps) < (self.level, -self.fps)
+        if not better:
+            self._good_sends = 0
+            self.level, self.fps = best_level, best_fps
+        elif send_time <= self.target_latency:
+            self._good_sends += 1
+            if self._good_sends >= self.upgrade_after:
+                self._good_sends = 0
+                self.level, self.fps = best_level, best_fps
+
+    @property
+    def quality(self):
+        return QUALITY_LEVELS[self.level]
+
+
+class BandwidthMeter:
+    """Bytes per second over a sliding one-second window."""
+
+    def __init__(self):
+        self.window_start = time.monotonic()
+        self.window_bytes = 0
+        self.bytes_per_second = 0.0
+
+    def add(self, size):
+        self.window_bytes += size
+        elapsed = time.monotonic() - self.window_start
+        if elapsed >= 1.0:
+            self.bytes_per_second = self.window_bytes / elapsed
+            self.window_bytes = 0
+            self.window_start = time.monotonic()
+
@@ -0,0 +1,54 @@
+import sys
+import time
+
+from metrics import StageMetrics, render
+
+# Measures what the per-stage instrumentation costs per frame. A frame passes
+# through roughly eight observations (one per histogram plus the
+# frames_received counter), each with its own clock read.
+
+FRAME_TIME = 1 / 30
+OBSERVATIONS_PER_FRAME = 8
+BUDGET = 0.01  # instrumentation must stay under 1% of frame time
+
+
+def time_observations(metrics, iterations=200000):
+    histograms = [
+        metrics.capture, metrics.queue_wait, metrics.raw_convert,
+        metrics.tracker, metrics.encode, metrics.socket_write, metrics.end_to_end,
+    ]
+    started = time.perf_counter()
+    for i in range(iterations):
+        stamp = time.monotonic()
+        histograms[i % len(histograms)].observe(time.monotonic() - stamp)
+    histogram_cost = (time.perf_counter() - started) / iterations
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        metrics.frames_received.inc()
+    counter_cost = (time.perf_counter() - started) / iterations
+    return histogram_cost, counter_cost
+
+
+def main():
+    metrics = StageMetrics()
+    histogram_cost, counter_cost = time_observations(metrics)
+    per_frame = histogram_cost * (OBSERVATIONS_PER_FRAME - 1) + counter_cost
+    share = per_frame / FRAME_TIME
+
+    started = time.perf_counter()
+    body = render(metrics)
+    render_time = time.perf_counter() - started
+
+    print(f"Histogram observe: {histogram_cost * 1e6:.2f} us (including clock reads)")
+    print(f"Counter inc:       {counter_cost * 1e6:.2f} us")
+    print(f"Per frame:         {per_frame * 1e6:.2f} us = {share * 100:.3f}% of a 30 fps frame")
+    print(f"/metrics render:   {render_time * 1000:.2f} ms, {len(body)} bytes")
+
+    ok = share < BUDGET
+    print(f"Instrumentation overhead: {'✓ Success' if ok else '✗ Failed'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
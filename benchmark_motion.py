@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+from gstreamer_camera import GStreamerCamera
+
+# Bandwidth and CPU saved by motion-gated encoding. A live videotestsrc
+# alternates between a static pattern and the moving ball, once with
+# gating off and once with it on, while one viewer takes every encoded
+# frame. Reports frames and bytes encoded per phase, process CPU, and how
+# long after the scene starts moving the detector fires and full rate
+# resumes.
+
+SOURCE = "videotestsrc is-live=true pattern=ball name=scene"
+
+
+class Viewer:
+    """Counts encoded frames and bytes from the camera's main bus on a thread."""
+
+    def __init__(self, camera):
+        self.bus = camera.frame_bus
+        self.frames = 0
+        self.bytes = 0
+        self.arrivals = []
+        self.running = True
+        self.bus.subscribe()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        seq, _ = self.bus.latest()
+        while self.running:
+            seq, frame = self.bus.wait_for_frame(seq, timeout=1.0)
+            if frame is None:
+                continue
+            self.frames += 1
+            self.bytes += len(frame)
+            self.arrivals.append(time.monotonic())
+
+    def stop(self):
+        self.running = False
+        self._thread.join(timeout=2)
+        self.bus.unsubscribe()
+
+
+def set_pattern(camera, pattern):
+    source = camera.pipeline.get_by_name("scene")
+    Gst.util_set_object_arg(source, "pattern", pattern)
+
+
+def resume_latency(viewer, switched, interval):
+    """Seconds from switched until frames arrive at better than twice interval again."""
+    arrivals = [t for t in viewer.arrivals if t >= switched]
+    for earlier, later in zip(arrivals, arrivals[1:]):
+        if later - earlier < interval * 2:
+            return earlier - switched
+    return None
+
+
+def run(camera, gating, args):
+    camera.set_motion_settings(gating=gating, keepalive_interval=args.keepalive)
+    events = camera.motion.events
+    viewer = Viewer(camera)
+    phases = {"static": {"frames": 0, "bytes": 0, "seconds": 0.0}, "moving": {"frames": 0, "bytes": 0, "seconds": 0.0}}
+    detect, resume = [], []
+    cpu_start, started = sum(os.times()[:2]), time.monotonic()
+    try:
+        for _ in range(args.cycles):
+            for phase, pattern, seconds in (("static", args.static_pattern, args.static),
+                                            ("moving", "ball", args.moving)):
+                set_pattern(camera, pattern)
+                switched = time.monotonic()
+                seq, _ = events.latest()
+                frames, data = viewer.frames, viewer.bytes
+                if phase == "moving" and gating:
+                    # First motion_start after the switch
+                    while time.monotonic() - switched < seconds:
+                        seq, event = events.wait_for_frame(seq, timeout=seconds)
+                        if event is not None and json.loads(event)["type"] == "motion_start":
+                            detect.append(time.monotonic() - switched)
+                            break
+                time.sleep(max(0.0, seconds - (time.monotonic() - switched)))
+                phases[phase]["frames"] += viewer.frames - frames
+                phases[phase]["bytes"] += viewer.bytes - data
+                phases[phase]["seconds"] += time.monotonic() - switched
+                if phase == "moving" and gating:
+                    latency = resume_latency(viewer, switched, camera.frame_interval())
+                    if latency is not None:
+                        resume.append(latency)
+    finally:
+        viewer.stop()
+    elapsed = time.monotonic() - started
+    cpu = sum(os.times()[:2]) - cpu_start
+
+    result = {"gating": gating, "cpu_percent": round(cpu / elapsed * 100, 1)}
+    for phase, totals in phases.items():
+        result[phase] = {
+            "fps": round(totals["frames"] / totals["seconds"], 1),
+            "kbytes_per_second": round(totals["bytes"] / totals["seconds"] / 1024, 1),
+        }
+    if detect:
+        result["detect_ms"] = round(sum(detect) / len(detect) * 1000, 1)
+    if resume:
+        result["resume_ms"] = round(max(resume) * 1000, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bandwidth and CPU saved by motion-gated encoding")
+    parser.add_argument("--resolution", default="1280x720")
+    parser.add_argument("--static-pattern", default="smpte", help="videotestsrc pattern for the still scene")
+    parser.add_argument("--static", type=float, default=6.0, help="seconds of still scene per cycle")
+    parser.add_argument("--moving", type=float, default=3.0, help="seconds of moving scene per cycle")
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--keepalive", type=float, default=1.0, help="seconds between keep-alive frames")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    camera = GStreamerCamera(source_element=SOURCE, start=False)
+    width, height = map(int, args.resolution.split("x"))
+    if not camera.start() or not camera.set_resolution(width, height):
+        print("✗ Failed to start the test pipeline")
+        sys.exit(1)
+
+    runs = []
+    try:
+        for gating in (False, True):
+            print(f"Gating {'on' if gating else 'off'}: {args.cycles} x ({args.static:.0f} s still, {args.moving:.0f} s moving)")
+            runs.append(run(camera, gating, args))
+    finally:
+        camera.close()
+
+    print(f"\n{'gating':>6} {'still fps':>9} {'still KB/s':>10} {'moving fps':>10} {'moving KB/s':>11} {'cpu':>6}")
+    for result in runs:
+        print(f"{'on' if result['gating'] else 'off':>6} {result['static']['fps']:>9} "
+              f"{result['static']['kbytes_per_second']:>10} {result['moving']['fps']:>10} "
+              f"{result['moving']['kbytes_per_second']:>11} {result['cpu_percent']:>5}%")
+
+    off, on = runs
+    saved = 1 - on["static"]["kbytes_per_second"] / off["static"]["kbytes_per_second"] if off["static"]["kbytes_per_second"] else 0
+    print(f"\nStill scene bandwidth saved: {saved * 100:.0f}%, CPU {off['cpu_percent']}% -> {on['cpu_percent']}%")
+    print(f"Motion detected after {on.get('detect_ms')} ms, full rate after at most {on.get('resume_ms')} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"resolution": args.resolution, "runs": runs}, f, indent=2)
+        print(f"Wrote results to {args.output}")
+
+    # Gating has to save something without holding back the moving scene
+    ok = saved > 0.5 and on["moving"]["fps"] >= off["moving"]["fps"] * 0.8
+    print("✓ Success" if ok else "✗ Failed")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
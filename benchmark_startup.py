@@ -0,0 +1,110 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from load_test import open_stream
+
+# Measures how long a restart leaves the robot blind: time from spawning
+# uvicorn to the first byte of the index page, and to the first complete
+# frame on /video-feed. The first run uses an empty capability cache, the
+# following runs hit it.
+
+
+async def wait_for_first_byte(host, port, started, timeout):
+    while time.monotonic() - started < timeout:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            await asyncio.sleep(0.02)
+            continue
+        writer.write(f"GET / HTTP/1.0\r\nHost: {host}\r\n\r\n".encode())
+        await writer.drain()
+        first = await reader.read(1)
+        elapsed = time.monotonic() - started
+        writer.close()
+        if first:
+            return elapsed
+    return None
+
+
+async def wait_for_first_frame(host, port, started, timeout):
+    reader, writer, status = await open_stream(host, port, "/video-feed")
+    try:
+        if status != 200:
+            return None
+        headers = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+        for line in headers.split(b"\r\n"):
+            if line.lower().startswith(b"content-length:"):
+                await reader.readexactly(int(line.split(b":", 1)[1]))
+        return time.monotonic() - started
+    finally:
+        writer.close()
+
+
+async def measure(host, port, started, timeout):
+    ttfb = await wait_for_first_byte(host, port, started, timeout)
+    if ttfb is None:
+        return None
+    first_frame = await wait_for_first_frame(host, port, started, timeout)
+    reader, writer, _ = await open_stream(host, port, "/api/startup")
+    breakdown = json.loads(await reader.read())
+    writer.close()
+    return {
+        "ttfb_ms": round(ttfb * 1000, 1),
+        "first_frame_ms": round(first_frame * 1000, 1) if first_frame else None,
+        "server": breakdown,
+    }
+
+
+def run_once(args, cache_dir):
+    env = dict(
+        os.environ,
+        AEONBOT_CAMERA=args.camera,
+        AEONBOT_CAPTURE_START=args.capture_start,
+        AEONBOT_CACHE_DIR=cache_dir,
+    )
+    started = time.monotonic()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        return asyncio.run(measure("127.0.0.1", args.port, started, args.timeout))
+    finally:
+        server.terminate()
+        server.wait(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure server time-to-first-byte and time-to-first-frame")
+    parser.add_argument("--camera", default="videotestsrc", choices=["synthetic", "videotestsrc", "libcamera"])
+    parser.add_argument("--capture-start", default="boot", choices=["boot", "lazy"])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for run in range(args.runs):
+            result = run_once(args, cache_dir)
+            if result is None:
+                print(f"Run {run + 1}: ✗ server did not respond")
+                ok = False
+                continue
+            server = result["server"]
+            print(
+                f'Run {run + 1}: TTFB {result["ttfb_ms"]} ms, first frame {result["first_frame_ms"]} ms  '
+                f'(probe {server.get("probe_ms")} ms, cache {server.get("probe_cache")}, '
+                f'pipeline {server.get("pipeline_ms")} ms, app ready {server.get("app_ready_ms")} ms)'
+            )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
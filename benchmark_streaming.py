@@ -0,0 +1,80 @@
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+import time
+import tracemalloc
+
+from gstreamer_camera import SampleFrame, multipart_parts
+
+# Benchmark the appsink -> multipart path: the old copy-and-concatenate
+# chunks against the mapped-sample path used by GStreamerCamera.
+
+PIPELINE = (
+    'videotestsrc pattern=ball is-live=false ! '
+    'video/x-raw,width={width},height={height} ! '
+    'videoconvert ! jpegenc quality=85 ! '
+    'appsink name=sink sync=false max-buffers=4'
+)
+
+
+def legacy_chunk(sample):
+    buffer = sample.get_buffer()
+    success, map_info = buffer.map(Gst.MapFlags.READ)
+    data = bytes(map_info.data)
+    buffer.unmap(map_info)
+    return (
+        b"--frame\r\n"
+        b"Content-Type: image/jpeg\r\n\r\n" + data + b"\r\n"
+    )
+
+
+def zero_copy_chunk(sample):
+    frame = SampleFrame(sample)
+    parts = multipart_parts(frame)
+    # Simulate the response writing each part, then dropping the frame
+    written = sum(len(part) for part in parts)
+    frame.release()
+    return written
+
+
+def run(name, handler, sink, frames):
+    # Warm up so one-off allocations are not counted as steady state
+    for _ in range(10):
+        handler(sink.emit("try-pull-sample", Gst.SECOND))
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start_snapshot = tracemalloc.take_snapshot()
+    start = time.perf_counter()
+    for _ in range(frames):
+        handler(sink.emit("try-pull-sample", Gst.SECOND))
+    elapsed = time.perf_counter() - start
+    end_snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = end_snapshot.compare_to(start_snapshot, 'filename')
+    allocated = sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+    blocks = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+    print(f"{name:>10}: {frames / elapsed:7.1f} frames/s, "
+          f"peak {peak / 1024:8.1f} KiB, "
+          f"retained {allocated / 1024:8.1f} KiB in {blocks} blocks")
+
+
+def main(width=1920, height=1080, frames=300):
+    Gst.init(None)
+    pipeline = Gst.parse_launch(PIPELINE.format(width=width, height=height))
+    sink = pipeline.get_by_name('sink')
+    pipeline.set_state(Gst.State.PLAYING)
+    pipeline.get_state(5 * Gst.SECOND)
+
+    print(f"Streaming {frames} frames at {width}x{height}\n")
+    try:
+        run("legacy", legacy_chunk, sink, frames)
+        run("zero-copy", zero_copy_chunk, sink, frames)
+    finally:
+        pipeline.set_state(Gst.State.NULL)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import json
+import math
+import statistics
+import sys
+import time
+
+from gstreamer_camera import GStreamerCamera
+from multi_tracker import MultiTracker
+
+# Cost of multi-target tracking against the number of tracks. Boxes are
+# laid out in a grid over a scrolling videotestsrc pattern and tracked for
+# a while, once with one tracker thread (the cost of updating trackers one
+# after another) and once with the thread pool. Reports the time to update
+# every track on one frame, the time per track and the tracked frame rate.
+
+SOURCE = "videotestsrc is-live=true pattern=smpte horizontal-speed=4"
+
+
+class Samples:
+    """Stands in for a metrics histogram and keeps every observation."""
+
+    def __init__(self):
+        self.values = []
+
+    def observe(self, value):
+        self.values.append(value)
+
+
+def grid(count, width, height):
+    """count boxes on a grid over width x height, each filling 60% of its cell."""
+    columns = math.ceil(math.sqrt(count * width / height))
+    rows = math.ceil(count / columns)
+    cell_w, cell_h = width // columns, height // rows
+    return [
+        ((i % columns) * cell_w + cell_w // 5, (i // columns) * cell_h + cell_h // 5,
+         cell_w * 3 // 5, cell_h * 3 // 5)
+        for i in range(count)
+    ]
+
+
+def measure(camera, count, workers, args):
+    samples = Samples()
+    tracker = MultiTracker(
+        camera.raw_bus, camera.get_tracker, max_width=args.max_width, workers=workers,
+        max_tracks=count, max_lost=float("inf"), duplicate_iou=1.01, histogram=samples,
+    )
+    try:
+        size = (camera.current_width, camera.current_height)
+        ids = tracker.add(grid(count, *size), size)
+        if None in ids:
+            print(f"  could only start {count - ids.count(None)} of {count} trackers", file=sys.stderr)
+        time.sleep(args.warmup)
+        samples.values.clear()
+        time.sleep(args.duration)
+        latencies = list(samples.values)
+        tracks = len(tracker.tracks)
+        workers = tracker.workers
+    finally:
+        tracker.stop()
+    if not latencies:
+        return None
+    frame_ms = statistics.median(latencies) * 1000
+    return {
+        "tracks": tracks,
+        "workers": workers,
+        "frame_ms": round(frame_ms, 2),
+        "per_track_ms": round(frame_ms / max(1, tracks), 2),
+        "fps": round(len(latencies) / args.duration, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark multi-target tracking cost against track count")
+    parser.add_argument("--counts", default="1,2,4,8,16", help="comma-separated track counts")
+    parser.add_argument("--workers", type=int, default=0, help="tracker threads for the pooled runs (0: default)")
+    parser.add_argument("--resolution", default="1280x720")
+    parser.add_argument("--max-width", type=int, default=640, help="tracking resolution width")
+    parser.add_argument("--duration", type=float, default=5.0, help="measured seconds per run")
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    counts = [int(c) for c in args.counts.split(",")]
+
+    camera = GStreamerCamera(source_element=SOURCE, start=False)
+    width, height = map(int, args.resolution.split("x"))
+    if not camera.start() or not camera.set_resolution(width, height):
+        print("✗ Failed to start the test pipeline")
+        sys.exit(1)
+
+    runs, pooled = [], []
+    try:
+        for workers in (1, args.workers or None):
+            for count in counts:
+                result = measure(camera, count, workers, args)
+                if result is None:
+                    print(f"{count} tracks: no tracked frames", file=sys.stderr)
+                    continue
+                runs.append(result)
+                if workers != 1:
+                    pooled.append(result)
+                print(f"{result['workers']} threads, {result['tracks']:>3} tracks: {result['frame_ms']:>7} ms/frame, "
+                      f"{result['per_track_ms']:>6} ms/track, {result['fps']:>5} fps")
+    finally:
+        camera.close()
+
+    ok = len(pooled) > 1
+    if ok:
+        first, last = pooled[0], pooled[-1]
+        # Linear growth would multiply the frame time by the track ratio
+        growth = last["frame_ms"] / first["frame_ms"] if first["frame_ms"] else 0
+        ratio = last["tracks"] / first["tracks"]
+        print(f"\n{first['tracks']} -> {last['tracks']} tracks ({ratio:.0f}x): frame time {growth:.1f}x "
+              f"with {last['workers']} threads")
+        ok = growth < ratio
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"resolution": args.resolution, "runs": runs}, f, indent=2)
+        print(f"Wrote results to {args.output}")
+
+    print("✓ Success" if ok else "✗ Failed")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from multiprocessing import Pool
+
+from load_test import CLK_TCK, ViewerClient, wait_for_server
+
+# Streaming throughput against uvicorn worker count. Runs capture_service.py
+# once, then for each worker count starts the server with
+# AEONBOT_CAPTURE=shared and N workers, and drives the same number of
+# /video-feed viewers from several client processes (so the load generator
+# is not the bottleneck). The in-process single-worker server is measured
+# first as the baseline. Reports frames and bytes delivered per second in
+# total, per-viewer fps, and CPU used by the workers and by capture.
+
+
+def run_viewers(host, port, path, count, warmup, duration):
+    """One client process: count viewers; returns [(frames in window, bytes, error)]."""
+    async def run():
+        viewers = [ViewerClient(host, port, path) for _ in range(count)]
+        tasks = [asyncio.create_task(v.run()) for v in viewers]
+        await asyncio.sleep(warmup)
+        window_start = time.monotonic()
+        start_bytes = [v.bytes for v in viewers]
+        await asyncio.sleep(duration)
+        window_end = time.monotonic()
+        end_bytes = [v.bytes for v in viewers]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return [
+            (sum(1 for t in v.arrivals if window_start <= t <= window_end), end - start, v.error)
+            for v, start, end in zip(viewers, start_bytes, end_bytes)
+        ]
+    return asyncio.run(run())
+
+
+def process_tree(pid):
+    """pid and all its descendants."""
+    pids = [pid]
+    for current in pids:
+        try:
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def cpu_seconds(pids):
+    total = 0.0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            total += (int(fields[11]) + int(fields[12])) / CLK_TCK
+        except OSError:
+            pass
+    return total
+
+
+def start_server(args, workers, shared):
+    env = dict(os.environ, AEONBOT_CAMERA=args.camera, AEONBOT_CAPTURE_START="boot")
+    if shared:
+        env["AEONBOT_CAPTURE"] = "shared"
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+               "--port", str(args.port), "--workers", str(workers), "--log-level", "warning"]
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL if args.quiet else None, stderr=subprocess.STDOUT)
+
+
+def stop(process):
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def measure(args, workers, shared, capture_pid):
+    server = start_server(args, workers, shared)
+    try:
+        if not asyncio.run(wait_for_server("127.0.0.1", args.port)):
+            print("Server did not come up", file=sys.stderr)
+            return None
+        # Let every worker finish starting before load arrives
+        time.sleep(1.0 + workers * 0.5)
+
+        per_process = [
+            args.viewers // args.client_processes + (1 if i < args.viewers % args.client_processes else 0)
+            for i in range(args.client_processes)
+        ]
+        server_pids = process_tree(server.pid)
+        with Pool(args.client_processes) as pool:
+            pending = pool.starmap_async(run_viewers, [
+                ("127.0.0.1", args.port, "/video-feed", count, args.warmup, args.duration)
+                for count in per_process if count
+            ])
+            time.sleep(args.warmup)
+            server_cpu = cpu_seconds(server_pids)
+            capture_cpu = cpu_seconds([capture_pid]) if capture_pid else 0.0
+            started = time.monotonic()
+            time.sleep(args.duration)
+            elapsed = time.monotonic() - started
+            server_cpu = cpu_seconds(server_pids) - server_cpu
+            capture_cpu = cpu_seconds([capture_pid]) - capture_cpu if capture_pid else None
+            results = [viewer for chunk in pending.get() for viewer in chunk]
+    finally:
+        stop(server)
+        time.sleep(1.0)
+
+    fps = [frames / args.duration for frames, _, _ in results]
+    return {
+        "mode": "shared" if shared else "in-process",
+        "workers": workers,
+        "viewers": len(results),
+        "frames_per_second": round(sum(fps), 1),
+        "mbytes_per_second": round(sum(b for _, b, _ in results) / args.duration / 2 ** 20, 1),
+        "fps_min": round(min(fps), 1) if fps else None,
+        "fps_median": round(statistics.median(fps), 1) if fps else None,
+        "server_cpu_percent": round(server_cpu / elapsed * 100, 1),
+        "capture_cpu_percent": round(capture_cpu / elapsed * 100, 1) if capture_cpu is not None else None,
+        "errors": sorted({error for _, _, error in results if error}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming throughput against uvicorn worker count")
+    parser.add_argument("--camera", default="synthetic", choices=["synthetic", "videotestsrc", "libcamera"])
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--viewers", type=int, default=60, help="concurrent /video-feed viewers per run")
+    parser.add_argument("--client-processes", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per run")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds before measuring")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--quiet", action="store_true", help="discard server output")
+    args = parser.parse_args()
+    worker_counts = [int(w) for w in args.workers.split(",")]
+
+    runs = []
+    baseline = measure(args, 1, shared=False, capture_pid=None)
+    if baseline:
+        runs.append(baseline)
+
+    capture = subprocess.Popen(
+        [sys.executable, "capture_service.py"],
+        env=dict(os.environ, AEONBOT_CAMERA=args.camera, AEONBOT_IDLE_TIMEOUT="0"),
+        stdout=subprocess.DEVNULL if args.quiet else None, stderr=subprocess.STDOUT,
+    )
+    try:
+        time.sleep(3.0)
+        for workers in worker_counts:
+            result = measure(args, workers, shared=True, capture_pid=capture.pid)
+            if result:
+                runs.append(result)
+    finally:
+        stop(capture)
+
+    print(f"\n{args.viewers} viewers, {args.camera} camera, {args.duration:.0f} s per run\n")
+    print(f"{'mode':>10} {'workers':>7} {'frames/s':>9} {'MB/s':>6} {'fps min':>7} {'fps med':>7} "
+          f"{'server cpu':>10} {'capture cpu':>11}")
+    for run in runs:
+        print(f"{run['mode']:>10} {run['workers']:>7} {run['frames_per_second']:>9} {run['mbytes_per_second']:>6} "
+              f"{run['fps_min']:>7} {run['fps_median']:>7} {run['server_cpu_percent']:>9}% "
+              f"{str(run['capture_cpu_percent']) + '%' if run['capture_cpu_percent'] is not None else '-':>11}"
+              + (f"  errors: {run['errors']}" if run["errors"] else ""))
+
+    shared_runs = [run for run in runs if run["mode"] == "shared"]
+    if len(shared_runs) > 1:
+        first = shared_runs[0]
+        for run in shared_runs[1:]:
+            scale = run["frames_per_second"] / first["frames_per_second"] if first["frames_per_second"] else 0
+            print(f"{run['workers']} workers deliver {scale:.2f}x the frames of {first['workers']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"camera": args.camera, "viewers": args.viewers, "runs": runs}, f, indent=2)
+        print(f"Wrote results to {args.output}")
+    sys.exit(0 if runs else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import os
+import re
+from functools import partial
+
+from gstreamer_camera import GStreamerCamera
+from snapshot_cache import SnapshotCache
+from telemetry_hub import TelemetryHub
+from webrtc_handler import WebRTCManager
+
+# AEONBOT_CAMERAS lists cameras as comma-separated id=source pairs, e.g.
+#   front=libcamera:0,rear=libcamera:1,usb=v4l2:/dev/video0,test=videotestsrc:ball
+# Sources:
+#   libcamera          first CSI camera (plain libcamerasrc)
+#   libcamera:N        N-th camera libcamera reports, or libcamera:<camera-name>
+#   v4l2:/dev/videoN   USB camera, converted to raw video before the tee
+#   videotestsrc[:P]   live test pattern P (default ball)
+#   synthetic          NumPy frames, no GStreamer pipeline
+# Without it, AEONBOT_CAMERA selects a single camera with id "0".
+
+DEFAULT_ID = "0"
+CAMERA_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def parse_cameras(spec):
+    """Return [(camera id, source)] from an AEONBOT_CAMERAS string."""
+    cameras = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        camera_id, _, source = entry.partition("=")
+        if not source or not CAMERA_ID.match(camera_id):
+            raise ValueError(f"Invalid camera entry {entry!r}, expected id=source")
+        if any(camera_id == existing for existing, _ in cameras):
+            raise ValueError(f"Duplicate camera id {camera_id!r}")
+        cameras.append((camera_id, source))
+    return cameras
+
+
+def libcamera_names():
+    """Camera names libcamera reports, in its order."""
+    import gi
+    gi.require_version('Gst', '1.0')
+    from gi.repository import Gst
+
+    Gst.init(None)
+    monitor = Gst.DeviceMonitor.new()
+    monitor.add_filter("Video/Source", None)
+    names = []
+    for device in monitor.get_devices() or []:
+        element = device.create_element(None)
+        if element is not None and element.get_factory().get_name() == "libcamerasrc":
+            names.append(element.get_property("camera-name"))
+    return names
+
+
+def libcamera_element(index):
+    """libcamerasrc for the index-th camera libcamera reports."""
+    names = libcamera_names()
+    if index >= len(names):
+        raise ValueError(f"libcamera camera {index} not found (have {len(names)})")
+    return f'libcamerasrc camera-name="{names[index]}"'
+
+
+def source_element(source):
+    """
+    GStreamer source description for a source spec; None for synthetic.
+    libcamera:N gives a callable instead, so the camera list is only
+    queried when that camera first starts.
+    """
+    kind, _, arg = source.partition(":")
+    if kind == "synthetic":
+        return None
+    if kind == "libcamera":
+        if not arg:
+            return "libcamerasrc"
+        if arg.isdigit():
+            return partial(libcamera_element, int(arg))
+        return f'libcamerasrc camera-name="{arg}"'
+    if kind == "v4l2":
+        # USB cameras offer YUY2 or MJPEG; convert so the capture caps apply
+        return f"v4l2src device={arg or '/dev/video0'} ! decodebin ! videoconvert ! videoscale"
+    if kind == "videotestsrc":
+        return f"videotestsrc is-live=true pattern={arg or 'ball'}"
+    raise ValueError(f"Unknown camera source {source!r}")
+
+
+def assign_cores(count, cpu_count=None):
+    """
+    Split the cores between count cameras, leaving core 0 to the event loop
+    when there are cores to spare. Returns one set per camera, or Nones when
+    pinning would not help.
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    if count < 2 or cpu_count < 2:
+        return [None] * count
+    cores = list(range(1, cpu_count)) if cpu_count > 2 else list(range(cpu_count))
+    if count >= len(cores):
+        return [{cores[i % len(cores)]} for i in range(count)]
+    return [set(cores[i::count]) for i in range(count)]
+
+
+class CameraContext:
+    """
+    One camera and everything serving it: telemetry, snapshots, WebRTC.
+    A shared camera has no raw frames here, so it has no WebRTC manager.
+    """
+
+    def __init__(self, camera_id, source, camera, shared=False):
+        self.id = camera_id
+        self.source = source
+        self.camera = camera
+        self.telemetry_hub = TelemetryHub(camera)
+        self.snapshot_cache = SnapshotCache(camera)
+        self.webrtc_manager = None if shared else WebRTCManager(camera.raw_bus)
+
+    def summary(self):
+        camera = self.camera
+        return {
+            "id": self.id,
+            "source": self.source,
+            "status": camera.pipeline_status,
+            "idle": camera.paused,
+            "in_use": camera.started.is_set() and camera.in_use(),
+            "resolution": f"{camera.current_width}x{camera.current_height}",
+            "fps": round(camera.current_fps, 1),
+            "cpus": sorted(camera.cpus) if camera.cpus else None,
+        }
+
+
+class CameraRegistry:
+    """
+    Cameras by id, each with its own pipeline, frame buses, tracker and
+    telemetry. The first camera is the default for the unprefixed routes.
+    Capture starts lazily and pauses after idle_timeout without viewers.
+    With motion_gating, still scenes are encoded at a keep-alive rate.
+    """
+
+    def __init__(self, cameras, idle_timeout=30.0, shared=False, motion_gating=False):
+        self.cameras = {}
+        self.shared = shared
+        if shared:
+            # Capture runs in capture_service.py; this process only reads
+            from shared_camera import ControlClient, SharedCamera
+            control = ControlClient()
+            for camera_id, source in cameras:
+                self.cameras[camera_id] = CameraContext(
+                    camera_id, source, SharedCamera(camera_id, control), shared=True
+                )
+        else:
+            cores = assign_cores(len(cameras))
+            for (camera_id, source), cpus in zip(cameras, cores):
+                self.cameras[camera_id] = CameraContext(
+                    camera_id, source, self._create(camera_id, source, cpus, idle_timeout, motion_gating)
+                )
+        self.default = next(iter(self.cameras.values()))
+
+    @staticmethod
+    def _create(camera_id, source, cpus, idle_timeout, motion_gating=False):
+        element = source_element(source)
+        print(f"Camera {camera_id}: {element if isinstance(element, str) else source}, cores {sorted(cpus) if cpus else 'any'}")
+        if element is None:
+            from synthetic_camera import SyntheticCamera
+            return SyntheticCamera(
+                start=False, camera_id=camera_id, cpus=cpus, idle_timeout=idle_timeout,
+                motion_gating=motion_gating,
+            )
+        return GStreamerCamera(
+            source_element=element, start=False, camera_id=camera_id,
+            cpus=cpus, idle_timeout=idle_timeout, motion_gating=motion_gating,
+        )
+
+    @classmethod
+    def from_env(cls, shared=None):
+        """
+        Cameras from AEONBOT_CAMERAS. With AEONBOT_CAPTURE=shared (or
+        shared=True) they are read from a running capture_service.py.
+        """
+        if shared is None:
+            shared = os.environ.get("AEONBOT_CAPTURE") == "shared"
+        spec = os.environ.get("AEONBOT_CAMERAS")
+        if spec:
+            cameras = parse_cameras(spec)
+        else:
+            cameras = [(DEFAULT_ID, os.environ.get("AEONBOT_CAMERA", "libcamera"))]
+        idle_timeout = float(os.environ.get("AEONBOT_IDLE_TIMEOUT", "30")) or None
+        motion_gating = os.environ.get("AEONBOT_MOTION_GATING", "0") == "1"
+        return cls(cameras, idle_timeout=idle_timeout, shared=shared, motion_gating=motion_gating)
+
+    def get(self, camera_id):
+        return self.cameras.get(camera_id)
+
+    def __iter__(self):
+        return iter(self.cameras.values())
+
+    def stop(self):
+        for context in self:
+            context.telemetry_hub.stop()
+            context.camera.close()
+
+    def get_telemetry(self):
+        return [context.summary() for context in self]
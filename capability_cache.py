@@ -0,0 +1,33 @@
+import json
+import os
+import sys
+
+# Encoder and format probing needs a loaded GStreamer registry and creates
+# elements, which is slow on a Pi. Results only change when GStreamer does,
+# so they are kept on disk keyed by the GStreamer version string.
+
+CACHE_DIR = os.environ.get("AEONBOT_CACHE_DIR", os.path.expanduser("~/.cache/aeonbot"))
+CACHE_FILE = os.path.join(CACHE_DIR, "capabilities.json")
+
+
+def load(gst_version, path=CACHE_FILE):
+    """Return the cached capabilities dict for gst_version, or None."""
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get("gstreamer") != gst_version:
+        return None
+    return cached.get("capabilities")
+
+
+def save(gst_version, capabilities, path=CACHE_FILE):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"gstreamer": gst_version, "capabilities": capabilities}, f, indent=2)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Could not write capability cache {path}: {e}", file=sys.stderr)
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+from camera_registry import CameraRegistry
+from motor_bridge import MotorBridge
+from shared_frame_bus import SharedFrameRing, ring_name
+from shared_camera import CONTROL_SOCKET
+from visual_servo import VisualServo
+
+# Capture process for running the server with several uvicorn workers:
+#
+#   python3 capture_service.py &
+#   AEONBOT_CAPTURE=shared python3 -m uvicorn main:app --workers 4
+#
+# It owns the cameras (same AEONBOT_CAMERAS/AEONBOT_CAMERA settings as the
+# server), the trackers and the visual servo. Each camera's encoded frames
+# and telemetry go into a shared-memory ring that every worker reads;
+# workers send control requests over a Unix socket as JSON lines.
+
+# Camera methods a worker may call, and how
+CAMERA_METHODS = {
+    "set_resolution": lambda camera, *args: camera.set_resolution(*args),
+    "set_pipeline_settings": lambda camera, **kwargs: camera.set_pipeline_settings(**kwargs),
+    "start_tracking": lambda camera, *args: camera.start_tracking(*args),
+    "reset_tracking": lambda camera: camera.reset_tracking(),
+    "add_tracks": lambda camera, boxes: camera.add_tracks(boxes),
+    "remove_track": lambda camera, track_id: camera.remove_track(track_id),
+    "clear_tracks": lambda camera: camera.clear_tracks(),
+    "set_motion_settings": lambda camera, **kwargs: camera.set_motion_settings(**kwargs),
+    "recorder.trigger": lambda camera, *args, **kwargs: camera.recorder.trigger(*args, **kwargs),
+    "recorder.clips": lambda camera: list(camera.recorder.clips),
+}
+SERVO_METHODS = {"servo.enable", "servo.disable", "servo.get_telemetry"}
+
+
+class RingPublisher:
+    """
+    Copies one camera's encoded frames into its ring while any worker wants
+    them, and rewrites the ring's telemetry document. Without demand it
+    unsubscribes, so the camera's idle timeout can pause capture.
+    """
+
+    def __init__(self, camera, ring, demand_timeout=2.0, telemetry_interval=0.1):
+        self.camera = camera
+        self.ring = ring
+        self.demand_timeout = demand_timeout
+        self.telemetry_interval = telemetry_interval
+        self.subscribed = False
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        bus = self.camera.frame_bus
+        seq = 0
+        next_telemetry = 0.0
+        while self.running:
+            wanted = self.ring.demand_age() < self.demand_timeout
+            if wanted and not self.subscribed:
+                bus.subscribe()
+                self.subscribed = True
+            elif not wanted and self.subscribed:
+                bus.unsubscribe()
+                self.subscribed = False
+
+            if self.subscribed:
+                seq, frame = bus.wait_for_frame(seq, timeout=self.telemetry_interval)
+                if frame is not None:
+                    self.ring.publish(frame.data, frame.pts, frame.arrival)
+            else:
+                time.sleep(self.telemetry_interval)
+
+            now = time.monotonic()
+            if now >= next_telemetry:
+                next_telemetry = now + self.telemetry_interval
+                try:
+                    self.ring.write_telemetry(self.camera.get_telemetry())
+                except Exception as e:
+                    print(f"Error writing telemetry for camera {self.camera.camera_id}: {e}", file=sys.stderr)
+
+        if self.subscribed:
+            bus.unsubscribe()
+
+    def stop(self):
+        self.running = False
+        self._thread.join(timeout=2)
+
+
+class CaptureService:
+    """Cameras, rings and servo for the server workers, with the control socket in front."""
+
+    def __init__(self, registry, bridge, path=CONTROL_SOCKET):
+        self.registry = registry
+        self.bridge = bridge
+        self.path = path
+        self.servo = VisualServo(registry.default.camera, bridge)
+        slot_size = int(os.environ.get("AEONBOT_RING_SLOT_KB", "2048")) * 1024
+        self.publishers = [
+            RingPublisher(context.camera, SharedFrameRing(ring_name(context.id), slot_size=slot_size, create=True))
+            for context in registry
+        ]
+        self.requests = 0
+        self._server = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, self.path)
+        os.chmod(self.path, 0o600)
+        self.bridge.start()
+        self.servo.start()
+        print(f"Capture service listening on {self.path} for {[c.id for c in self.registry]}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self.servo.stop()
+        await self.bridge.stop()
+        for publisher in self.publishers:
+            publisher.stop()
+            publisher.ring.close()
+        self.registry.stop()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _handle(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                try:
+                    result = await self._dispatch(json.loads(line))
+                    response = {"result": result}
+                except Exception as e:
+                    response = {"error": f"{type(e).__name__}: {e}"}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, request):
+        self.requests += 1
+        method = request["method"]
+        args, kwargs = request.get("args", []), request.get("kwargs", {})
+        if method in SERVO_METHODS:
+            # Servo state lives on this event loop
+            return getattr(self.servo, method.split(".", 1)[1])(*args, **kwargs)
+        context = self.registry.get(request.get("camera"))
+        if context is None:
+            raise KeyError(f"Unknown camera {request.get('camera')!r}")
+        if method not in CAMERA_METHODS:
+            raise ValueError(f"Unknown method {method!r}")
+        # Reconfiguration blocks until the pipeline has switched
+        return await asyncio.to_thread(CAMERA_METHODS[method], context.camera, *args, **kwargs)
+
+
+async def serve():
+    registry = CameraRegistry.from_env(shared=False)
+    bridge = MotorBridge(
+        host=os.environ.get("AEONBOT_MQTT_HOST", "localhost"),
+        port=int(os.environ.get("AEONBOT_MQTT_PORT", "1883")),
+        client_id="aeonbot-capture-servo",
+    )
+    service = CaptureService(registry, bridge)
+    await service.start()
+    if os.environ.get("AEONBOT_CAPTURE_START", "boot") == "boot":
+        registry.default.camera.start_in_background()
+    stopping = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopping.set)
+    try:
+        await stopping.wait()
+    finally:
+        await service.stop()
+
+
+def main():
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
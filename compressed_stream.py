@@ -0,0 +1,165 @@
+import gi
+gi.require_version('Gst', '1.0')
+gi.require_version('GstVideo', '1.0')
+from gi.repository import Gst, GstVideo
+import sys
+import time
+
+from frame_bus import FrameBus, SampleFrame, StreamClient
+
+# Encoder branch configuration for native compressed streaming. The muxers
+# run in streamable mode, so the init segment arrives as "streamheader" on
+# the caps and every buffer that can start playback has no DELTA_UNIT flag.
+STREAM_FORMATS = {
+    "x264enc": {
+        "encoder": "x264enc name=encoder tune=zerolatency speed-preset=ultrafast key-int-max=30 bitrate={bitrate}",
+        "muxer": "video/x-h264,profile=constrained-baseline ! h264parse ! mp4mux fragment-duration=100 streamable=true",
+        "mime": 'video/mp4; codecs="avc1.42E01F"',
+    },
+    "vp8enc": {
+        "encoder": "vp8enc name=encoder deadline=1 keyframe-max-dist=30 target-bitrate={bitrate_bps}",
+        "muxer": "webmmux streamable=true",
+        "mime": 'video/webm; codecs="vp8"',
+    },
+    "vp9enc": {
+        "encoder": "vp9enc name=encoder deadline=1 keyframe-max-dist=30 target-bitrate={bitrate_bps}",
+        "muxer": "webmmux streamable=true",
+        "mime": 'video/webm; codecs="vp9"',
+    },
+}
+
+
+class StreamChunk:
+    """One muxed buffer from the compressed branch."""
+
+    __slots__ = ("frame", "keyframe")
+
+    def __init__(self, frame, keyframe):
+        self.frame = frame
+        self.keyframe = keyframe
+
+    @property
+    def data(self):
+        return self.frame.data
+
+    def __len__(self):
+        return len(self.frame)
+
+
+class CompressedStream:
+    """
+    Fans the muxed output of one encoder out to MSE clients.
+
+    New subscribers get the init segment, then join at the next keyframe; a
+    keyframe is requested from the encoder when they join so they do not
+    wait a whole GOP. A client that falls behind and misses a chunk is
+    resynchronized at the next keyframe rather than fed a broken stream.
+    """
+
+    def __init__(self, encoder_name, encoder_element=None):
+        self.encoder_name = encoder_name
+        self.mime = STREAM_FORMATS[encoder_name]["mime"]
+        self.encoder_element = encoder_element
+        self.bus = FrameBus()
+        self.init_segment = None
+        self._header_parts = []
+        self._last_keyframe_request = 0.0
+        self.clients = {}
+
+    def push_sample(self, sample):
+        buffer = sample.get_buffer()
+        if self.init_segment is None:
+            self._read_streamheader(sample)
+
+        if buffer.has_flags(Gst.BufferFlags.HEADER):
+            # Muxers that do not put the header on the caps flag it instead
+            if self.init_segment is None:
+                success, map_info = buffer.map(Gst.MapFlags.READ)
+                if success:
+                    self._header_parts.append(bytes(map_info.data))
+                    buffer.unmap(map_info)
+            return
+
+        if self.init_segment is None and self._header_parts:
+            self.init_segment = b"".join(self._header_parts)
+            self._header_parts = []
+
+        keyframe = not buffer.has_flags(Gst.BufferFlags.DELTA_UNIT)
+        chunk = StreamChunk(SampleFrame(sample), keyframe)
+        self.bus.publish(chunk)
+        return chunk
+
+    def _read_streamheader(self, sample):
+        structure = sample.get_caps().get_structure(0)
+        if not structure.has_field("streamheader"):
+            return
+        parts = []
+        for header in structure.get_value("streamheader"):
+            success, map_info = header.map(Gst.MapFlags.READ)
+            if success:
+                parts.append(bytes(map_info.data))
+                header.unmap(map_info)
+        if parts:
+            self.init_segment = b"".join(parts)
+
+    def request_keyframe(self, min_interval=0.5):
+        """Ask the encoder for a keyframe so a late joiner can start decoding."""
+        now = time.monotonic()
+        if self.encoder_element is None or now - self._last_keyframe_request < min_interval:
+            return
+        self._last_keyframe_request = now
+        event = GstVideo.video_event_new_upstream_force_key_unit(
+            Gst.CLOCK_TIME_NONE, True, 0
+        )
+        pad = self.encoder_element.get_static_pad("src")
+        if pad is not None:
+            pad.send_event(event)
+
+    async def iter_chunks(self, client_id, peer=None, running=lambda: True):
+        """
+        Yield bytes for one WebSocket client: the init segment first, then
+        muxed chunks starting at a keyframe.
+        """
+        client = StreamClient(client_id, peer)
+        self.clients[client_id] = client
+        self.bus.subscribe()
+        try:
+            last_seq, _ = self.bus.latest()
+            self.request_keyframe()
+            synced = False
+            sent_init = False
+            while running():
+                seq, chunk = await self.bus.wait_for_frame_async(last_seq, timeout=5)
+                if chunk is None:
+                    continue
+                if last_seq and seq - last_seq > 1:
+                    # Missed chunks: the decoder needs a fresh keyframe
+                    client.frames_dropped += seq - last_seq - 1
+                    if synced:
+                        synced = False
+                        self.request_keyframe()
+                last_seq = seq
+
+                if not synced:
+                    if not chunk.keyframe or self.init_segment is None:
+                        continue
+                    synced = True
+                    if not sent_init:
+                        sent_init = True
+                        yield self.init_segment
+
+                started = time.monotonic()
+                yield bytes(chunk.data)
+                client.record_send(len(chunk), time.monotonic() - started, 1.0 / 30)
+        except Exception as e:
+            print(f"Error in compressed stream: {e}", file=sys.stderr)
+        finally:
+            self.bus.unsubscribe()
+            self.clients.pop(client_id, None)
+
+    def get_telemetry(self):
+        return {
+            "encoder": self.encoder_name,
+            "mime": self.mime,
+            "clients": [c.as_dict() for c in list(self.clients.values())],
+        }
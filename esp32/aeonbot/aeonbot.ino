@@ -227,11 +227,16 @@ void handleJoystickCommand(float angle, float speed) {
                  angle, speed, int(leftSpeed), int(rightSpeed));
 }
 
+// Last handled command, echoed on MQTT_STATUS_TOPIC so the server can
+// measure round-trip latency. Published from loop(), not from the callback.
+String pendingAck = "";
+
 // Update handleMotorCommand to handle joystick messages
 void handleMotorCommand(char *data, uint16_t len) {
     String message = String(data);
     Serial.print("Received command: ");
     Serial.println(message);
+    pendingAck = message;
     
     // Split the message into parts
     int firstColon = message.indexOf(':');
@@ -467,6 +472,16 @@ void loop() {
     // Process any incoming MQTT messages
     mqtt.processPackets(10);  // Reduced from 10000 to 10ms to be more responsive
 
+    // Echo the handled command for round-trip measurement
+    if (pendingAck.length() > 0) {
+        if (mqtt.connected()) {
+            char ackMsg[96];
+            snprintf(ackMsg, sizeof(ackMsg), "{\"ack\":\"%s\"}", pendingAck.c_str());
+            mqtt.publish(MQTT_STATUS_TOPIC, ackMsg);
+        }
+        pendingAck = "";
+    }
+
     // Read and publish input pin states at regular intervals
     if (currentMillis - lastInputCheck >= INPUT_CHECK_INTERVAL) {
         lastInputCheck = currentMillis;
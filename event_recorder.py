@@ -0,0 +1,288 @@
+import mmap
+import os
+import queue
+import re
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Container per compressed encoder; the muxed chunks are written as they are
+STREAM_EXTENSIONS = {"x264enc": "mp4", "vp8enc": "webm", "vp9enc": "webm"}
+
+
+class SegmentRing:
+    """
+    Fixed-size ring of encoded frames in one anonymous memory map. Frames
+    are copied in back to back and the oldest are evicted when space or
+    the time window runs out, so memory never grows past capacity.
+    Not thread-safe; EventRecorder only touches it from its own thread.
+    """
+
+    def __init__(self, capacity, max_seconds):
+        self.capacity = capacity
+        self.max_seconds = max_seconds
+        self._buffer = mmap.mmap(-1, capacity)
+        self._entries = deque()  # (offset, length, timestamp, keyframe)
+        self._head = 0
+        self.used = 0
+        self.oversized = 0
+
+    def append(self, data, timestamp, keyframe=True):
+        length = len(data)
+        if length > self.capacity:
+            self.oversized += 1
+            return
+        start = self._head
+        if start + length > self.capacity:
+            # Wrap; whatever sits past the old head is now the oldest data
+            while self._entries and self._entries[0][0] >= start:
+                self._evict()
+            start = 0
+        end = start + length
+        while self._entries and start <= self._entries[0][0] < end:
+            self._evict()
+        while self._entries and self._entries[0][2] < timestamp - self.max_seconds:
+            self._evict()
+
+        self._buffer[start:end] = data
+        self._entries.append((start, length, timestamp, keyframe))
+        self._head = end
+        self.used += length
+
+    def _evict(self):
+        self.used -= self._entries.popleft()[1]
+
+    def clear(self):
+        self._entries.clear()
+        self._head = 0
+        self.used = 0
+
+    def span(self):
+        if not self._entries:
+            return 0.0
+        return self._entries[-1][2] - self._entries[0][2]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def copy_range(self, start_time, end_time, from_keyframe=False):
+        """
+        Copy out the frames timestamped within [start_time, end_time]. With
+        from_keyframe, start at the last keyframe at or before start_time so
+        the clip decodes from its first frame.
+        """
+        entries = list(self._entries)
+        first = next((i for i, e in enumerate(entries) if e[2] >= start_time), len(entries))
+        if from_keyframe:
+            keyframes = [i for i, e in enumerate(entries) if e[3]]
+            earlier = [i for i in keyframes if i <= first]
+            later = [i for i in keyframes if i > first]
+            if earlier:
+                first = earlier[-1]
+            elif later:
+                first = later[0]
+            else:
+                return []
+        return [
+            (timestamp, self._buffer[offset:offset + length])
+            for offset, length, timestamp, _ in entries[first:]
+            if timestamp <= end_time
+        ]
+
+
+def write_avi(path, frames, width, height, fps):
+    """Write JPEG frames into an MJPEG AVI (RIFF, one video stream, idx1 index)."""
+    rate = max(1, round(fps * 1000))
+    max_frame = max(len(f) for f in frames)
+
+    movi = []
+    index = []
+    offset = 4  # idx1 offsets count from the 'movi' fourcc
+    for frame in frames:
+        size = len(frame)
+        movi.append(b"00dc" + struct.pack("<I", size))
+        movi.append(frame)
+        if size % 2:
+            movi.append(b"\0")
+        index.append(struct.pack("<4sIII", b"00dc", 0x10, offset, size))
+        offset += 8 + size + size % 2
+    movi_size = offset
+
+    avih = struct.pack(
+        "<IIIIIIIIII16x",
+        round(1_000_000 / fps), max_frame * round(fps), 0, 0x10,
+        len(frames), 0, 1, max_frame, width, height,
+    )
+    strh = struct.pack(
+        "<4s4sIHHIIIIIIIIhhhh",
+        b"vids", b"MJPG", 0, 0, 0, 0, 1000, rate, 0, len(frames),
+        max_frame, 0xFFFFFFFF, 0, 0, 0, width, height,
+    )
+    strf = struct.pack(
+        "<IiiHH4sIiiII",
+        40, width, height, 1, 24, b"MJPG", width * height * 3, 0, 0, 0, 0,
+    )
+
+    def chunk(fourcc, data):
+        return fourcc + struct.pack("<I", len(data)) + data
+
+    strl = chunk(b"LIST", b"strl" + chunk(b"strh", strh) + chunk(b"strf", strf))
+    hdrl = chunk(b"LIST", b"hdrl" + chunk(b"avih", avih) + strl)
+    idx1 = b"".join(index)
+    riff_size = 4 + len(hdrl) + 8 + movi_size + 8 + len(idx1)
+
+    with open(path, "wb") as f:
+        f.write(b"RIFF" + struct.pack("<I", riff_size) + b"AVI " + hdrl)
+        f.write(b"LIST" + struct.pack("<I", movi_size) + b"movi")
+        f.writelines(movi)
+        f.write(b"idx1" + struct.pack("<I", len(idx1)) + idx1)
+
+
+class EventRecorder:
+    """
+    Keeps the last max_seconds of encoded video in fixed-size rings, the
+    capture MJPEG always and the compressed stream while one is running,
+    and turns a trigger into a clip covering [T - before, T + after] on
+    disk without re-encoding: MJPEG as AVI, H.264 as fragmented MP4, VP8/VP9
+    as WebM.
+
+    Producers only put references on a bounded queue and never wait;
+    copying into the rings and cutting clips happen on the recorder
+    thread, and file writes on a separate writer thread.
+    """
+
+    def __init__(self, frame_size, directory="recordings", max_seconds=10.0,
+                 max_bytes=64 * 2 ** 20, stream_max_bytes=16 * 2 ** 20):
+        self.frame_size = frame_size
+        self.directory = directory
+        self.max_seconds = max_seconds
+        self.mjpeg = SegmentRing(max_bytes, max_seconds)
+        self.stream = SegmentRing(stream_max_bytes, max_seconds)
+        self._stream_header = None  # (encoder name, init segment)
+
+        self._queue = queue.Queue(maxsize=60)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="event-writer")
+        self.clips = deque(maxlen=50)
+        self._clip_ids = 0
+        self.dropped = 0
+
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add_frame(self, frame):
+        """Queue an encoded capture frame; never blocks the caller."""
+        self._put(("jpeg", frame, time.monotonic()))
+
+    def add_chunk(self, chunk, stream):
+        """Queue a muxed chunk from a CompressedStream."""
+        self._put(("stream", chunk, time.monotonic(), stream.encoder_name, stream.init_segment))
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def trigger(self, reason, before=5.0, after=5.0):
+        """Record a clip around now; returns the clip's status dict at once."""
+        before = max(0.0, min(before, self.max_seconds))
+        after = max(0.0, min(after, self.max_seconds - before))
+        now = time.monotonic()
+        self._clip_ids += 1
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        clip = {
+            "id": self._clip_ids,
+            "reason": reason,
+            "name": f"{stamp}-{self._clip_ids}-" + re.sub(r"[^A-Za-z0-9_-]", "_", reason),
+            "created": time.time(),
+            "before": before,
+            "after": after,
+            "status": "recording",
+            "files": [],
+        }
+        self.clips.append(clip)
+        print(f"Event recording triggered: {reason} (-{before}s/+{after}s)")
+
+        # The cut waits until the post-event frames are in the rings
+        timer = threading.Timer(after, self._queue.put, args=(("cut", clip, now - before, now + after),))
+        timer.daemon = True
+        timer.start()
+        return clip
+
+    def _run(self):
+        while self.running:
+            try:
+                item = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                kind = item[0]
+                if kind == "jpeg":
+                    _, frame, timestamp = item
+                    self.mjpeg.append(frame.data, timestamp)
+                elif kind == "stream":
+                    _, chunk, timestamp, encoder, init_segment = item
+                    if init_segment is None:
+                        continue
+                    if self._stream_header != (encoder, init_segment):
+                        # New encoder or caps: older chunks do not fit the new header
+                        self.stream.clear()
+                        self._stream_header = (encoder, init_segment)
+                    self.stream.append(chunk.data, timestamp, chunk.keyframe)
+                elif kind == "cut":
+                    self._cut(*item[1:])
+            except Exception as e:
+                print(f"Error in event recorder: {e}", file=sys.stderr)
+
+    def _cut(self, clip, start_time, end_time):
+        jpeg_frames = self.mjpeg.copy_range(start_time, end_time)
+        stream_chunks = self.stream.copy_range(start_time, end_time, from_keyframe=True)
+        header = self._stream_header
+        if not jpeg_frames and not stream_chunks:
+            clip["status"] = "empty"
+            return
+        clip["status"] = "writing"
+        self._writer.submit(self._write, clip, jpeg_frames, stream_chunks, header, self.frame_size())
+
+    def _write(self, clip, jpeg_frames, stream_chunks, header, size):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(self.directory, clip["name"])
+            if jpeg_frames:
+                duration = jpeg_frames[-1][0] - jpeg_frames[0][0]
+                fps = (len(jpeg_frames) - 1) / duration if duration > 0 else 30.0
+                write_avi(f"{base}.avi", [data for _, data in jpeg_frames], size[0], size[1], fps)
+                clip["files"].append(f"{clip['name']}.avi")
+            if stream_chunks and header is not None:
+                encoder, init_segment = header
+                path = f"{base}.{STREAM_EXTENSIONS.get(encoder, 'bin')}"
+                with open(path, "wb") as f:
+                    f.write(init_segment)
+                    f.writelines(data for _, data in stream_chunks)
+                clip["files"].append(os.path.basename(path))
+            clip["frames"] = len(jpeg_frames)
+            clip["status"] = "done"
+            print(f"Event clip written: {clip['files']}")
+        except Exception as e:
+            clip["status"] = "failed"
+            clip["error"] = str(e)
+            print(f"Error writing event clip: {e}", file=sys.stderr)
+
+    def stop(self):
+        self.running = False
+        self._writer.shutdown(wait=False)
+
+    def get_telemetry(self):
+        return {
+            "seconds_buffered": round(self.mjpeg.span(), 1),
+            "frames_buffered": len(self.mjpeg),
+            "bytes_buffered": self.mjpeg.used,
+            "stream_bytes_buffered": self.stream.used,
+            "capacity_bytes": self.mjpeg.capacity + self.stream.capacity,
+            "dropped": self.dropped,
+            "clips": len(self.clips),
+        }
@@ -0,0 +1,238 @@
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+import asyncio
+import threading
+import time
+import numpy as np
+
+MULTIPART_TRAILER = b"\r\n"
+
+
+class SampleFrame:
+    """
+    Encoded frame backed directly by a mapped GstBuffer.
+    The sample stays mapped for as long as anything (queue, frame bus, or a
+    response that is still writing it) holds a reference, so the bytes go
+    from appsink to the socket without being copied.
+    """
+
+    __slots__ = ("sample", "buffer", "pts", "arrival", "data", "_map_info")
+
+    def __init__(self, sample):
+        self.arrival = time.monotonic()
+        self.sample = sample
+        self.buffer = sample.get_buffer()
+        self.pts = self.buffer.pts
+        success, self._map_info = self.buffer.map(Gst.MapFlags.READ)
+        if not success:
+            self._map_info = None
+            raise ValueError("Failed to map sample buffer")
+        self.data = memoryview(self._map_info.data)
+
+    def __len__(self):
+        return self.data.nbytes
+
+    def release(self):
+        if self._map_info is not None:
+            self.data.release()
+            self.buffer.unmap(self._map_info)
+            self._map_info = None
+
+    def __del__(self):
+        self.release()
+
+
+class EncodedFrame:
+    """Encoded frame produced by cv2.imencode, exposed without tobytes()."""
+
+    __slots__ = ("array", "pts", "arrival", "data")
+
+    def __init__(self, array, pts=None, arrival=None):
+        self.array = array
+        self.pts = pts
+        self.arrival = arrival
+        self.data = memoryview(array).cast("B")
+
+    def __len__(self):
+        return self.data.nbytes
+
+
+class RawFrame:
+    """BGR frame from the tracking branch of the tee, as a NumPy array."""
+
+    __slots__ = ("array", "pts", "timestamp")
+
+    def __init__(self, sample):
+        buffer = sample.get_buffer()
+        structure = sample.get_caps().get_structure(0)
+        width = structure.get_value('width')
+        height = structure.get_value('height')
+        # GStreamer pads packed RGB rows to a multiple of 4 bytes
+        stride = (width * 3 + 3) & ~3
+
+        success, map_info = buffer.map(Gst.MapFlags.READ)
+        if not success:
+            raise ValueError("Failed to map raw sample buffer")
+        try:
+            view = np.ndarray((height, width, 3), dtype=np.uint8,
+                              buffer=map_info.data, strides=(stride, 3, 1))
+            self.array = view.copy()
+        finally:
+            buffer.unmap(map_info)
+        self.pts = buffer.pts
+        self.timestamp = time.monotonic()
+
+    @classmethod
+    def from_array(cls, array, pts=None):
+        """Wrap a BGR array produced without GStreamer, e.g. by SyntheticCamera."""
+        frame = cls.__new__(cls)
+        frame.array = array
+        frame.pts = pts
+        frame.timestamp = time.monotonic()
+        return frame
+
+
+def multipart_header(frame):
+    """Per-frame multipart header, written separately from the payload."""
+    return (
+        b"--frame\r\n"
+        b"Content-Type: image/jpeg\r\n"
+        b"Content-Length: %d\r\n\r\n" % len(frame)
+    )
+
+
+def multipart_parts(frame):
+    """Return (header, payload, trailer) so no full-size chunk is concatenated."""
+    return multipart_header(frame), frame.data, MULTIPART_TRAILER
+
+
+class FrameBus:
+    """
+    Single-producer, multi-consumer holder for the latest encoded frame.
+    The producer publishes each frame once; every subscriber keeps its own
+    sequence cursor and always jumps to the newest frame.
+
+    on_subscribers_changed, if given, is called with the new count whenever
+    the bus goes from idle to watched or back, so producers can pause.
+    """
+
+    def __init__(self, on_subscribers_changed=None):
+        self.on_subscribers_changed = on_subscribers_changed
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._async_waiters = {}  # event loop -> set of asyncio.Event
+        self.subscribers = 0
+
+    def publish(self, frame):
+        with self._cond:
+            self._frame = frame
+            self._seq += 1
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, {}
+        # One wakeup per event loop, not per client
+        for loop, events in waiters.items():
+            loop.call_soon_threadsafe(self._wake_async_waiters, events)
+
+    @staticmethod
+    def _wake_async_waiters(events):
+        for event in events:
+            event.set()
+
+    def latest(self):
+        """Return (seq, frame) for the newest frame without waiting."""
+        with self._cond:
+            return self._seq, self._frame
+
+    def wait_for_frame(self, last_seq, timeout=None):
+        """
+        Block until a frame newer than last_seq is published.
+        Returns (seq, frame), or (last_seq, None) on timeout.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq != last_seq, timeout):
+                return last_seq, None
+            return self._seq, self._frame
+
+    async def wait_for_frame_async(self, last_seq, timeout=None):
+        """
+        Asyncio counterpart of wait_for_frame() that does not hold a thread.
+        Returns (seq, frame), or (last_seq, None) on timeout.
+        """
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        with self._cond:
+            if self._seq != last_seq:
+                return self._seq, self._frame
+            self._async_waiters.setdefault(loop, set()).add(event)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                events = self._async_waiters.get(loop)
+                if events is not None:
+                    events.discard(event)
+        with self._cond:
+            if self._seq == last_seq:
+                return last_seq, None
+            return self._seq, self._frame
+
+    def subscribe(self):
+        with self._cond:
+            self.subscribers += 1
+            count = self.subscribers
+        if count == 1 and self.on_subscribers_changed:
+            self.on_subscribers_changed(count)
+
+    def unsubscribe(self):
+        with self._cond:
+            self.subscribers = max(0, self.subscribers - 1)
+            count = self.subscribers
+        if count == 0 and self.on_subscribers_changed:
+            self.on_subscribers_changed(count)
+
+
+class StreamClient:
+    """Per-connection counters for the async MJPEG streamer."""
+
+    def __init__(self, client_id, peer=None):
+        self.client_id = client_id
+        self.peer = peer
+        self.resolution = None
+        self.quality = None
+        self.target_fps = None
+        self.bandwidth = 0.0
+        self.frames_throttled = 0
+        self.connected_at = time.time()
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.bytes_sent = 0
+        self.last_send_time = 0.0
+        self.lagging = False
+
+    def record_send(self, size, send_time, frame_interval):
+        self.frames_sent += 1
+        self.bytes_sent += size
+        self.last_send_time = send_time
+        # A send that outlasts a frame interval means the socket is backed up
+        self.lagging = send_time > frame_interval
+
+    def as_dict(self):
+        return {
+            "id": self.client_id,
+            "peer": self.peer,
+            "resolution": self.resolution,
+            "quality": self.quality,
+            "target_fps": self.target_fps,
+            "bandwidth_kbps": round(self.bandwidth * 8 / 1000, 1),
+            "frames_throttled": self.frames_throttled,
+            "connected_for": round(time.time() - self.connected_at, 1),
+            "frames_sent": self.frames_sent,
+            "frames_dropped": self.frames_dropped,
+            "bytes_sent": self.bytes_sent,
+            "last_send_ms": round(self.last_send_time * 1000, 1),
+            "lagging": self.lagging,
+        }
@@ -3,59 +3,333 @@
 
 import gi
 gi.require_version('Gst', '1.0')
-from gi.repository import Gst, GLib
+from gi.repository import Gst
+import itertools
+import os
 import threading
 import time
 import sys
 import queue
 import cv2
-import numpy as np
+
+import capability_cache
+from adaptive_stream import AdaptiveController, BandwidthMeter, LevelEncoder, FPS_STEPS
+from compressed_stream import CompressedStream, STREAM_FORMATS
+from event_recorder import EventRecorder
+from metrics import StageMetrics
+from motion_detector import MotionDetector
+from multi_tracker import MultiTracker
+from frame_bus import FrameBus, SampleFrame, RawFrame, StreamClient, multipart_parts
+from pipeline_cache import PipelineCache
+from pipeline_supervisor import PipelineSupervisor
+from tracker_worker import TrackerWorker
+
 
 class GStreamerCamera:
     # Remove any _global_picam2 references
     # _global_picam2 = None  # (delete this)
 
-    def __init__(self):
-        Gst.init(None)
+    def __init__(self, source_element="libcamerasrc", start=True, camera_id=None,
+                 cpus=None, idle_timeout=None, motion_gating=False):
+        """
+        With start=False nothing is parsed or played until start() or
+        start_in_background() is called; the first subscriber to a frame bus
+        also starts capture. cpus pins the pipeline's streaming threads to
+        those cores. With idle_timeout, capture is paused once nothing has
+        used the camera for that many seconds and resumed on demand. With
+        motion_gating, a still scene is only encoded every
+        keepalive_interval seconds. source_element may also be a callable
+        returning the description, resolved when capture first starts.
+        """
+        self.created_at = time.monotonic()
+        self.camera_id = camera_id
+        self.cpus = cpus
+        self.idle_timeout = idle_timeout
+        self.paused = False
+        self.last_demand = self.created_at
+        self.startup = {
+            "probe_cache": None,
+            "probe_ms": None,
+            "pipeline_ms": None,
+            "first_frame_ms": None,
+        }
 
         # Keep track of color format, JPEG quality, and encoder for the pipeline
         self.color_format = "RGBx"
         self.jpeg_quality = 85
         self.current_encoder = "jpegenc"  # Default encoder
+        self.bitrate = 2000  # kbit/s, used by x264enc/vp8enc/vp9enc
+        self.framerate = 30
+
+        # Buffering of the encode branches; 0 leaves the appsink unbounded
+        self.queue_buffers = 2
+        self.sink_max_buffers = 0
         
-        # Get supported encoders
-        self.supported_encoders = self._get_supported_encoders()
+        # Get supported encoders and formats, from disk when GStreamer is unchanged
+        self.supported_encoders, self.supported_formats = self._probe_capabilities()
         print("Supported encoders:", self.supported_encoders)
+        print("Supported formats:", self.supported_formats)
 
         # Instead, just store a static list of common resolutions:
         self.supported_resolutions = self._get_supported_resolutions()
         print("Supported resolutions:", self.supported_resolutions)
 
-        # Get supported formats and resolutions
-        self.supported_formats = self._get_supported_formats()
-        print("Supported formats:", self.supported_formats)
-
         print("Initializing GStreamer Camera...")
 
+        # Per-stage latency histograms and drop counters, served at /metrics
+        self.metrics = StageMetrics({"camera": camera_id} if camera_id else None)
+
         self.frame_queue = queue.Queue(maxsize=10)
+        self.frame_bus = FrameBus(on_subscribers_changed=self._watched)
+
+        # Simulcast: scaled MJPEG branches below the capture size, each with
+        # its own frame bus. A branch's valve is only open while it has viewers.
+        self.simulcast_resolutions = [(1920, 1080), (1280, 720), (640, 360)]
+        self.branch_buses = {
+            size: FrameBus(on_subscribers_changed=lambda count, size=size: self._branch_watched(size, count))
+            for size in self.simulcast_resolutions
+        }
+        self.branch_sinks = {}
+        self.latest_sample = None
+        self.stream_clients = {}
+        self._client_ids = itertools.count(1)
+        self.level_encoder = LevelEncoder(histogram=self.metrics.encode)
 
         self.current_width = 1280
         self.current_height = 720
-        self.pipeline = None
-        self.create_pipeline()
+
+        # Raw BGR branch for the tracker; scaled relative to the capture size
+        self.raw_scale = 0.5
+        self.raw_bus = FrameBus(on_subscribers_changed=self._watched)
+        # Full-size BGR tap for the adaptive MJPEG levels; its valve is only
+        # open while some client is on a level below the capture JPEG
+        self.level_bus = FrameBus(on_subscribers_changed=lambda count: self._update_level_valve())
 
         # Telemetry
         self.frame_count = 0
         self.start_time = time.time()
         self.current_fps = 0
-        self.pipeline_status = "Initializing"
+        self.pipeline_status = "Idle"
         self.resolution = "1280x720"
         self.frame_format = "JPEG"
 
-        # Tracking
-        self.tracker = None
-        self.tracking_active = False
-        self.tracked_bbox = (0, 0, 0, 0)
+        # Live reconfiguration: samples are counted so a switch can wait for
+        # the first frame produced with the new settings
+        self.samples_received = 0
+        self.last_sample_time = 0.0
+        self._sample_cond = threading.Condition()
+        self.switch_count = 0
+        self.last_switch = None
+
+        # Capture source. Exclusive sources (libcamerasrc, v4l2src) can only be
+        # opened by one pipeline at a time, so standby pipelines stay in NULL.
+        # videotestsrc can stand in for the camera in tests and benchmarks.
+        self.source_element = source_element
+        self.source_exclusive = False
+        if not callable(source_element):
+            self._resolve_source()
+
+        self.pipeline = None
+        self.pipeline_key = None
+        self.sink = None
+        self.raw_sink = None
+        self.level_sink = None
+        self.stream_sink = None
+        self.compressed_stream = None
+        self._incoming = None
+        self._incoming_sink = None
+        self._incoming_key = None
+        self._promoted = threading.Event()
+        self._switch_lock = threading.RLock()
+        self.pipeline_cache = PipelineCache(self._build_pipeline, max_size=3, dispose=self._dispose_pipeline)
+        self._bus_handlers = {}  # pipeline -> (bus, handler ids) connected by _build_pipeline
+
+        # Bus watch and stall watchdog; restarts capture when it fails
+        self.supervisor = PipelineSupervisor(self, stall_intervals=15)
+
+        # Last few seconds of encoded video, cut into clips on events
+        recordings_dir = os.environ.get("AEONBOT_RECORDINGS_DIR", "recordings")
+        self.recorder = EventRecorder(
+            frame_size=lambda: (self.current_width, self.current_height),
+            directory=os.path.join(recordings_dir, camera_id) if camera_id else recordings_dir,
+        )
+
+        # Tracking runs on its own thread at its own rate and resolution
+        self.tracker_worker = TrackerWorker(
+            self.raw_bus, self.get_tracker, max_width=640, histogram=self.metrics.tracker,
+            on_lost=lambda: self.recorder.trigger("tracking_lost"),
+        )
+        # Any number of further targets, with their trackers in a thread pool
+        self.multi_tracker = MultiTracker(
+            self.raw_bus, self.get_tracker, max_width=640, histogram=self.metrics.tracks,
+        )
+
+        # Motion gating: while the raw branch shows a still scene, the JPEG
+        # encoders only take a keep-alive frame every keepalive_interval;
+        # the first frame after motion goes straight through
+        self.keepalive_interval = 1.0
+        self._keepalive_due = {}  # JPEG branch (None for capture size) -> monotonic time
+        self.motion = MotionDetector(
+            self.raw_bus, enabled=motion_gating, histogram=self.metrics.motion,
+            on_change=self._motion_changed,
+        )
+
+        self.running = True
+        self.processing_thread = None
+        self.started = threading.Event()
+        self._start_lock = threading.Lock()
+        self._starting_lock = threading.Lock()
+        self._starting = False
+        if start:
+            self.start()
+
+    def _probe_capabilities(self):
+        """Return (encoders, formats), probing GStreamer only on a cache miss."""
+        started = time.monotonic()
+        gst_version = Gst.version_string()
+        cached = capability_cache.load(gst_version)
+        if cached is not None:
+            encoders, formats = cached["encoders"], cached["formats"]
+            self.startup["probe_cache"] = "hit"
+        else:
+            Gst.init(None)
+            encoders = self._get_supported_encoders()
+            formats = self._get_supported_formats()
+            capability_cache.save(gst_version, {"encoders": encoders, "formats": formats})
+            self.startup["probe_cache"] = "miss"
+        self.startup["probe_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return encoders, formats
+
+    def start(self):
+        """Start capture and the frame producer thread; later calls are no-ops."""
+        with self._start_lock:
+            if self.started.is_set():
+                return True
+            started = time.monotonic()
+            self.pipeline_status = "Starting"
+            Gst.init(None)
+            try:
+                self._resolve_source()
+            except ValueError as e:
+                print(f"Camera source not available: {e}", file=sys.stderr)
+                self.pipeline_status = "Error"
+                return False
+            if not self.create_pipeline():
+                self.pipeline_status = "Error"
+                return False
+            self.startup["pipeline_ms"] = round((time.monotonic() - started) * 1000, 1)
+            self.pipeline_status = "Playing"
+
+            # Single producer thread: publish each sample once to every viewer
+            self.processing_thread = threading.Thread(target=self._process_frames, daemon=True)
+            self.processing_thread.start()
+            self.supervisor.start()
+            self.started.set()
+            return True
+
+    def _resolve_source(self):
+        if callable(self.source_element):
+            self.source_element = self.source_element()
+        self.source_exclusive = self.source_element.split()[0] in ("libcamerasrc", "v4l2src")
+
+    def start_in_background(self):
+        """
+        Start or resume capture on a thread, so callers such as the server
+        lifespan never block.
+        """
+        with self._starting_lock:
+            if (self.started.is_set() and not self.paused) or self._starting:
+                return
+            self._starting = True
+
+        def run():
+            try:
+                if self.started.is_set():
+                    self.resume()
+                else:
+                    self.start()
+            finally:
+                self._starting = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def demand(self):
+        """A client wants frames: keep capture running, starting it if needed."""
+        self.last_demand = time.monotonic()
+        self.start_in_background()
+
+    def _watched(self, count):
+        if count:
+            self.demand()
+
+    def in_use(self):
+        """Whether anything is consuming frames right now."""
+        stream = self.compressed_stream
+        return (
+            self.frame_bus.subscribers > 0
+            or self.raw_bus.subscribers > 0
+            or any(bus.subscribers for bus in self.branch_buses.values())
+            or (stream is not None and stream.bus.subscribers > 0)
+            or self.tracker_worker.active
+            or self.multi_tracker.active
+        )
+
+    def _check_idle(self):
+        if not self.idle_timeout or self.paused or not self.started.is_set():
+            return
+        now = time.monotonic()
+        if self.in_use():
+            self.last_demand = now
+        elif now - self.last_demand > self.idle_timeout:
+            self.pause()
+
+    def pause(self):
+        """Stop capture while nobody is watching; demand() resumes it."""
+        with self._switch_lock:
+            # Checked again under the start lock so a viewer arriving now
+            # either cancels the pause or sees it and resumes
+            with self._starting_lock:
+                if self.paused or self.in_use() or time.monotonic() - self.last_demand <= self.idle_timeout:
+                    return
+                self.paused = True
+            self._stop_capture()
+            self.latest_sample = None
+            self.pipeline_status = "Idle"
+        print(f"Camera {self.camera_id or ''} idle, capture paused")
+
+    def _stop_capture(self):
+        if self.pipeline is not None:
+            self.pipeline.set_state(Gst.State.NULL)
+
+    def resume(self):
+        with self._switch_lock:
+            if not self.paused:
+                return True
+            self.pipeline_status = "Starting"
+            self.paused = False
+            success = self.recover()
+            self.pipeline_status = "Playing" if success else "Error"
+        if not success:
+            self.supervisor.report_failure("resume after idle failed")
+        print(f"Camera {self.camera_id or ''} resumed ({'ok' if success else 'failed'})")
+        return success
+
+    def _pin_thread(self):
+        """Pin the calling thread to this camera's cores."""
+        try:
+            os.sched_setaffinity(0, self.cpus)
+        except (AttributeError, OSError) as e:
+            print(f"Could not pin thread to cores {self.cpus}: {e}", file=sys.stderr)
+
+    def _on_stream_status(self, bus, message):
+        # Posted synchronously from the streaming thread that is starting
+        status_type, _ = message.parse_stream_status()
+        if status_type == Gst.StreamStatusType.ENTER:
+            self._pin_thread()
+
+    def _branch_watched(self, size, count):
+        self._watched(count)
+        self._update_valve(size)
 
     def _get_supported_resolutions(self):
         """
@@ -137,81 +411,393 @@ class GStreamerCamera:
         
         return encoders
 
-    def set_pipeline_settings(self, color_format=None, jpeg_quality=None, encoder=None):
+    def set_pipeline_settings(self, color_format=None, jpeg_quality=None, encoder=None, bitrate=None):
         """
-        Dynamically update pipeline settings such as color format, quality, and encoder,
-        then recreate the pipeline to apply changes.
+        Dynamically update pipeline settings such as color format, quality,
+        bitrate and encoder. See reconfigure() for how each change is applied.
         """
-        if color_format is not None:
+        return self.reconfigure(
+            color_format=color_format, jpeg_quality=jpeg_quality,
+            encoder=encoder, bitrate=bitrate
+        )
+
+    def reconfigure(self, width=None, height=None, color_format=None,
+                    jpeg_quality=None, encoder=None, bitrate=None,
+                    queue_buffers=None, sink_max_buffers=None):
+        """
+        Apply settings with the cheapest mechanism that works:
+        - encoder quality/bitrate are set on the running encoder element,
+        - resolution and color format renegotiate caps on the capture capsfilter,
+        - only an encoder or buffering change (a different element graph)
+          rebuilds the pipeline.
+        A caps change the source refuses falls back to a rebuild. The time until
+        the first sample with the new settings is recorded as switch latency.
+        """
+        started = time.monotonic()
+        rebuild = self.pipeline is None
+        renegotiate = False
+        retune = False
+
+        if encoder is not None and encoder in self.supported_encoders and encoder != self.current_encoder:
+            self.current_encoder = encoder
+            rebuild = True
+        if queue_buffers is not None and queue_buffers != self.queue_buffers:
+            self.queue_buffers = queue_buffers
+            rebuild = True
+        if sink_max_buffers is not None and sink_max_buffers != self.sink_max_buffers:
+            self.sink_max_buffers = sink_max_buffers
+            rebuild = True
+        if color_format is not None and color_format != self.color_format:
             self.color_format = color_format
-        if jpeg_quality is not None:
+            renegotiate = True
+        if width is not None and height is not None and (width, height) != (self.current_width, self.current_height):
+            # The set of simulcast branches depends on the capture size
+            if self._simulcast_sizes(width, height) != self._simulcast_sizes(self.current_width, self.current_height):
+                rebuild = True
+            self.current_width = width
+            self.current_height = height
+            renegotiate = True
+        if jpeg_quality is not None and jpeg_quality != self.jpeg_quality:
             self.jpeg_quality = jpeg_quality
-        if encoder is not None and encoder in self.supported_encoders:
-            self.current_encoder = encoder
+            retune = True
+        if bitrate is not None and bitrate != self.bitrate:
+            self.bitrate = bitrate
+            retune = True
 
-        # Re-create the pipeline with the updated settings
-        self.create_pipeline()
+        if not (rebuild or renegotiate or retune):
+            return True
+        if not self.started.is_set():
+            # Applied when capture starts
+            return True
+        if self.paused:
+            self.resume()
 
-    def create_pipeline(self):
-        # If pipeline exists, stop it
-        if self.pipeline:
-            self.pipeline.set_state(Gst.State.NULL)
+        with self._switch_lock:
+            if rebuild:
+                kind = "rebuild"
+                success = self.create_pipeline()
+            elif renegotiate:
+                kind = "caps"
+                success = self._renegotiate()
+                if retune:
+                    self._apply_encoder_properties()
+                if success:
+                    self.pipeline_key = self._pipeline_key()
+                    self._prepare_standby()
+                else:
+                    print("Live caps change failed, rebuilding pipeline", file=sys.stderr)
+                    kind = "rebuild"
+                    success = self.create_pipeline()
+            else:
+                kind = "live"
+                success = self._apply_encoder_properties() and self._wait_for_sample()
 
-        # Configure encoder element based on selected encoder
-        encoder_config = ""
-        decoder_config = ""
-        if self.current_encoder == "jpegenc":
-            encoder_config = f"jpegenc quality={self.jpeg_quality}"
-        elif self.current_encoder == "x264enc":
-            encoder_config = "x264enc tune=zerolatency speed-preset=ultrafast"
-            decoder_config = "! h264parse ! avdec_h264 ! jpegenc quality=85"
-        elif self.current_encoder == "vp8enc":
-            encoder_config = "vp8enc deadline=1"
-            decoder_config = "! vp8dec ! jpegenc quality=85"
-        elif self.current_encoder == "vp9enc":
-            encoder_config = "vp9enc deadline=1"
-            decoder_config = "! vp9dec ! jpegenc quality=85"
-        else:
-            # Default fallback to the encoder name if no special config needed
-            encoder_config = self.current_encoder
-
-        # Update pipeline string with dynamic encoder and decoder
-        self.pipeline_string = (
-            f'libcamerasrc ! '
-            f'video/x-raw,format={self.color_format},width={self.current_width},height={self.current_height},framerate=30/1 ! '
-            f'videoconvert ! {encoder_config} {decoder_config} ! '
-            f'appsink name=sink emit-signals=true sync=false'
+        self.switch_count += 1
+        self.last_switch = {
+            "kind": kind,
+            "success": success,
+            "latency_ms": round((time.monotonic() - started) * 1000, 1),
+        }
+        print(f"Pipeline switch ({kind}) took {self.last_switch['latency_ms']} ms")
+        return success
+
+    def _capture_caps(self, key=None):
+        width, height, color_format, *_ = key or self._pipeline_key()
+        return f'video/x-raw,format={color_format},width={width},height={height},framerate={self.framerate}/1'
+
+    def _raw_caps(self, key=None):
+        """Caps of the raw tracking branch, kept even for videoscale."""
+        width, height, _, _, raw_scale, *_ = key or self._pipeline_key()
+        raw_width = max(2, int(width * raw_scale) // 2 * 2)
+        raw_height = max(2, int(height * raw_scale) // 2 * 2)
+        return f'video/x-raw,format=BGR,width={raw_width},height={raw_height}'
+
+    def _apply_encoder_properties(self, pipeline=None):
+        """Push quality/bitrate to the running encoders without touching their state."""
+        pipeline = pipeline or self.pipeline
+        if pipeline is None:
+            return False
+        jpeg_encoder = pipeline.get_by_name('jpegenc')
+        if jpeg_encoder is not None:
+            jpeg_encoder.set_property("quality", self.jpeg_quality)
+        for width, height in self.simulcast_resolutions:
+            branch_encoder = pipeline.get_by_name(f'jpegenc_{width}x{height}')
+            if branch_encoder is not None:
+                branch_encoder.set_property("quality", self.jpeg_quality)
+        element = pipeline.get_by_name('encoder')
+        if element is not None:
+            name = element.get_factory().get_name()
+            if name == "x264enc":
+                element.set_property("bitrate", self.bitrate)
+            elif name in ("vp8enc", "vp9enc"):
+                element.set_property("target-bitrate", self.bitrate * 1000)
+        return jpeg_encoder is not None
+
+    def _renegotiate(self, timeout=2.0):
+        """
+        Change resolution/format by swapping the capsfilter caps in PLAYING.
+        Returns True once the capture branch is flowing with the new caps.
+        """
+        capture_caps = self.pipeline.get_by_name('capture_caps')
+        raw_caps = self.pipeline.get_by_name('raw_caps')
+        if capture_caps is None:
+            return False
+
+        requested = Gst.Caps.from_string(self._capture_caps())
+        capture_caps.set_property("caps", requested)
+        if raw_caps is not None:
+            raw_caps.set_property("caps", Gst.Caps.from_string(self._raw_caps()))
+
+        deadline = time.monotonic() + timeout
+        pad = capture_caps.get_static_pad("src")
+        while time.monotonic() < deadline:
+            if not self._wait_for_sample(deadline - time.monotonic()):
+                return False
+            current = pad.get_current_caps()
+            if current is not None and current.is_subset(requested):
+                return True
+        return False
+
+    def _wait_for_sample(self, timeout=1.0):
+        """Block until at least one more encoded sample arrives."""
+        self._open_gate()
+        with self._sample_cond:
+            target = self.samples_received + 1
+            return self._sample_cond.wait_for(lambda: self.samples_received >= target, timeout)
+
+    def _pipeline_key(self, encoder=None):
+        """Cache key for the element graph plus the caps it was built with."""
+        return (
+            self.current_width, self.current_height, self.color_format,
+            encoder or self.current_encoder, self.raw_scale,
+            self.queue_buffers, self.sink_max_buffers
         )
 
-        try:
-            print(f"Creating pipeline: {self.pipeline_string}")  # Debug print
-            self.pipeline = Gst.parse_launch(self.pipeline_string)
-            self.sink = self.pipeline.get_by_name('sink')
-            if not self.sink:
-                raise Exception("Failed to create sink element")
+    def _simulcast_sizes(self, width, height):
+        """Simulcast resolutions strictly smaller than the capture size."""
+        return [(w, h) for w, h in self.simulcast_resolutions if w < width and h < height]
 
-            self.sink.connect("new-sample", self._new_sample)
-            self.bus = self.pipeline.get_bus()
-            self.bus.add_signal_watch()
+    def available_resolutions(self):
+        """Resolutions /video-feed can serve right now, capture size first."""
+        return [(self.current_width, self.current_height)] + self._simulcast_sizes(
+            self.current_width, self.current_height
+        )
 
-            ret = self.pipeline.set_state(Gst.State.PLAYING)
-            if ret == Gst.StateChangeReturn.FAILURE:
-                raise Exception("Failed to start pipeline")
+    def _pipeline_description(self, key):
+        width, height, _, encoder, _, queue_buffers, sink_max_buffers = key
+        branch_queue = f'queue max-size-buffers={queue_buffers} leaky=downstream'
+        sink_buffering = (
+            f'max-buffers={sink_max_buffers} drop=true' if sink_max_buffers else 'drop=false'
+        )
 
-            # Wait for pipeline to start
-            ret = self.pipeline.get_state(5 * Gst.SECOND)
-            if ret[0] != Gst.StateChangeReturn.SUCCESS:
-                raise Exception("Pipeline failed to start")
+        # Viewers of /video-feed always get MJPEG straight from the capture.
+        # A compressed encoder gets its own branch, muxed for MSE and sent to
+        # clients natively instead of being decoded back to JPEG.
+        compressed_branch = ""
+        if encoder in STREAM_FORMATS:
+            stream_format = STREAM_FORMATS[encoder]
+            encoder_config = stream_format["encoder"].format(
+                bitrate=self.bitrate, bitrate_bps=self.bitrate * 1000
+            )
+            compressed_branch = (
+                f't. ! {branch_queue} ! '
+                f'videoconvert ! {encoder_config} ! {stream_format["muxer"]} ! '
+                f'appsink name=stream_sink emit-signals=true sync=false '
+            )
 
-            return True
+        # Scaled MJPEG branches start closed; _update_valve opens them on demand.
+        # The MJPEG queues are named so the motion gate can drop frames
+        # before any conversion or scaling
+        simulcast_branches = "".join(
+            f't. ! {branch_queue} name=jpeg_queue_{w}x{h} ! '
+            f'valve name=valve_{w}x{h} drop=true ! '
+            f'videoscale ! videoconvert ! video/x-raw,width={w},height={h} ! '
+            f'jpegenc name=jpegenc_{w}x{h} quality={self.jpeg_quality} ! '
+            f'appsink name=sink_{w}x{h} emit-signals=true sync=false {sink_buffering} '
+            for w, h in self._simulcast_sizes(width, height)
+        )
 
-        except Exception as e:
-            print(f"Pipeline creation failed: {e}", file=sys.stderr)
-            return False
+        # Capture once and tee: MJPEG branch for viewers, raw BGR branch for
+        # tracking. Named elements let quality, resolution and format change
+        # without a rebuild.
+        return (
+            f'{self.source_element} ! '
+            f'capsfilter name=capture_caps caps="{self._capture_caps(key)}" ! '
+            f'tee name=t '
+            f't. ! {branch_queue} name=jpeg_queue ! '
+            f'videoconvert ! jpegenc name=jpegenc quality={self.jpeg_quality} ! '
+            f'appsink name=sink emit-signals=true sync=false {sink_buffering} '
+            f'{compressed_branch}'
+            f'{simulcast_branches}'
+            f't. ! queue max-size-buffers=1 leaky=downstream ! '
+            f'valve name=level_valve drop=true ! videoconvert ! video/x-raw,format=BGR ! '
+            f'appsink name=level_sink emit-signals=true sync=false max-buffers=1 drop=true '
+            f't. ! queue max-size-buffers=1 leaky=downstream ! '
+            f'videoscale ! videoconvert ! '
+            f'capsfilter name=raw_caps caps="{self._raw_caps(key)}" ! '
+            f'appsink name=raw_sink emit-signals=true sync=false max-buffers=1 drop=true'
+        )
+
+    def _build_pipeline(self, key):
+        """Parse and wire a pipeline for key, leaving it in NULL."""
+        pipeline_string = self._pipeline_description(key)
+        print(f"Creating pipeline: {pipeline_string}")  # Debug print
+        pipeline = Gst.parse_launch(pipeline_string)
+        sink = pipeline.get_by_name('sink')
+        if not sink:
+            raise Exception("Failed to create sink element")
+
+        sink.connect("new-sample", self._new_sample)
+        raw_sink = pipeline.get_by_name('raw_sink')
+        if raw_sink:
+            raw_sink.connect("new-sample", self._new_raw_sample)
+        level_sink = pipeline.get_by_name('level_sink')
+        if level_sink:
+            level_sink.connect("new-sample", self._new_level_sample)
+        stream_sink = pipeline.get_by_name('stream_sink')
+        if stream_sink:
+            stream_sink.connect("new-sample", self._new_stream_sample)
+        for size in self._simulcast_sizes(key[0], key[1]):
+            branch_sink = pipeline.get_by_name(f'sink_{size[0]}x{size[1]}')
+            if branch_sink:
+                branch_sink.connect("new-sample", self._new_branch_sample, size)
+        for branch in [None] + self._simulcast_sizes(key[0], key[1]):
+            # Upstream of videoscale/videoconvert, so gated frames cost nothing
+            name = f'jpeg_queue_{branch[0]}x{branch[1]}' if branch else 'jpeg_queue'
+            jpeg_queue = pipeline.get_by_name(name)
+            if jpeg_queue is not None:
+                jpeg_queue.get_static_pad("src").add_probe(
+                    Gst.PadProbeType.BUFFER, self._gate_probe, branch
+                )
+        bus = pipeline.get_bus()
+        bus.add_signal_watch()
+        handlers = [bus.connect("message", self._on_bus_message, pipeline)]
+        if self.cpus:
+            bus.enable_sync_message_emission()
+            handlers.append(bus.connect("sync-message::stream-status", self._on_stream_status))
+        self._bus_handlers[pipeline] = (bus, handlers)
+        return pipeline
+
+    def _dispose_pipeline(self, pipeline):
+        """
+        Stop a pipeline for good and undo its bus watch. The watch's GSource
+        holds the bus and the message handler holds the pipeline, so without
+        this a discarded pipeline and its encoders are never freed.
+        """
+        pipeline.set_state(Gst.State.NULL)
+        bus, handlers = self._bus_handlers.pop(pipeline, (None, ()))
+        if bus is not None:
+            for handler in handlers:
+                bus.disconnect(handler)
+            if len(handlers) > 1:
+                bus.disable_sync_message_emission()
+            bus.remove_signal_watch()
+
+    def _prepare_standby(self):
+        """Pre-build pipelines for the other encoders at the current caps."""
+        prepared = 0
+        for encoder in self.supported_encoders:
+            if prepared >= self.pipeline_cache.max_size - 1:
+                break
+            if encoder == self.current_encoder:
+                continue
+            self.pipeline_cache.prepare(self._pipeline_key(encoder))
+            prepared += 1
+
+    def create_pipeline(self):
+        """
+        Start the pipeline for the current settings, reusing a pre-built
+        standby pipeline when one is cached. The frame bus keeps serving the
+        old pipeline's frames until the new one delivers its first sample,
+        at which point _new_sample swaps them over atomically.
+        """
+        with self._switch_lock:
+            key = self._pipeline_key()
+            old_pipeline, old_key = self.pipeline, self.pipeline_key
+            pipeline = None
+            try:
+                pipeline = self.pipeline_cache.take(key)
+                if pipeline is None:
+                    pipeline = self._build_pipeline(key)
+                self._apply_encoder_properties(pipeline)
+                self.pipeline_string = self._pipeline_description(key)
+
+                if old_pipeline is not None and self.source_exclusive:
+                    old_pipeline.set_state(Gst.State.NULL)
+
+                self._promoted.clear()
+                self._open_gate()
+                self._incoming_sink = pipeline.get_by_name('sink')
+                self._incoming = pipeline
+                self._incoming_key = key
+
+                ret = pipeline.set_state(Gst.State.PLAYING)
+                if ret == Gst.StateChangeReturn.FAILURE:
+                    raise Exception("Failed to start pipeline")
+
+                # The switch is complete once the first sample has been promoted
+                if not self._promoted.wait(5):
+                    raise Exception("Pipeline failed to start")
+
+                if old_pipeline is not None:
+                    self.pipeline_cache.put(old_key, old_pipeline)
+                self._prepare_standby()
+                return True
+
+            except Exception as e:
+                print(f"Pipeline creation failed: {e}", file=sys.stderr)
+                self._incoming = None
+                self._incoming_sink = None
+                if pipeline is not None and pipeline is not self.pipeline:
+                    self._dispose_pipeline(pipeline)
+                # Keep the previous pipeline running if we had to stop it
+                if old_pipeline is not None and self.pipeline is old_pipeline and self.source_exclusive:
+                    old_pipeline.set_state(Gst.State.PLAYING)
+                return False
+
+    def _promote_incoming(self):
+        """Make the incoming pipeline current; called on its first sample."""
+        pipeline = self._incoming
+        self.pipeline = pipeline
+        self.pipeline_key = self._incoming_key
+        self.sink = self._incoming_sink
+        self.raw_sink = pipeline.get_by_name('raw_sink')
+        self.level_sink = pipeline.get_by_name('level_sink')
+        self._update_level_valve()
+        self.stream_sink = pipeline.get_by_name('stream_sink')
+        self.compressed_stream = (
+            CompressedStream(self.pipeline_key[3], pipeline.get_by_name('encoder'))
+            if self.stream_sink is not None else None
+        )
+        self.branch_sinks = {
+            size: pipeline.get_by_name(f'sink_{size[0]}x{size[1]}')
+            for size in self._simulcast_sizes(self.pipeline_key[0], self.pipeline_key[1])
+        }
+        for size in self.branch_sinks:
+            self._update_valve(size)
+        self.bus = pipeline.get_bus()
+        self._incoming = None
+        self._incoming_sink = None
+        self._promoted.set()
 
     def _new_sample(self, sink):
         sample = sink.emit("pull-sample")
+        if sink is not self.sink:
+            # Either the first sample of a switched-in pipeline, or a late
+            # sample from the one being switched out
+            if sink is not self._incoming_sink:
+                return Gst.FlowReturn.OK
+            self._promote_incoming()
         if sample:
+            with self._sample_cond:
+                self.samples_received += 1
+                self.last_sample_time = time.monotonic()
+                self._sample_cond.notify_all()
+
+            self.metrics.frames_received.inc()
+            self.metrics.bytes_received.inc(sample.get_buffer().get_size())
+            self._observe_capture_latency(sample)
+
             self.frame_count += 1
             elapsed_time = time.time() - self.start_time
             if elapsed_time >= 1.0:
@@ -219,64 +805,302 @@ class GStreamerCamera:
                 self.frame_count = 0
                 self.start_time = time.time()
 
-            buffer = sample.get_buffer()
-            success, map_info = buffer.map(Gst.MapFlags.READ)
-            if success:
-                data = bytes(map_info.data)
-                buffer.unmap(map_info)
-                try:
-                    self.frame_queue.put_nowait(data)
-                except queue.Full:
-                    pass
+            try:
+                frame = SampleFrame(sample)
+            except ValueError:
+                return Gst.FlowReturn.OK
+            try:
+                self.frame_queue.put_nowait(frame)
+            except queue.Full:
+                self.metrics.queue_full.inc()
+                frame.release()
         return Gst.FlowReturn.OK
 
-    def generate_frames(self):
-        print("Starting frame generation...")
-        while True:
+    def _observe_capture_latency(self, sample):
+        """Pipeline running time now minus the buffer PTS."""
+        pts = sample.get_buffer().pts
+        pipeline = self.pipeline
+        clock = pipeline.get_clock() if pipeline else None
+        if clock is None or pts == Gst.CLOCK_TIME_NONE:
+            return
+        running_time = clock.get_time() - pipeline.get_base_time()
+        if running_time >= pts:
+            self.metrics.capture.observe((running_time - pts) / Gst.SECOND)
+
+    def _new_raw_sample(self, sink):
+        sample = sink.emit("pull-sample")
+        if sample and sink is self.raw_sink:
             try:
-                data = self.frame_queue.get(timeout=5)
-                frame_cv = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
-
-                # If tracking is active, always draw the bounding box in green
-                if self.tracking_active and self.tracker is not None:
-                    success, box = self.tracker.update(frame_cv)
-                    if success:
-                        (x, y, w, h) = [int(v) for v in box]
-                        self.tracked_bbox = (x, y, w, h)
-                    else:
-                        cv2.putText(frame_cv, "Tracking lost", (20, 30),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-
-                # Always draw the last known tracked_bbox in green
-                (bx, by, bw, bh) = self.tracked_bbox
-                cv2.rectangle(frame_cv, (bx, by), (bx + bw, by + bh), (0, 255, 0), 2)
-
-                ret, buffer = cv2.imencode('.jpg', frame_cv)
-                if not ret:
+                started = time.perf_counter()
+                raw_frame = RawFrame(sample)
+                self.metrics.raw_convert.observe(time.perf_counter() - started)
+                self.raw_bus.publish(raw_frame)
+            except ValueError as e:
+                print(f"Error reading raw sample: {e}", file=sys.stderr)
+        return Gst.FlowReturn.OK
+
+    def _new_branch_sample(self, sink, size):
+        sample = sink.emit("pull-sample")
+        if sample and sink is self.branch_sinks.get(size):
+            try:
+                self.branch_buses[size].publish(SampleFrame(sample))
+            except ValueError:
+                pass
+        return Gst.FlowReturn.OK
+
+    def _encode_allowed(self, branch=None):
+        """Whether the JPEG encoder of branch should take the current frame."""
+        if not self.motion.still:
+            return True
+        now = time.monotonic()
+        if now >= self._keepalive_due.get(branch, 0.0):
+            self._keepalive_due[branch] = now + self.keepalive_interval
+            return True
+        if branch is None:
+            # Capture is healthy, just gated; keep the stall watchdog quiet
+            self.last_sample_time = now
+            self.metrics.frames_gated.inc()
+        return False
+
+    def _gate_probe(self, pad, info, branch):
+        if self._encode_allowed(branch):
+            return Gst.PadProbeReturn.OK
+        return Gst.PadProbeReturn.DROP
+
+    def _open_gate(self):
+        """Let the next frame of every branch through, e.g. to confirm a switch."""
+        self._keepalive_due.clear()
+
+    def _motion_changed(self, moving):
+        if moving:
+            self._open_gate()
+
+    def set_motion_settings(self, gating=None, threshold=None, min_area=None, hold=None,
+                            keepalive_interval=None):
+        """Turn motion gating on or off and tune the detector."""
+        if keepalive_interval is not None:
+            self.keepalive_interval = max(0.05, float(keepalive_interval))
+        self.motion.configure(enabled=gating, threshold=threshold, min_area=min_area, hold=hold)
+        self._open_gate()
+        return True
+
+    async def motion_events(self, timeout=15):
+        """Yield motion_start/motion_end events as JSON, starting with the next one."""
+        bus = self.motion.events
+        seq, _ = bus.latest()
+        while self.running:
+            new_seq, event = await bus.wait_for_frame_async(seq, timeout=timeout)
+            if event is None:
+                continue
+            seq = new_seq
+            yield event
+
+    def _update_level_valve(self):
+        """Open the full-size raw tap while any adaptive client encodes from it."""
+        pipeline = self.pipeline
+        if pipeline is None:
+            return
+        valve = pipeline.get_by_name('level_valve')
+        if valve is not None:
+            valve.set_property("drop", self.level_bus.subscribers == 0)
+
+    def _new_level_sample(self, sink):
+        sample = sink.emit("pull-sample")
+        if sample and sink is self.level_sink:
+            try:
+                self.level_bus.publish(RawFrame(sample))
+            except ValueError as e:
+                print(f"Error reading level sample: {e}", file=sys.stderr)
+        return Gst.FlowReturn.OK
+
+    def _update_valve(self, size):
+        """Open a simulcast branch while it has subscribers, close it otherwise."""
+        pipeline = self.pipeline
+        if pipeline is None:
+            return
+        valve = pipeline.get_by_name(f'valve_{size[0]}x{size[1]}')
+        if valve is not None:
+            valve.set_property("drop", self.branch_buses[size].subscribers == 0)
+
+    def _new_stream_sample(self, sink):
+        sample = sink.emit("pull-sample")
+        stream = self.compressed_stream
+        if sample and sink is self.stream_sink and stream is not None:
+            try:
+                self.metrics.stream_bytes.inc(sample.get_buffer().get_size())
+                chunk = stream.push_sample(sample)
+                if chunk is not None:
+                    self.recorder.add_chunk(chunk, stream)
+            except Exception as e:
+                print(f"Error reading stream sample: {e}", file=sys.stderr)
+        return Gst.FlowReturn.OK
+
+    @property
+    def tracking_active(self):
+        return self.tracker_worker.active
+
+    @property
+    def tracking_lost(self):
+        return self.tracker_worker.lost
+
+    @property
+    def tracked_bbox(self):
+        return self.tracker_worker.bbox
+
+    def _process_frames(self):
+        """
+        Producer loop for the frame bus. Each encoded appsink sample is
+        published once, untouched, no matter how many viewers are subscribed.
+        Tracking runs in TrackerWorker off the raw branch, so no JPEG is ever
+        decoded here; the bbox is reported through telemetry and drawn by the
+        client.
+        """
+        print("Starting frame processing...")
+        if self.cpus:
+            self._pin_thread()
+        while self.running:
+            self._check_idle()
+            try:
+                sample_frame = self.frame_queue.get(timeout=5)
+                self.metrics.queue_wait.observe(time.monotonic() - sample_frame.arrival)
+                if self.startup["first_frame_ms"] is None:
+                    self.startup["first_frame_ms"] = round((sample_frame.arrival - self.created_at) * 1000, 1)
+                self.latest_sample = sample_frame
+                self.recorder.add_frame(sample_frame)
+
+                # Nobody is watching; keep the latest sample for snapshots only
+                if self.frame_bus.subscribers == 0:
                     continue
 
-                yield (
-                    b"--frame\r\n"
-                    b"Content-Type: image/jpeg\r\n\r\n" + buffer.tobytes() + b"\r\n"
-                )
+                self.frame_bus.publish(sample_frame)
 
             except queue.Empty:
-                time.sleep(0.1)
                 continue
             except Exception as e:
-                print(f"Error in generate_frames: {e}", file=sys.stderr)
+                print(f"Error in _process_frames: {e}", file=sys.stderr)
                 time.sleep(0.1)
                 continue
 
+    def generate_frames(self):
+        """
+        Yield multipart MJPEG parts from the shared frame bus. Header, payload
+        and trailer are separate writes; the payload is a memoryview into the
+        frame, which stays referenced until the write has completed.
+        """
+        print("Starting frame generation...")
+        self.frame_bus.subscribe()
+        try:
+            last_seq, _ = self.frame_bus.latest()
+            while self.running:
+                last_seq, frame = self.frame_bus.wait_for_frame(last_seq, timeout=5)
+                if frame is None:
+                    continue
+                yield from multipart_parts(frame)
+        finally:
+            self.frame_bus.unsubscribe()
+
+    def next_client_id(self):
+        return next(self._client_ids)
+
+    def frame_bus_for(self, size=None):
+        """Frame bus for a requested resolution; None means the capture size."""
+        if size is None or tuple(size) == (self.current_width, self.current_height):
+            return self.frame_bus
+        if tuple(size) not in self._simulcast_sizes(self.current_width, self.current_height):
+            raise ValueError(f"Unsupported stream resolution: {size[0]}x{size[1]}")
+        return self.branch_buses[tuple(size)]
+
+    async def generate_frames_async(self, peer=None, size=None, adaptive=True):
+        """
+        Async MJPEG generator for /video-feed. Awaits new frames on the bus
+        without holding a worker thread. Because the generator only resumes
+        once the previous chunk has been sent, a slow client simply skips to
+        the newest frame; skipped frames are counted as dropped. size picks a
+        simulcast branch; None streams the capture resolution.
+
+        With adaptive on (capture resolution only), each client's drain rate
+        picks its JPEG quality level and frame rate; lower levels are encoded
+        at capture size from the full-size raw tap, once per frame and shared
+        by every client on that level.
+        """
+        frame_bus = self.frame_bus_for(size)
+        controller = AdaptiveController() if adaptive and frame_bus is self.frame_bus else None
+        meter = BandwidthMeter()
+        client = StreamClient(self.next_client_id(), peer)
+        client.resolution = f"{size[0]}x{size[1]}" if size else None
+        self.stream_clients[client.client_id] = client
+        frame_bus.subscribe()
+        level_tap = False  # subscribed to level_bus
+        try:
+            last_seq, _ = frame_bus.latest()
+            next_due = 0.0
+            while self.running:
+                seq, frame = await frame_bus.wait_for_frame_async(last_seq, timeout=5)
+                if frame is None:
+                    continue
+                if last_seq and seq - last_seq > 1:
+                    client.frames_dropped += seq - last_seq - 1
+                    self.metrics.frames_dropped.inc(seq - last_seq - 1)
+                last_seq = seq
+
+                level = 0
+                if controller is not None:
+                    now = time.monotonic()
+                    if controller.fps < FPS_STEPS[0] and now < next_due:
+                        client.frames_throttled += 1
+                        continue
+                    next_due = now + 1.0 / controller.fps - 0.01
+
+                    if (controller.level > 0) != level_tap:
+                        level_tap = controller.level > 0
+                        if level_tap:
+                            self.level_bus.subscribe()
+                        else:
+                            self.level_bus.unsubscribe()
+                    if controller.level > 0:
+                        # Until the tap delivers, the capture JPEG goes out as is
+                        raw_seq, raw_frame = self.level_bus.latest()
+                        if raw_frame is not None:
+                            try:
+                                frame = await self.level_encoder.get(raw_seq, raw_frame, controller.quality)
+                                level = controller.level
+                            except Exception as e:
+                                print(f"Error encoding adaptive level: {e}", file=sys.stderr)
+
+                frame_interval = 1.0 / self.current_fps if self.current_fps else 1.0 / 30
+                started = time.monotonic()
+                header, payload, trailer = multipart_parts(frame)
+                yield header
+                yield payload
+                yield trailer
+                send_time = time.monotonic() - started
+                self.metrics.socket_write.observe(send_time)
+                if frame.arrival is not None:
+                    self.metrics.end_to_end.observe(time.monotonic() - frame.arrival)
+
+                client.record_send(len(frame), send_time, frame_interval)
+                meter.add(len(frame))
+                client.bandwidth = meter.bytes_per_second
+                if controller is not None:
+                    controller.record(level, len(frame), send_time)
+                    client.quality = controller.quality or self.jpeg_quality
+                    client.target_fps = controller.fps
+        finally:
+            if level_tap:
+                self.level_bus.unsubscribe()
+            frame_bus.unsubscribe()
+            self.stream_clients.pop(client.client_id, None)
+
     def set_resolution(self, width: int, height: int):
         """Change the camera resolution."""
         try:
-            # Store new resolution
-            self.current_width = width
-            self.current_height = height
-            
-            # Recreate pipeline with new resolution
-            success = self.create_pipeline()
+            # A tracker initialized at the old size would report garbage
+            if self.tracking_active:
+                self.reset_tracking()
+            self.multi_tracker.clear()
+
+            # Renegotiate caps on the running pipeline (rebuilds only if needed)
+            success = self.reconfigure(width=width, height=height)
             
             if success:
                 # Update telemetry
@@ -288,93 +1112,170 @@ class GStreamerCamera:
             print(f"Failed to set resolution: {e}", file=sys.stderr)
             return False
 
-    def _bus_monitor(self):
-        while self.running:
-            try:
-                message = self.bus.timed_pop_filtered(
-                    1000000000,  # 1 second timeout
-                    Gst.MessageType.ERROR | Gst.MessageType.EOS | Gst.MessageType.STATE_CHANGED | 
-                    Gst.MessageType.WARNING
-                )
-                
-                if message:
-                    if message.type == Gst.MessageType.ERROR:
-                        err, debug = message.parse_error()
-                        print(f"GStreamer Error: {err}", file=sys.stderr)
-                        print(f"Debug details: {debug}", file=sys.stderr)
-                        self.pipeline.set_state(Gst.State.NULL)
-                        break
-                    elif message.type == Gst.MessageType.WARNING:
-                        warn, debug = message.parse_warning()
-                        print(f"GStreamer Warning: {warn}", file=sys.stderr)
-                        print(f"Debug details: {debug}", file=sys.stderr)
-                    elif message.type == Gst.MessageType.EOS:
-                        print("End of stream")
-                        self.pipeline.set_state(Gst.State.NULL)
-                        break
-                    elif message.type == Gst.MessageType.STATE_CHANGED:
-                        if message.src == self.pipeline:
-                            old_state, new_state, pending_state = message.parse_state_changed()
-                            print(f"Pipeline state changed from {old_state.value_nick} to {new_state.value_nick}")
-            except Exception as e:
-                print(f"Error in bus monitor: {e}", file=sys.stderr)
+    def frame_interval(self):
+        return 1.0 / self.framerate
 
-    def start_tracking(self, x: int, y: int, w: int, h: int) -> bool:
-        try:
-            # Wait up to 1 second for a frame if the queue is empty
-            initial_frame = None
-            for _ in range(10):  # 10 retries x 0.1s = 1 second
-                if not self.frame_queue.empty():
-                    initial_frame = self.frame_queue.get_nowait()
-                    break
-                else:
-                    time.sleep(0.1)
+    def _on_bus_message(self, bus, message, pipeline):
+        """Bus watch for one pipeline, dispatched by the supervisor's GLib main loop."""
+        current = pipeline is self.pipeline
+        if message.type == Gst.MessageType.ERROR:
+            err, debug = message.parse_error()
+            print(f"GStreamer Error: {err}", file=sys.stderr)
+            print(f"Debug details: {debug}", file=sys.stderr)
+            if current:
+                self.metrics.pipeline_errors.inc()
+                self.supervisor.report_failure(f"error: {err.message}")
+        elif message.type == Gst.MessageType.WARNING:
+            warn, debug = message.parse_warning()
+            print(f"GStreamer Warning: {warn}", file=sys.stderr)
+            print(f"Debug details: {debug}", file=sys.stderr)
+        elif message.type == Gst.MessageType.EOS:
+            print("End of stream")
+            if current:
+                self.supervisor.report_failure("end of stream")
+        elif message.type == Gst.MessageType.STATE_CHANGED:
+            if current and message.src == pipeline:
+                old_state, new_state, pending_state = message.parse_state_changed()
+                print(f"Pipeline state changed from {old_state.value_nick} to {new_state.value_nick}")
 
-            # If still no frame, bail
-            if initial_frame is None:
-                print("No frame available to start tracking.", file=sys.stderr)
-                return False
-            
-            # Convert raw bytes to a proper image (OpenCV)
-            nparr = np.frombuffer(initial_frame, np.uint8)
-            frame_cv = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-            # Create and initialize the tracker
-            self.tracker = self.get_tracker()
-            if self.tracker is None:
-                print("No suitable tracker available", file=sys.stderr)
-                return False
+    def recover(self, rebuild=False):
+        """
+        Get samples flowing again after an error or stall: restart the
+        current pipeline in place, or with rebuild=True (or if that fails)
+        discard it and build a fresh one. Returns True once samples arrive.
+        """
+        with self._switch_lock:
+            pipeline = self.pipeline
+            if pipeline is not None and not rebuild:
+                pipeline.set_state(Gst.State.NULL)
+                ret = pipeline.set_state(Gst.State.PLAYING)
+                if ret != Gst.StateChangeReturn.FAILURE and self._wait_for_sample(2.0):
+                    return True
+            if pipeline is not None:
+                # A broken pipeline must not be parked in the cache for reuse
+                self._dispose_pipeline(pipeline)
+                self.pipeline = None
+                self.pipeline_key = None
+            return self.create_pipeline()
 
-            self.tracker.init(frame_cv, (x, y, w, h))
-            self.tracked_bbox = (x, y, w, h)
-            self.tracking_active = True
-            print(f"{type(self.tracker).__name__} tracker initialized with bbox:", self.tracked_bbox)
-            return True
+    def start_tracking(self, x: int, y: int, w: int, h: int) -> bool:
+        self.start_in_background()
+        if not self.started.wait(5):
+            print("Camera not started; cannot track.", file=sys.stderr)
+            return False
+        try:
+            return self.tracker_worker.start(
+                (x, y, w, h), (self.current_width, self.current_height)
+            )
         except Exception as e:
             print(f"Error starting tracker: {e}", file=sys.stderr)
             return False
 
     def reset_tracking(self):
         """Reset the tracker."""
-        self.tracker = None
-        self.tracking_active = False
-        self.tracked_bbox = (0, 0, 0, 0)
+        self.tracker_worker.reset()
         print("Tracking has been reset.")
 
-    def get_telemetry(self):
+    def add_tracks(self, boxes):
+        """Track each (x, y, w, h) box as its own target; returns their track ids."""
+        self.start_in_background()
+        if not self.started.wait(5):
+            print("Camera not started; cannot track.", file=sys.stderr)
+            return [None] * len(boxes)
+        try:
+            return self.multi_tracker.add(boxes, (self.current_width, self.current_height))
+        except Exception as e:
+            print(f"Error starting trackers: {e}", file=sys.stderr)
+            return [None] * len(boxes)
+
+    def remove_track(self, track_id):
+        return self.multi_tracker.remove(track_id)
+
+    def clear_tracks(self):
+        self.multi_tracker.clear()
+
+    def get_tracks(self):
+        return self.multi_tracker.states()
+
+    async def track_states(self, timeout=15):
+        """Yield the JSON state of every track once per tracked frame."""
+        bus = self.multi_tracker.bus
+        seq, _ = bus.latest()
+        while self.running:
+            new_seq, states = await bus.wait_for_frame_async(seq, timeout=timeout)
+            if states is None:
+                continue
+            seq = new_seq
+            yield states
+
+    def get_capabilities(self):
+        """Fields that are fixed for the lifetime of the camera."""
+        return {
+            "supported_resolutions": [f"{w}x{h}" for w, h in self.supported_resolutions],
+            "supported_formats": self.supported_formats,
+            "supported_encoders": self.supported_encoders,
+        }
+
+    def get_tracking_telemetry(self):
+        """The fields that change at tracker rate, cheap enough to sample at 10 Hz."""
+        return {
+            "tracking_active": self.tracking_active,
+            "tracking_lost": self.tracking_lost,
+            "tracked_bbox": list(self.tracked_bbox),
+            "tracks": self.multi_tracker.states(),
+            "motion": self.motion.active,
+        }
+
+    def get_telemetry(self, include_capabilities=True):
         """Get camera telemetry data."""
         telemetry = {
+            "camera_id": self.camera_id,
             "fps": f"{self.current_fps:.1f}",
             "status": self.pipeline_status,
+            "idle": self.paused,
             "resolution": f"{self.current_width}x{self.current_height}",
             "format": self.frame_format,
-            "supported_resolutions": [f"{w}x{h}" for w, h in self.supported_resolutions],
-            "supported_formats": self.supported_formats,
             "current_encoder": self.current_encoder,
-            "supported_encoders": self.supported_encoders
+            **self.get_tracking_telemetry(),
+            "tracker": self.tracker_worker.get_telemetry(),
+            "multi_tracker": self.multi_tracker.get_telemetry(),
+            "switch_count": self.switch_count,
+            "last_switch": self.last_switch,
+            "pipeline_cache": self.pipeline_cache.get_telemetry(),
+            "simulcast": {
+                f"{w}x{h}": {
+                    "subscribers": self.branch_buses[(w, h)].subscribers,
+                    "active": (w, h) in self.branch_sinks and self.branch_buses[(w, h)].subscribers > 0,
+                }
+                for w, h in self._simulcast_sizes(self.current_width, self.current_height)
+            },
+            "compressed_stream": self.compressed_stream.get_telemetry() if self.compressed_stream else None,
+            "stream_clients": [c.as_dict() for c in list(self.stream_clients.values())],
+            "startup": self.startup,
+            "supervisor": self.supervisor.get_telemetry(),
+            "recorder": self.recorder.get_telemetry(),
+            "motion_gating": {
+                **self.motion.get_telemetry(),
+                "keepalive_interval": self.keepalive_interval,
+                "frames_gated": self.metrics.frames_gated.value,
+            },
         }
+        if include_capabilities:
+            telemetry.update(self.get_capabilities())
         return telemetry
 
+    def close(self):
+        """Stop the background threads that outlive a server shutdown."""
+        self.supervisor.stop()
+        self.recorder.stop()
+        self.motion.stop()
+        self.tracker_worker.stop()
+        self.multi_tracker.stop()
+        if self.pipeline is not None:
+            self._dispose_pipeline(self.pipeline)
+            self.pipeline = None
+        self.pipeline_cache.clear()
+
     def get_tracker(self):
         try:
             # Try CSRT first (most accurate)
@@ -402,5 +1303,17 @@ class GStreamerCamera:
     def __del__(self):
         print("Cleaning up camera resources...")
         self.running = False
-        if hasattr(self, 'pipeline'):
-            self.pipeline.set_state(Gst.State.NULL) 
\ No newline at end of file
+        if hasattr(self, 'supervisor'):
+            self.supervisor.stop()
+        if hasattr(self, 'tracker_worker'):
+            self.tracker_worker.stop()
+        if hasattr(self, 'recorder'):
+            self.recorder.stop()
+        if hasattr(self, 'motion'):
+            self.motion.stop()
+        if hasattr(self, 'multi_tracker'):
+            self.multi_tracker.stop()
+        if getattr(self, 'pipeline', None) is not None:
+            self._dispose_pipeline(self.pipeline)
+        if hasattr(self, 'pipeline_cache'):
+            self.pipeline_cache.clear() 
\ No newline at end of file
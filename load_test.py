@@ -0,0 +1,406 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# End-to-end load test for main.app. Starts uvicorn with a synthetic or
+# videotestsrc camera (or targets a running server with --port/--pid), then
+# ramps up concurrent /video-feed viewers alongside SSE telemetry,
+# control-endpoint clients and conditional /snapshot pollers. Reports
+# per-client fps, frame inter-arrival percentiles and server CPU/memory for
+# each stage.
+
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * (len(ordered) - 1) + 0.5))]
+
+
+def ms(value):
+    return round(value * 1000, 1) if value is not None else None
+
+
+async def open_stream(host, port, path):
+    """Send an HTTP/1.0 GET so the body is not chunked; return (reader, writer, status)."""
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.0\r\nHost: {host}\r\n\r\n".encode())
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    return reader, writer, status
+
+
+async def http_request(host, port, method, path, body=None):
+    """One request on a fresh connection; returns (status, seconds)."""
+    started = time.monotonic()
+    reader, writer = await asyncio.open_connection(host, port)
+    payload = json.dumps(body).encode() if body is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.0\r\nHost: {host}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n".encode()
+        + payload
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status = int(response.split(b" ", 2)[1]) if response else 0
+    return status, time.monotonic() - started
+
+
+class ViewerClient:
+    """Reads /video-feed and records the arrival time and size of every frame."""
+
+    def __init__(self, host, port, path):
+        self.host, self.port, self.path = host, port, path
+        self.arrivals = []
+        self.bytes = 0
+        self.error = None
+
+    async def run(self):
+        writer = None
+        try:
+            reader, writer, status = await open_stream(self.host, self.port, self.path)
+            if status != 200:
+                self.error = f"HTTP {status}"
+                return
+            while True:
+                headers = await reader.readuntil(b"\r\n\r\n")
+                length = None
+                for line in headers.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length is None:
+                    self.error = "frame without Content-Length"
+                    return
+                await reader.readexactly(length + 2)  # payload and trailing CRLF
+                self.arrivals.append(time.monotonic())
+                self.bytes += length
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            self.error = self.error or f"disconnected: {e!r}"
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+class SSEClient:
+    """Reads /api/camera-events and records the arrival time of every event."""
+
+    def __init__(self, host, port, path="/api/camera-events"):
+        self.host, self.port, self.path = host, port, path
+        self.arrivals = []
+        self.events = {}
+        self.error = None
+
+    async def run(self):
+        writer = None
+        try:
+            reader, writer, status = await open_stream(self.host, self.port, self.path)
+            if status != 200:
+                self.error = f"HTTP {status}"
+                return
+            event = None
+            while True:
+                line = (await reader.readline()).rstrip(b"\r\n")
+                if not line and reader.at_eof():
+                    self.error = "stream closed"
+                    return
+                if line.startswith(b"event:"):
+                    event = line.split(b":", 1)[1].strip().decode()
+                elif not line and event is not None:
+                    self.arrivals.append(time.monotonic())
+                    self.events[event] = self.events.get(event, 0) + 1
+                    event = None
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            self.error = f"disconnected: {e!r}"
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+class ControlClient:
+    """Calls the control endpoints in a loop and records request latency."""
+
+    REQUESTS = [
+        ("GET", "/api/telemetry", None),
+        ("GET", "/api/stream-clients", None),
+        ("POST", "/reset-tracking", None),
+    ]
+
+    def __init__(self, host, port, interval=0.5):
+        self.host, self.port, self.interval = host, port, interval
+        self.latencies = []
+        self.failures = 0
+        self.error = None
+
+    async def run(self):
+        index = 0
+        while True:
+            method, path, body = self.REQUESTS[index % len(self.REQUESTS)]
+            index += 1
+            try:
+                status, latency = await http_request(self.host, self.port, method, path, body)
+                if status == 200:
+                    self.latencies.append((time.monotonic(), latency))
+                else:
+                    self.failures += 1
+            except (ConnectionError, OSError) as e:
+                self.failures += 1
+                self.error = repr(e)
+            await asyncio.sleep(self.interval)
+
+
+class SnapshotPoller:
+    """Polls /snapshot with If-None-Match, like a dashboard refreshing a still."""
+
+    def __init__(self, host, port, path="/snapshot", interval=0.2):
+        self.host, self.port, self.path, self.interval = host, port, path, interval
+        self.latencies = []
+        self.statuses = {}
+        self.error = None
+
+    async def run(self):
+        etag = None
+        while True:
+            started = time.monotonic()
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                conditional = f"If-None-Match: {etag}\r\n" if etag else ""
+                writer.write(f"GET {self.path} HTTP/1.0\r\nHost: {self.host}\r\n{conditional}\r\n".encode())
+                await writer.drain()
+                response = await reader.read()
+                writer.close()
+                head = response.split(b"\r\n\r\n", 1)[0]
+                status = int(head.split(b" ", 2)[1])
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"etag:"):
+                        etag = line.split(b":", 1)[1].strip().decode()
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+                self.latencies.append((time.monotonic(), time.monotonic() - started))
+            except (ConnectionError, OSError, IndexError, ValueError) as e:
+                self.error = repr(e)
+            await asyncio.sleep(self.interval)
+
+
+class ResourceSampler:
+    """Samples CPU and resident memory of the server process from /proc."""
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []  # (time, cpu fraction of one core, rss bytes)
+
+    def _read(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / CLK_TCK  # utime + stime
+        rss = 0
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) * 1024
+        return cpu, rss
+
+    async def run(self):
+        last_time, (last_cpu, _) = time.monotonic(), self._read()
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            cpu, rss = self._read()
+            self.samples.append((now, (cpu - last_cpu) / (now - last_time), rss))
+            last_time, last_cpu = now, cpu
+
+
+def viewer_stats(viewers, window_start, window_end):
+    duration = window_end - window_start
+    per_client_fps = []
+    gaps = []
+    total_bytes = 0
+    for viewer in viewers:
+        arrivals = [t for t in viewer.arrivals if window_start <= t <= window_end]
+        per_client_fps.append(len(arrivals) / duration)
+        gaps.extend(b - a for a, b in zip(arrivals, arrivals[1:]))
+        total_bytes += viewer.bytes
+    return {
+        "fps_min": round(min(per_client_fps), 1) if per_client_fps else None,
+        "fps_median": round(statistics.median(per_client_fps), 1) if per_client_fps else None,
+        "fps_per_client": [round(fps, 1) for fps in per_client_fps],
+        "interarrival_ms": {"p50": ms(percentile(gaps, 0.5)), "p99": ms(percentile(gaps, 0.99))},
+        "errors": [v.error for v in viewers if v.error],
+    }
+
+
+async def run_stage(args, host, port, viewer_count, sampler):
+    path = "/video-feed" + (f"?{args.params}" if args.params else "")
+    viewers = [ViewerClient(host, port, path) for _ in range(viewer_count)]
+    sse_clients = [SSEClient(host, port) for _ in range(args.sse)]
+    controls = [ControlClient(host, port) for _ in range(args.control)]
+    snapshot_path = "/snapshot" + (f"?w={args.poll_width}" if args.poll_width else "")
+    pollers = [SnapshotPoller(host, port, snapshot_path) for _ in range(args.pollers)]
+    tasks = [asyncio.create_task(c.run()) for c in viewers + sse_clients + controls + pollers]
+
+    await asyncio.sleep(args.warmup)
+    window_start = time.monotonic()
+    await asyncio.sleep(args.duration)
+    window_end = time.monotonic()
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    # Let the server notice the disconnects before the next stage
+    await asyncio.sleep(1.0)
+
+    result = {"viewers": viewer_count, "sse_clients": args.sse, "control_clients": args.control}
+    result.update(viewer_stats(viewers, window_start, window_end))
+
+    sse_gaps = []
+    for client in sse_clients:
+        arrivals = [t for t in client.arrivals if window_start <= t <= window_end]
+        sse_gaps.extend(b - a for a, b in zip(arrivals, arrivals[1:]))
+    result["sse"] = {
+        "events_per_second": round(sum(
+            len([t for t in c.arrivals if window_start <= t <= window_end]) for c in sse_clients
+        ) / (window_end - window_start), 1),
+        "interarrival_ms": {"p50": ms(percentile(sse_gaps, 0.5)), "p99": ms(percentile(sse_gaps, 0.99))},
+        "errors": [c.error for c in sse_clients if c.error],
+    }
+
+    latencies = [latency for c in controls for t, latency in c.latencies if window_start <= t <= window_end]
+    result["control"] = {
+        "requests": len(latencies),
+        "failures": sum(c.failures for c in controls),
+        "latency_ms": {"p50": ms(percentile(latencies, 0.5)), "p99": ms(percentile(latencies, 0.99))},
+    }
+
+    if pollers:
+        latencies = [latency for p in pollers for t, latency in p.latencies if window_start <= t <= window_end]
+        statuses = {}
+        for poller in pollers:
+            for status, count in poller.statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+        result["snapshot"] = {
+            "pollers": len(pollers),
+            "statuses": statuses,
+            "latency_ms": {"p50": ms(percentile(latencies, 0.5)), "p99": ms(percentile(latencies, 0.99))},
+            "errors": [p.error for p in pollers if p.error],
+        }
+
+    if sampler is not None:
+        window = [s for s in sampler.samples if window_start <= s[0] <= window_end]
+        result["server"] = {
+            "cpu_percent": round(statistics.mean(s[1] for s in window) * 100, 1) if window else None,
+            "rss_mb": round(max(s[2] for s in window) / 2 ** 20, 1) if window else None,
+        }
+    return result
+
+
+def start_server(args):
+    env = dict(os.environ, AEONBOT_CAMERA=args.camera)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port)],
+        env=env, stdout=subprocess.DEVNULL if args.quiet else None, stderr=subprocess.STDOUT,
+    )
+
+
+async def wait_for_server(host, port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status, _ = await http_request(host, port, "GET", "/api/telemetry")
+            if status == 200:
+                return True
+        except (ConnectionError, OSError):
+            pass
+        await asyncio.sleep(0.5)
+    return False
+
+
+async def run(args, pid):
+    host = "127.0.0.1"
+    if not await wait_for_server(host, args.port):
+        print("Server did not come up", file=sys.stderr)
+        return []
+
+    sampler = ResourceSampler(pid) if pid else None
+    sampler_task = asyncio.create_task(sampler.run()) if sampler else None
+    results = []
+    try:
+        for viewer_count in args.viewers:
+            result = await run_stage(args, host, args.port, viewer_count, sampler)
+            results.append(result)
+            server = result.get("server", {})
+            print(
+                f'{viewer_count:>4} viewers: fps min {result["fps_min"]} median {result["fps_median"]}  '
+                f'gap p50 {result["interarrival_ms"]["p50"]} p99 {result["interarrival_ms"]["p99"]} ms  '
+                f'control p99 {result["control"]["latency_ms"]["p99"]} ms  '
+                f'cpu {server.get("cpu_percent")}%  rss {server.get("rss_mb")} MB'
+            )
+    finally:
+        if sampler_task is not None:
+            sampler_task.cancel()
+    return results
+
+
+def supported_viewers(results, target_fps):
+    """Largest stage where every viewer still got at least target_fps."""
+    supported = 0
+    for result in results:
+        if result["fps_min"] is not None and result["fps_min"] >= target_fps and not result["errors"]:
+            supported = max(supported, result["viewers"])
+    return supported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the aeonbot FastAPI server")
+    parser.add_argument("--camera", default="synthetic", choices=["synthetic", "videotestsrc", "libcamera"])
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--pid", type=int, help="measure an already running server instead of starting one")
+    parser.add_argument("--viewers", default="1,2,5,10,20", help="comma-separated viewer counts, one stage each")
+    parser.add_argument("--sse", type=int, default=2, help="SSE telemetry clients per stage")
+    parser.add_argument("--control", type=int, default=1, help="control-endpoint clients per stage")
+    parser.add_argument("--pollers", type=int, default=0, help="conditional /snapshot pollers per stage")
+    parser.add_argument("--poll-width", type=int, help="poll /snapshot?w=N thumbnails instead of full frames")
+    parser.add_argument("--params", default="", help="query string for /video-feed, e.g. res=640x360")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per stage")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds discarded at the start of each stage")
+    parser.add_argument("--target-fps", type=float, default=25.0, help="minimum per-viewer fps to count as supported")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--quiet", action="store_true", help="discard server output")
+    args = parser.parse_args()
+    args.viewers = [int(v) for v in args.viewers.split(",")]
+
+    server = None
+    pid = args.pid
+    if pid is None:
+        server = start_server(args)
+        pid = server.pid
+    try:
+        results = asyncio.run(run(args, pid))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(10)
+
+    supported = supported_viewers(results, args.target_fps)
+    print(f"\nViewers sustained at >= {args.target_fps} fps: {supported}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "camera": args.camera,
+                "target_fps": args.target_fps,
+                "supported_viewers": supported,
+                "stages": results,
+            }, f, indent=2)
+        print(f"Wrote results to {args.output}")
+    sys.exit(0 if results else 1)
+
+
+if __name__ == "__main__":
+    main()
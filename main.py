@@ -1,20 +1,85 @@
 import time
-from fastapi import FastAPI, Request, Form, Response
-from fastapi.responses import StreamingResponse, JSONResponse
+
+# Startup timing is measured from here, as soon as uvicorn imports the app
+PROCESS_START = time.monotonic()
+
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, Depends, FastAPI, Request, Form, Response, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse, FileResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from sse_starlette.sse import EventSourceResponse
 import asyncio
-import json
+import os
+from starlette.requests import HTTPConnection
+
+from camera_registry import CameraContext, CameraRegistry
+import metrics
+from motor_bridge import MotorBridge, command_channel
+from shared_camera import RemoteServo
+from visual_servo import VisualServo
+
+# AEONBOT_CAPTURE_START: "boot" starts capture in the background as soon as
+# the server is up, "lazy" waits for the first viewer
+CAPTURE_START = os.environ.get("AEONBOT_CAPTURE_START", "boot")
+
+# Initialize cameras (AEONBOT_CAMERAS, see camera_registry.py). Capture is
+# not started here; see lifespan(). The first camera is the default: the
+# unprefixed routes, the servo and the startup timings use it.
+# With AEONBOT_CAPTURE=shared, capture_service.py owns the cameras and the
+# servo, and any number of uvicorn workers read frames from shared memory.
+registry = CameraRegistry.from_env()
+camera = registry.default.camera
+motor_bridge = MotorBridge(
+    host=os.environ.get("AEONBOT_MQTT_HOST", "localhost"),
+    port=int(os.environ.get("AEONBOT_MQTT_PORT", "1883")),
+    # Brokers drop an older connection with the same client id
+    client_id=f"aeonbot-motor-bridge-{os.getpid()}" if registry.shared else "aeonbot-motor-bridge",
+)
+if registry.shared:
+    visual_servo = RemoteServo(camera.control)
+else:
+    visual_servo = VisualServo(camera, motor_bridge)
 
-from gstreamer_camera import GStreamerCamera
+startup_times = {
+    "capture_start": CAPTURE_START,
+    "app_ready_ms": None,
+    "first_page_ms": None,
+}
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    if CAPTURE_START == "boot":
+        camera.start_in_background()
+    motor_bridge.start()
+    visual_servo.start()
+    startup_times["app_ready_ms"] = round((time.monotonic() - PROCESS_START) * 1000, 1)
+    print(f"App ready in {startup_times['app_ready_ms']} ms (capture: {CAPTURE_START})")
+    yield
+    registry.stop()
+    for context in registry:
+        if context.webrtc_manager is not None:
+            await context.webrtc_manager.cleanup()
+    visual_servo.stop()
+    await motor_bridge.stop()
+
+app = FastAPI(lifespan=lifespan)
 templates = Jinja2Templates(directory="templates")
 
-# Initialize camera
-camera = GStreamerCamera()
+def camera_context(connection: HTTPConnection):
+    """The camera a route addresses: /cameras/{camera_id}/..., else the default."""
+    camera_id = connection.path_params.get("camera_id")
+    if camera_id is None:
+        return registry.default
+    context = registry.get(camera_id)
+    if context is None:
+        raise HTTPException(status_code=404, detail=f"Unknown camera: {camera_id}")
+    return context
+
+# Per-camera routes, mounted at / for the default camera and under
+# /cameras/{camera_id} for each camera
+camera_router = APIRouter()
 
 class ResolutionRequest(BaseModel):
     resolution: str
@@ -26,8 +91,35 @@ class BBox(BaseModel):
     w: int
     h: int
 
+class TracksRequest(BaseModel):
+    boxes: list[BBox]
+
+class ServoRequest(BaseModel):
+    enabled: bool
+    kp: float = None
+    ki: float = None
+    kd: float = None
+    max_rate: float = None
+    max_speed: float = None
+    deadband: float = None
+    target_size: float = None
+
+class RecordingRequest(BaseModel):
+    reason: str = "manual"
+    before: float = 5.0
+    after: float = 5.0
+
+class MotionRequest(BaseModel):
+    gating: bool = None
+    threshold: float = None
+    min_area: float = None
+    hold: float = None
+    keepalive_interval: float = None
+
 @app.get("/")
 def root(request: Request):
+    if startup_times["first_page_ms"] is None:
+        startup_times["first_page_ms"] = round((time.monotonic() - PROCESS_START) * 1000, 1)
     # Render the template with request context
     return templates.TemplateResponse("index.html", {"request": request})
 
@@ -39,32 +131,207 @@ def mqtt_page(request: Request):
 def motor_page(request: Request):
     return templates.TemplateResponse("motor.html", {"request": request})
 
-@app.get("/video-feed")
-def video_feed():
+@camera_router.get("/video-feed")
+async def video_feed(request: Request, res: str = None, adaptive: bool = True, ctx: CameraContext = Depends(camera_context)):
+    """
+    MJPEG stream; ?res=640x360 selects a scaled simulcast branch and
+    ?adaptive=false pins the capture stream at full quality and frame rate.
+    """
+    size = None
+    if res:
+        try:
+            size = tuple(map(int, res.split('x')))
+            if len(size) != 2:
+                raise ValueError(res)
+            ctx.camera.frame_bus_for(size)
+        except ValueError:
+            return JSONResponse({
+                "success": False,
+                "error": f"Unsupported resolution: {res}",
+                "available": [f"{w}x{h}" for w, h in ctx.camera.available_resolutions()]
+            }, status_code=400)
+
+    peer = f"{request.client.host}:{request.client.port}" if request.client else None
     return StreamingResponse(
-        camera.generate_frames(),
+        ctx.camera.generate_frames_async(peer, size, adaptive),
         media_type='multipart/x-mixed-replace; boundary=frame'
     )
 
-@app.get("/camera-telemetry")
-async def camera_telemetry():
-    return camera.get_telemetry()
+@camera_router.get("/snapshot")
+async def snapshot(request: Request, w: int = None, ctx: CameraContext = Depends(camera_context)):
+    """
+    Latest frame as a JPEG, straight from memory; ?w=320 returns a cached
+    thumbnail. Pollers sending If-None-Match or If-Modified-Since get a 304
+    until a new frame arrives.
+    """
+    ctx.camera.demand()
+    snap = ctx.snapshot_cache.latest(w)
+    if snap is None:
+        return JSONResponse({"error": "No frame captured yet"}, status_code=503, headers={"Retry-After": "1"})
+    if snap.not_modified(request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        ctx.snapshot_cache.not_modified += 1
+        return Response(status_code=304, headers=snap.headers())
+    try:
+        data = await snap.data()
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+    return Response(data, media_type="image/jpeg", headers=snap.headers())
+
+@camera_router.get("/api/snapshot")
+async def snapshot_status(ctx: CameraContext = Depends(camera_context)):
+    return JSONResponse(ctx.snapshot_cache.get_telemetry())
+
+@app.get("/stream")
+def stream_page(request: Request):
+    return templates.TemplateResponse("stream.html", {"request": request})
+
+@camera_router.websocket("/ws/video-stream")
+async def video_stream(websocket: WebSocket, ctx: CameraContext = Depends(camera_context)):
+    """
+    Native compressed stream for MediaSource clients. Sends a JSON message
+    with the MIME type, then the init segment, then muxed media chunks
+    starting at a keyframe. Closes when the encoder changes; clients reconnect.
+    """
+    await websocket.accept()
+    ctx.camera.demand()
+    # Capture starts lazily; the stream exists once the pipeline is up
+    if not await asyncio.to_thread(ctx.camera.started.wait, 10.0):
+        await websocket.send_json({"error": "Camera did not start"})
+        await websocket.close()
+        return
+    stream = ctx.camera.compressed_stream
+    if stream is None:
+        await websocket.send_json({"error": "Select x264enc, vp8enc or vp9enc to enable the compressed stream"})
+        await websocket.close()
+        return
+
+    peer = f"{websocket.client.host}:{websocket.client.port}" if websocket.client else None
+    await websocket.send_json({"mime": stream.mime, "encoder": stream.encoder_name})
+    try:
+        async for data in stream.iter_chunks(
+            ctx.camera.next_client_id(), peer,
+            running=lambda: ctx.camera.compressed_stream is stream
+        ):
+            await websocket.send_bytes(data)
+        await websocket.close()
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+
+@camera_router.websocket("/ws/webrtc")
+async def webrtc_signaling(websocket: WebSocket, ctx: CameraContext = Depends(camera_context)):
+    """WebRTC signaling: offer SDP in, answer SDP out; the peer lives as long as the socket."""
+    await websocket.accept()
+    if ctx.webrtc_manager is None:
+        await websocket.send_json({"error": "WebRTC needs in-process capture"})
+        await websocket.close()
+        return
+    await ctx.webrtc_manager.offer(websocket)
+
+@camera_router.get("/api/webrtc")
+async def webrtc_status(ctx: CameraContext = Depends(camera_context)):
+    if ctx.webrtc_manager is None:
+        return JSONResponse({"success": False, "error": "WebRTC needs in-process capture"}, status_code=409)
+    return JSONResponse(ctx.webrtc_manager.get_telemetry())
+
+@app.websocket("/ws/motor")
+async def motor_socket(websocket: WebSocket):
+    """
+    Motor commands as text messages ("forward:100", "joystick:90:50",
+    "snowblower:power:on"), forwarded through the shared MQTT bridge. A
+    client that was driving sends a stop when it disconnects.
+    """
+    await websocket.accept()
+    await websocket.send_json(motor_bridge.get_telemetry())
+    driving = False
+    try:
+        while True:
+            command = await websocket.receive_text()
+            if command_channel(command) == "drive" and visual_servo.enabled:
+                # The operator takes over from the servo loop
+                visual_servo.disable("manual override")
+            if not motor_bridge.submit(command):
+                await websocket.send_json({"error": f"Invalid command: {command}"})
+            elif command_channel(command) == "drive":
+                driving = not command.startswith("stop:")
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        if driving:
+            motor_bridge.submit("stop:0")
+
+@app.get("/api/motor")
+async def motor_status():
+    return JSONResponse(motor_bridge.get_telemetry())
+
+@app.post("/api/servo")
+async def set_servo(request: ServoRequest):
+    """Start or stop steering toward the tracked target; gains apply to the turn PID."""
+    if request.enabled:
+        if not camera.tracking_active:
+            return JSONResponse({"success": False, "error": "Start tracking first"}, status_code=409)
+        visual_servo.enable(**request.dict(exclude={"enabled"}))
+    else:
+        visual_servo.disable()
+    return JSONResponse({"success": True, **visual_servo.get_telemetry()})
+
+@app.get("/api/servo")
+async def servo_status():
+    return JSONResponse(visual_servo.get_telemetry())
+
+@app.get("/api/startup")
+async def startup_status():
+    """Startup timings: server ready, first page, capability probe, pipeline and first frame."""
+    camera_startup = dict(camera.startup)
+    # Camera times are relative to its construction; report them from process start too
+    offset = round((camera.created_at - PROCESS_START) * 1000, 1)
+    if camera_startup["first_frame_ms"] is not None:
+        camera_startup["first_frame_since_start_ms"] = round(camera_startup["first_frame_ms"] + offset, 1)
+    return JSONResponse({
+        **startup_times,
+        "camera_created_ms": offset,
+        "camera_started": camera.started.is_set(),
+        "status": camera.pipeline_status,
+        **camera_startup,
+    })
+
+@camera_router.get("/api/stream-clients")
+async def stream_clients(ctx: CameraContext = Depends(camera_context)):
+    """Per-client sent/dropped frame counters for /video-feed."""
+    return JSONResponse([c.as_dict() for c in list(ctx.camera.stream_clients.values())])
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Per-stage latency histograms and drop counters in Prometheus text format."""
+    return PlainTextResponse(
+        metrics.render(*[context.camera.metrics for context in registry]) + metrics.render(motor_bridge.metrics),
+        media_type="text/plain; version=0.0.4"
+    )
+
+@app.get("/api/cameras")
+async def list_cameras():
+    """Configured cameras with their source, state and assigned cores."""
+    return JSONResponse(registry.get_telemetry())
 
-@app.post("/set-resolution")
-async def set_resolution(request: ResolutionRequest):
+@camera_router.get("/camera-telemetry")
+async def camera_telemetry(ctx: CameraContext = Depends(camera_context)):
+    return ctx.camera.get_telemetry()
+
+@camera_router.post("/set-resolution")
+async def set_resolution(request: ResolutionRequest, ctx: CameraContext = Depends(camera_context)):
     try:
         # Parse the resolution string
         width, height = map(int, request.resolution.split('x'))
         
         # Check if resolution is supported
-        if (width, height) not in camera.supported_resolutions:
+        if (width, height) not in ctx.camera.supported_resolutions:
             return JSONResponse({
                 "success": False,
                 "error": f"Unsupported resolution: {width}x{height}"
             })
         
-        # Attempt to change the camera resolution
-        success = camera.set_resolution(width, height)
+        # Attempt to change the camera resolution; the switch blocks until
+        # the new pipeline delivers, so keep it off the event loop viewers share
+        success = await asyncio.to_thread(ctx.camera.set_resolution, width, height)
         
         if success:
             return JSONResponse({"success": True})
@@ -79,76 +346,166 @@ async def set_resolution(request: ResolutionRequest):
             "error": str(e)
         })
 
-@app.post("/start-tracking")
-async def start_tracking(bbox: BBox):
+@camera_router.post("/start-tracking")
+async def start_tracking(bbox: BBox, ctx: CameraContext = Depends(camera_context)):
     """Endpoint to start tracking an object given its bounding box."""
-    success = camera.start_tracking(bbox.x, bbox.y, bbox.w, bbox.h)
+    # Waits for capture and a raw frame, then initializes the tracker
+    success = await asyncio.to_thread(ctx.camera.start_tracking, bbox.x, bbox.y, bbox.w, bbox.h)
     if success:
         return JSONResponse({"success": True, "message": "Tracking started."})
     else:
         return JSONResponse({"success": False, "message": "Failed to start tracker."})
 
-@app.post("/reset-tracking")
-async def reset_tracking():
+@camera_router.post("/reset-tracking")
+async def reset_tracking(ctx: CameraContext = Depends(camera_context)):
     """Endpoint to reset the tracker (stop tracking)."""
-    camera.reset_tracking()
+    ctx.camera.reset_tracking()
     return JSONResponse({"success": True, "message": "Tracker reset."})
 
-@app.post("/set_pipeline_settings")
+@camera_router.post("/tracks")
+async def add_tracks(request: TracksRequest, ctx: CameraContext = Depends(camera_context)):
+    """
+    Track each box as its own target, alongside /start-tracking. A box that
+    overlaps an existing track restarts that track; ids are null for boxes
+    that could not be tracked.
+    """
+    boxes = [(b.x, b.y, b.w, b.h) for b in request.boxes]
+    # Initializing several trackers takes a while; keep the event loop free
+    ids = await asyncio.to_thread(ctx.camera.add_tracks, boxes)
+    return JSONResponse({"success": any(i is not None for i in ids), "ids": ids})
+
+@camera_router.get("/tracks")
+async def list_tracks(ctx: CameraContext = Depends(camera_context)):
+    return JSONResponse(ctx.camera.get_tracks())
+
+@camera_router.delete("/tracks")
+async def clear_tracks(ctx: CameraContext = Depends(camera_context)):
+    ctx.camera.clear_tracks()
+    return JSONResponse({"success": True})
+
+@camera_router.delete("/tracks/{track_id}")
+async def remove_track(track_id: int, ctx: CameraContext = Depends(camera_context)):
+    if not ctx.camera.remove_track(track_id):
+        return JSONResponse({"success": False, "error": f"No track {track_id}"}, status_code=404)
+    return JSONResponse({"success": True})
+
+@camera_router.get("/api/track-events")
+async def track_events(ctx: CameraContext = Depends(camera_context)):
+    """Server-sent "tracks" events with the state of every track, once per tracked frame."""
+    async def event_generator():
+        async for states in ctx.camera.track_states():
+            yield {"event": "tracks", "data": states}
+
+    return EventSourceResponse(event_generator())
+
+@camera_router.post("/set_pipeline_settings")
 async def set_pipeline_settings(
     color_format: str = Form(None),
-    jpeg_quality: str = Form(None)
+    jpeg_quality: str = Form(None),
+    bitrate: str = Form(None),
+    ctx: CameraContext = Depends(camera_context)
 ):
-    # Convert jpeg_quality to int if provided
+    # Convert numeric settings to int if provided
     if jpeg_quality is not None:
         jpeg_quality = int(jpeg_quality)
+    if bitrate is not None:
+        bitrate = int(bitrate)
     
-    # Pass as keyword arguments
-    camera.set_pipeline_settings(color_format=color_format, jpeg_quality=jpeg_quality)
+    # Pass as keyword arguments; quality/bitrate are applied to the running pipeline
+    success = await asyncio.to_thread(
+        ctx.camera.set_pipeline_settings,
+        color_format=color_format, jpeg_quality=jpeg_quality, bitrate=bitrate
+    )
     
     # Return a response (FastAPI doesn't use Flask's redirect)
-    return {"success": True}
+    return {"success": success, "switch": ctx.camera.last_switch}
 
-@app.get("/api/telemetry")
-async def get_telemetry():
+@camera_router.get("/api/telemetry")
+async def get_telemetry(ctx: CameraContext = Depends(camera_context)):
     """Endpoint to get camera telemetry data."""
-    return JSONResponse(camera.get_telemetry())
+    return JSONResponse(ctx.camera.get_telemetry())
 
-@app.post("/api/settings")
-async def update_settings(request: Request):
+@camera_router.post("/api/settings")
+@camera_router.post("/settings")
+async def update_settings(request: Request, ctx: CameraContext = Depends(camera_context)):
     """Endpoint to update camera settings."""
     data = await request.json()
-    if 'encoder' in data:
-        camera.set_pipeline_settings(encoder=data['encoder'])
-    return JSONResponse({'status': 'success'})
+    await asyncio.to_thread(
+        ctx.camera.set_pipeline_settings,
+        encoder=data.get('encoder'),
+        jpeg_quality=int(data['jpeg_quality']) if 'jpeg_quality' in data else None,
+        bitrate=int(data['bitrate']) if 'bitrate' in data else None
+    )
+    return JSONResponse({'status': 'success', 'switch': ctx.camera.last_switch})
 
-@app.get("/api/camera-events")
-async def camera_events(request: Request):
+@camera_router.get("/api/camera-events")
+async def camera_events(request: Request, ctx: CameraContext = Depends(camera_context)):
     """
-    Server-sent events endpoint for camera updates.
-    Sends periodic updates about camera status, resolution, and FPS.
+    Server-sent events endpoint for camera updates. Sends a "capabilities"
+    and a "snapshot" event on connect, then "delta" events carrying only the
+    fields that changed; all clients share one telemetry producer.
     """
     async def event_generator():
-        while True:
-            if await request.is_disconnected():
-                break
-
-            # Get current camera telemetry
-            telemetry = {
-                "fps": camera.get_fps() if hasattr(camera, 'get_fps') else 0,
-                "resolution": camera.get_current_resolution() if hasattr(camera, 'get_current_resolution') else "unknown",
-                "format": camera.get_current_format() if hasattr(camera, 'get_current_format') else "unknown",
-                "supported_resolutions": camera.supported_resolutions if hasattr(camera, 'supported_resolutions') else [],
-                "supported_formats": camera.supported_formats if hasattr(camera, 'supported_formats') else [],
-                "current_encoder": camera.current_encoder if hasattr(camera, 'current_encoder') else "unknown",
-                "supported_encoders": camera.supported_encoders if hasattr(camera, 'supported_encoders') else {}
-            }
-
-            yield {
-                "event": "message",
-                "data": json.dumps(telemetry)
-            }
-            
-            await asyncio.sleep(1)  # Send updates every second
+        async for event, data in ctx.telemetry_hub.events():
+            yield {"event": event, "data": data}
 
     return EventSourceResponse(event_generator())
+
+@camera_router.websocket("/ws/telemetry")
+async def telemetry_socket(websocket: WebSocket, ctx: CameraContext = Depends(camera_context)):
+    """Same events as /api/camera-events, as {"type": ..., "data": ...} messages."""
+    await websocket.accept()
+    events = ctx.telemetry_hub.events()
+    try:
+        async for event, data in events:
+            await websocket.send_text(f'{{"type": "{event}", "data": {data}}}')
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        await events.aclose()
+
+@camera_router.get("/api/telemetry-hub")
+async def telemetry_hub_status(ctx: CameraContext = Depends(camera_context)):
+    return JSONResponse(ctx.telemetry_hub.get_telemetry())
+
+@camera_router.post("/api/recordings")
+async def trigger_recording(request: RecordingRequest, ctx: CameraContext = Depends(camera_context)):
+    """Save the buffered video around now as a clip, without re-encoding."""
+    clip = ctx.camera.recorder.trigger(request.reason, before=request.before, after=request.after)
+    return JSONResponse({"success": True, "clip": clip})
+
+@camera_router.get("/api/recordings")
+async def list_recordings(ctx: CameraContext = Depends(camera_context)):
+    return JSONResponse(list(ctx.camera.recorder.clips))
+
+@camera_router.get("/recordings/{name}")
+async def get_recording(name: str, ctx: CameraContext = Depends(camera_context)):
+    path = os.path.join(ctx.camera.recorder.directory, os.path.basename(name))
+    if not os.path.isfile(path):
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    return FileResponse(path)
+
+@camera_router.post("/api/motion")
+async def set_motion(request: MotionRequest, ctx: CameraContext = Depends(camera_context)):
+    """Turn motion-gated encoding on or off and tune the detector."""
+    success = ctx.camera.set_motion_settings(
+        gating=request.gating, threshold=request.threshold, min_area=request.min_area,
+        hold=request.hold, keepalive_interval=request.keepalive_interval,
+    )
+    return JSONResponse({"success": bool(success)})
+
+@camera_router.get("/api/motion")
+async def motion_status(ctx: CameraContext = Depends(camera_context)):
+    return JSONResponse(ctx.camera.get_telemetry(False).get("motion_gating"))
+
+@camera_router.get("/api/motion-events")
+async def motion_events(ctx: CameraContext = Depends(camera_context)):
+    """Server-sent "motion" events whenever the scene starts or stops moving."""
+    async def event_generator():
+        async for event in ctx.camera.motion_events():
+            yield {"event": "motion", "data": event}
+
+    return EventSourceResponse(event_generator())
+
+app.include_router(camera_router)
+app.include_router(camera_router, prefix="/cameras/{camera_id}")
@@ -0,0 +1,180 @@
+import threading
+from bisect import bisect_left
+
+# Latency buckets in seconds, from sub-millisecond up to a second
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0
+)
+
+# Recovery takes from a few hundred milliseconds up to the backoff ceiling
+RECOVERY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labels, extra=None):
+    items = dict(labels or {})
+    if extra:
+        items.update(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items.items()) + "}"
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and a locked increment."""
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labels=None):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = labels
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """Return (per-bucket counts, sum); the last count is the +Inf bucket."""
+        with self._lock:
+            return list(self._counts), self._sum
+
+    def render(self):
+        counts, total = self.snapshot()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{_format_labels(self.labels, {"le": bound})} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{self.name}_bucket{_format_labels(self.labels, {"le": "+Inf"})} {cumulative}')
+        lines.append(f'{self.name}_sum{_format_labels(self.labels)} {total}')
+        lines.append(f'{self.name}_count{_format_labels(self.labels)} {cumulative}')
+        return lines
+
+
+def quantile(buckets, counts, q):
+    """
+    Estimate quantile q from per-bucket counts (as from Histogram.snapshot()),
+    interpolating linearly inside the bucket like Prometheus
+    histogram_quantile. Returns None without observations.
+    """
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    lower = 0.0
+    for bound, count in zip(buckets, counts):
+        if count and cumulative + count >= rank:
+            return lower + (bound - lower) * (rank - cumulative) / count
+        cumulative += count
+        lower = bound
+    # Only the +Inf bucket is left; its upper bound is unknown
+    return buckets[-1]
+
+
+class Counter:
+    def __init__(self, name, help, labels=None):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self):
+        return [f'{self.name}_total{_format_labels(self.labels)} {self.value}']
+
+
+class StageMetrics:
+    """
+    Per-camera latency histograms for each stage a frame passes through,
+    plus drop counters, rendered in Prometheus text format.
+    """
+
+    def __init__(self, labels=None):
+        self.labels = labels
+        histogram = lambda name, help: Histogram(f"aeonbot_{name}_seconds", help, labels=labels)
+        counter = lambda name, help: Counter(f"aeonbot_{name}", help, labels=labels)
+
+        self.capture = histogram("capture_latency", "Buffer PTS to appsink arrival")
+        self.queue_wait = histogram("queue_wait", "Appsink arrival to frame queue dequeue")
+        self.raw_convert = histogram("raw_convert", "Mapping the raw branch sample into a NumPy array")
+        self.tracker = histogram("tracker_update", "One tracker.update() call")
+        self.tracks = histogram("tracks_update", "Updating every multi-target track on one frame")
+        self.motion = histogram("motion_detect", "Motion measurement on one raw frame")
+        self.encode = histogram("encode", "Adaptive-level JPEG encode")
+        self.socket_write = histogram("socket_write", "Writing one multipart frame to a client")
+        self.end_to_end = histogram("end_to_end", "Appsink arrival to the frame written to a client")
+        self.recovery = Histogram(
+            "aeonbot_recovery_seconds", "Capture failure detected to samples flowing again",
+            buckets=RECOVERY_BUCKETS, labels=labels
+        )
+
+        self.frames_received = counter("frames_received", "Encoded samples received from appsink")
+        self.bytes_received = counter("bytes_received", "Encoded bytes received from appsink")
+        self.stream_bytes = counter("stream_bytes", "Muxed bytes from the compressed stream branch")
+        self.queue_full = counter("queue_full", "Samples discarded because the frame queue was full")
+        self.frames_dropped = counter("frames_dropped", "Frames skipped for slow stream clients")
+        self.frames_gated = counter("frames_gated", "Frames not encoded because the scene was still")
+        self.pipeline_errors = counter("pipeline_errors", "Error messages from the current pipeline")
+        self.pipeline_stalls = counter("pipeline_stalls", "Watchdog timeouts with no samples arriving")
+        self.pipeline_restarts = counter("pipeline_restarts", "Successful capture recoveries")
+
+    def all(self):
+        return [
+            self.capture, self.queue_wait, self.raw_convert, self.tracker,
+            self.tracks, self.motion, self.encode, self.socket_write, self.end_to_end, self.recovery,
+            self.frames_received, self.bytes_received, self.stream_bytes,
+            self.queue_full, self.frames_dropped, self.frames_gated,
+            self.pipeline_errors, self.pipeline_stalls, self.pipeline_restarts,
+        ]
+
+
+class MotorMetrics:
+    """
+    Motor command bridge: command counts and ESP32 round-trip latency, plus
+    the latency of the visual servo loop.
+    """
+
+    def __init__(self, labels=None):
+        self.labels = labels
+        counter = lambda name, help: Counter(f"aeonbot_motor_{name}", help, labels=labels)
+
+        self.round_trip = Histogram(
+            "aeonbot_motor_round_trip_seconds", "Command published to its echo on the status topic",
+            labels=labels
+        )
+        self.servo_latency = Histogram(
+            "aeonbot_servo_latency_seconds", "Tracked frame arrival to its servo command published",
+            labels=labels
+        )
+        self.commands_received = counter("commands_received", "Commands received from clients")
+        self.commands_coalesced = counter("commands_coalesced", "Commands replaced by a newer one before publishing")
+        self.commands_published = counter("commands_published", "Commands published to the broker")
+
+    def all(self):
+        return [self.round_trip, self.servo_latency, self.commands_received, self.commands_coalesced, self.commands_published]
+
+
+def render(*metric_sets):
+    """Render metric sets of one kind, grouping samples by metric name."""
+    lines = []
+    for group in zip(*(metric_set.all() for metric_set in metric_sets)):
+        first = group[0]
+        if isinstance(first, Histogram):
+            name, kind = first.name, "histogram"
+        else:
+            name, kind = f"{first.name}_total", "counter"
+        lines.append(f"# HELP {name} {first.help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for metric in group:
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,150 @@
+import json
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from frame_bus import FrameBus
+
+
+class MotionDetector:
+    """
+    Frame-differencing motion detector on its own thread. Each raw frame is
+    block-averaged down to about width pixels across in one vectorized
+    NumPy pass and compared with the previous one; the fraction of cells
+    that changed by more than threshold grey levels is the motion level.
+    Level at or above min_area counts as motion, and the scene is still
+    once hold seconds pass without any.
+
+    Motion starting and stopping is published as a JSON event on the
+    events bus and passed to on_change(moving). The detector only reads
+    the raw bus, so it never keeps an otherwise idle camera running.
+    """
+
+    def __init__(self, raw_bus, threshold=12.0, min_area=0.002, width=80, hold=1.0,
+                 enabled=False, on_change=None, histogram=None):
+        self.raw_bus = raw_bus
+        self.threshold = threshold
+        self.min_area = min_area
+        self.width = width
+        self.hold = hold
+        self.on_change = on_change
+        self.histogram = histogram
+        self.events = FrameBus()
+        self.history = deque(maxlen=20)
+
+        self.enabled = enabled
+        self.active = True  # until proven still, so nothing is held back at start
+        self.level = 0.0
+        self.last_motion = time.monotonic()
+        self._reference = None
+        self._event_ids = 0
+        self._wake = threading.Event()
+
+        # Telemetry
+        self.frames = 0
+        self.latency = 0.0
+
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def still(self):
+        return self.enabled and not self.active
+
+    def configure(self, enabled=None, threshold=None, min_area=None, hold=None):
+        if threshold is not None:
+            self.threshold = float(threshold)
+        if min_area is not None:
+            self.min_area = float(min_area)
+        if hold is not None:
+            self.hold = float(hold)
+        if enabled is not None and enabled != self.enabled:
+            self.enabled = enabled
+            self._reference = None
+            self.last_motion = time.monotonic()
+            self._set_active(True)
+            if enabled:
+                self._wake.set()
+
+    def stop(self):
+        self.running = False
+        self._wake.set()
+
+    def measure(self, image):
+        """Fraction of downscaled cells that changed since the previous image."""
+        height, width = image.shape[:2]
+        factor = max(1, width // self.width)
+        rows, cols = height // factor, width // factor
+        cells = image[:rows * factor, :cols * factor].reshape(rows, factor, cols, factor, -1)
+        grey = cells.sum(axis=(1, 3, 4), dtype=np.uint32).astype(np.float32)
+        grey /= factor * factor * cells.shape[-1]
+
+        reference, self._reference = self._reference, grey
+        if reference is None or reference.shape != grey.shape:
+            return 0.0
+        changed = np.count_nonzero(np.abs(grey - reference) > self.threshold)
+        return changed / grey.size
+
+    def _run(self):
+        last_seq, _ = self.raw_bus.latest()
+        while self.running:
+            if not self.enabled:
+                self._wake.wait(1.0)
+                self._wake.clear()
+                continue
+
+            last_seq, raw_frame = self.raw_bus.wait_for_frame(last_seq, timeout=1.0)
+            if raw_frame is None:
+                continue
+
+            started = time.perf_counter()
+            try:
+                self.level = self.measure(raw_frame.array)
+            except Exception as e:
+                print(f"Error in motion detector: {e}", file=sys.stderr)
+                time.sleep(0.1)
+                continue
+            self.latency = time.perf_counter() - started
+            if self.histogram is not None:
+                self.histogram.observe(self.latency)
+            self.frames += 1
+
+            now = time.monotonic()
+            if self.level >= self.min_area:
+                self.last_motion = now
+                self._set_active(True)
+            elif now - self.last_motion > self.hold:
+                self._set_active(False)
+
+    def _set_active(self, active):
+        if active == self.active:
+            return
+        self.active = active
+        self._event_ids += 1
+        event = {
+            "id": self._event_ids,
+            "type": "motion_start" if active else "motion_end",
+            "time": time.time(),
+            "level": round(self.level, 4),
+        }
+        self.history.append(event)
+        self.events.publish(json.dumps(event))
+        if self.on_change is not None:
+            self.on_change(active)
+
+    def get_telemetry(self):
+        return {
+            "enabled": self.enabled,
+            "moving": self.active,
+            "level": round(self.level, 4),
+            "threshold": self.threshold,
+            "min_area": self.min_area,
+            "hold": self.hold,
+            "frames": self.frames,
+            "latency_ms": round(self.latency * 1000, 2),
+            "last_event": self.history[-1] if self.history else None,
+        }
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import sys
+import time
+from collections import OrderedDict
+
+from metrics import MotorMetrics
+from mqtt_client import MQTTClient
+
+# Topics used by esp32/aeonbot/aeonbot.ino (MQTT_TOPIC, MQTT_STATUS_TOPIC)
+COMMAND_TOPIC = "motor/control"
+STATUS_TOPIC = "motor/status"
+
+DRIVE_COMMANDS = {"forward", "backward", "left", "right", "stop", "joystick"}
+
+
+def command_channel(command):
+    """
+    The actuator a command sets. Every drive command replaces the last one,
+    so they share one channel; snowblower power and speed are separate.
+    """
+    parts = command.split(":")
+    if parts[0] in DRIVE_COMMANDS:
+        return "drive"
+    if parts[0] == "snowblower" and len(parts) > 1:
+        return f"snowblower:{parts[1]}"
+    return parts[0]
+
+
+class MotorBridge:
+    """
+    Forwards motor commands from any number of WebSocket clients to the
+    ESP32 over one persistent MQTT connection.
+
+    Commands are coalesced per channel: a command on an idle bridge goes out
+    at once, and while one was sent less than a tick ago only the newest per
+    channel is kept and published on the next tick. Stop commands bypass the
+    tick. Everything is QoS 0. The ESP32 echoes each command it handled on
+    the status topic, which gives the command round-trip time.
+    """
+
+    def __init__(self, host="localhost", port=1883, tick=0.05, max_age=0.5,
+                 client_id="aeonbot-motor-bridge"):
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.tick = tick
+        self.max_age = max_age
+        self.metrics = MotorMetrics()
+
+        self.client = None
+        self._pending = {}  # channel -> (command, time received, frame time)
+        self._wake = asyncio.Event()
+        self._sent = OrderedDict()  # command -> time published, awaiting its echo
+        self._task = None
+
+        # Telemetry
+        self.reconnects = 0
+        self.last_round_trip = None
+        self.last_status = None
+        self.last_status_time = None
+
+    @property
+    def connected(self):
+        return self.client is not None and self.client.connected
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.client is not None:
+            await self.client.disconnect()
+
+    def submit(self, command, origin=None):
+        """
+        Queue a command from a client; returns False if it is malformed.
+        origin is the monotonic time of the frame a servo command was
+        computed from, for the servo latency histogram.
+        """
+        command = command.strip()
+        if not command or len(command) > 64 or ":" not in command:
+            return False
+        self.metrics.commands_received.inc()
+        channel = command_channel(command)
+        if command.startswith("stop:") and self.connected:
+            # Never hold a stop back behind the tick
+            self._pending.pop(channel, None)
+            self._publish(command, origin)
+            return True
+        if channel in self._pending:
+            self.metrics.commands_coalesced.inc()
+        self._pending[channel] = (command, time.monotonic(), origin)
+        self._wake.set()
+        return True
+
+    def _publish(self, command, origin=None):
+        self.client.publish(COMMAND_TOPIC, command)
+        self.metrics.commands_published.inc()
+        now = time.monotonic()
+        if origin is not None:
+            self.metrics.servo_latency.observe(now - origin)
+        self._sent[command] = now
+        self._sent.move_to_end(command)
+        while len(self._sent) > 64:
+            self._sent.popitem(last=False)
+
+    def _on_message(self, topic, payload):
+        if topic != STATUS_TOPIC:
+            return
+        received = time.monotonic()
+        status = json.loads(payload)
+        command = status.get("ack")
+        if command is None:
+            self.last_status = status
+            self.last_status_time = received
+            return
+        sent = self._sent.pop(command, None)
+        if sent is not None:
+            self.last_round_trip = received - sent
+            self.metrics.round_trip.observe(self.last_round_trip)
+
+    async def _run(self):
+        delay = 1.0
+        while True:
+            self.client = MQTTClient(self.host, self.port, client_id=self.client_id, on_message=self._on_message)
+            try:
+                await self.client.connect()
+                await self.client.subscribe(STATUS_TOPIC)
+                print(f"Motor bridge connected to {self.host}:{self.port}")
+                delay = 1.0
+                await self._flush_loop()
+            except (ConnectionError, OSError, asyncio.TimeoutError) as e:
+                print(f"Motor bridge connection failed: {e!r}", file=sys.stderr)
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    async def _flush_loop(self):
+        client = self.client
+        closed = asyncio.create_task(client.closed.wait())
+        try:
+            while client.connected:
+                wake = asyncio.create_task(self._wake.wait())
+                await asyncio.wait({wake, closed}, return_when=asyncio.FIRST_COMPLETED)
+                wake.cancel()
+                if not client.connected:
+                    break
+                self._wake.clear()
+
+                now = time.monotonic()
+                pending, self._pending = self._pending, {}
+                for command, received, origin in pending.values():
+                    # Do not replay movement that went stale during a reconnect
+                    if now - received <= self.max_age:
+                        self._publish(command, origin)
+                await client.drain()
+                await asyncio.sleep(self.tick)
+        finally:
+            closed.cancel()
+
+    def get_telemetry(self):
+        return {
+            "connected": self.connected,
+            "broker": f"{self.host}:{self.port}",
+            "tick_ms": round(self.tick * 1000, 1),
+            "reconnects": self.reconnects,
+            "received": self.metrics.commands_received.value,
+            "coalesced": self.metrics.commands_coalesced.value,
+            "published": self.metrics.commands_published.value,
+            "last_round_trip_ms": round(self.last_round_trip * 1000, 1) if self.last_round_trip is not None else None,
+            "last_status": self.last_status,
+            "status_age_ms": round((time.monotonic() - self.last_status_time) * 1000) if self.last_status_time else None,
+        }
@@ -0,0 +1,159 @@
+import asyncio
+import itertools
+import os
+import socket
+import struct
+import sys
+
+# Minimal asyncio MQTT 3.1.1 client: CONNECT, QoS 0 PUBLISH and SUBSCRIBE,
+# keep-alive pings. That is all the motor bridge needs, and every publish is
+# one small write on a persistent TCP connection with Nagle disabled.
+
+CONNECT = 0x10
+CONNACK = 0x20
+PUBLISH = 0x30
+SUBSCRIBE = 0x82
+SUBACK = 0x90
+PINGREQ = 0xC0
+PINGRESP = 0xD0
+DISCONNECT = 0xE0
+
+
+def encode_length(length):
+    encoded = bytearray()
+    while True:
+        digit, length = length % 128, length // 128
+        encoded.append(digit | 0x80 if length else digit)
+        if not length:
+            return bytes(encoded)
+
+
+def encode_string(value):
+    data = value.encode() if isinstance(value, str) else value
+    return struct.pack("!H", len(data)) + data
+
+
+def packet(packet_type, body=b""):
+    return bytes([packet_type]) + encode_length(len(body)) + body
+
+
+async def read_packet(reader):
+    """Return (first header byte, body) of the next packet."""
+    header = (await reader.readexactly(1))[0]
+    length = 0
+    for shift in range(0, 28, 7):
+        digit = (await reader.readexactly(1))[0]
+        length |= (digit & 0x7F) << shift
+        if not digit & 0x80:
+            break
+    else:
+        raise ValueError("Malformed remaining length")
+    return header, await reader.readexactly(length) if length else b""
+
+
+def parse_publish(header, body):
+    """Return (topic, payload) from a PUBLISH packet."""
+    (topic_length,) = struct.unpack_from("!H", body)
+    topic = body[2:2 + topic_length].decode()
+    offset = 2 + topic_length
+    if (header >> 1) & 0x03:
+        offset += 2  # packet identifier, QoS > 0 only
+    return topic, body[offset:]
+
+
+class MQTTClient:
+    """
+    One persistent broker connection. Messages on subscribed topics are
+    passed to on_message(topic, payload) on the event loop; the connection
+    is considered lost once closed is set.
+    """
+
+    def __init__(self, host, port=1883, client_id=None, keepalive=30, on_message=None):
+        self.host = host
+        self.port = port
+        self.client_id = client_id or f"aeonbot-{os.getpid()}"
+        self.keepalive = keepalive
+        self.on_message = on_message
+        self.connected = False
+        self.closed = asyncio.Event()
+        self._reader = None
+        self._writer = None
+        self._tasks = []
+        self._packet_ids = itertools.count(1)
+
+    async def connect(self, timeout=5.0):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), timeout
+        )
+        sock = self._writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        variable_header = encode_string("MQTT") + bytes([4, 0x02]) + struct.pack("!H", self.keepalive)
+        self._writer.write(packet(CONNECT, variable_header + encode_string(self.client_id)))
+        await self._writer.drain()
+        header, body = await asyncio.wait_for(read_packet(self._reader), timeout)
+        if header != CONNACK or len(body) < 2 or body[1] != 0:
+            self._writer.close()
+            raise ConnectionError(f"MQTT connection refused (code {body[1] if len(body) > 1 else '?'})")
+
+        self.connected = True
+        self.closed.clear()
+        self._tasks = [asyncio.create_task(self._read_loop()), asyncio.create_task(self._ping_loop())]
+
+    async def subscribe(self, topic):
+        body = struct.pack("!H", next(self._packet_ids) & 0xFFFF or 1) + encode_string(topic) + b"\x00"
+        self._writer.write(packet(SUBSCRIBE, body))
+        await self._writer.drain()
+
+    def publish(self, topic, payload):
+        """QoS 0 fire-and-forget; returns without waiting for the socket."""
+        if not self.connected:
+            raise ConnectionError("MQTT client is not connected")
+        data = payload.encode() if isinstance(payload, str) else payload
+        self._writer.write(packet(PUBLISH, encode_string(topic) + data))
+
+    async def drain(self):
+        await self._writer.drain()
+
+    async def _read_loop(self):
+        try:
+            while True:
+                header, body = await read_packet(self._reader)
+                if header & 0xF0 == PUBLISH and self.on_message is not None:
+                    try:
+                        self.on_message(*parse_publish(header, body))
+                    except Exception as e:
+                        print(f"Error handling MQTT message: {e}", file=sys.stderr)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            print(f"MQTT connection lost: {e!r}", file=sys.stderr)
+        finally:
+            self._lost()
+
+    async def _ping_loop(self):
+        try:
+            while True:
+                await asyncio.sleep(self.keepalive / 2)
+                self._writer.write(packet(PINGREQ))
+                await self._writer.drain()
+        except ConnectionError:
+            self._lost()
+
+    def _lost(self):
+        self.connected = False
+        self.closed.set()
+        current = asyncio.current_task()
+        for task in self._tasks:
+            if task is not current:
+                task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+
+    async def disconnect(self):
+        if self.connected:
+            try:
+                self._writer.write(packet(DISCONNECT))
+                await self._writer.drain()
+            except ConnectionError:
+                pass
+        self._lost()
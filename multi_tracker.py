@@ -0,0 +1,256 @@
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from frame_bus import FrameBus
+from tracker_worker import FrameRate, scale_to_width
+
+
+def iou_matrix(a, b):
+    """IoU of every (x, y, w, h) box in a against every box in b, as an len(a) x len(b) array."""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    ax1, ay1 = a[:, 0:1], a[:, 1:2]
+    ax2, ay2 = ax1 + a[:, 2:3], ay1 + a[:, 3:4]
+    bx1, by1 = b[:, 0], b[:, 1]
+    bx2, by2 = bx1 + b[:, 2], by1 + b[:, 3]
+    inter_w = np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0, None)
+    inter_h = np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0, None)
+    inter = inter_w * inter_h
+    union = (a[:, 2:3] * a[:, 3:4]) + (b[:, 2] * b[:, 3]) - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+class Track:
+    """One target: its OpenCV tracker and last state in capture coordinates."""
+
+    def __init__(self, track_id, tracker, bbox, timestamp):
+        self.id = track_id
+        self.tracker = tracker
+        self.bbox = tuple(bbox)
+        self.timestamp = timestamp
+        self.created = time.monotonic()
+        self.lost = False
+        self.lost_since = None
+        self.updates = 0
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "bbox": list(self.bbox),
+            "lost": self.lost,
+            "age_s": round(time.monotonic() - self.created, 1),
+            "updates": self.updates,
+        }
+
+
+class MultiTracker:
+    """
+    Tracks any number of targets on their own thread, like TrackerWorker
+    for one. Each raw frame is scaled down once, every target's tracker
+    updates on it in a bounded thread pool (OpenCV releases the GIL), and
+    all track states go out together on the tracks bus as one JSON
+    document per frame.
+
+    Boxes are associated and pruned with one IoU matrix: a new box that
+    overlaps an existing track by at least match_iou re-initializes that
+    track instead of adding a duplicate, a track that drifts onto an older
+    one by duplicate_iou is dropped, and a track lost for max_lost seconds
+    is removed.
+    """
+
+    def __init__(self, raw_bus, tracker_factory, max_width=640, workers=None, max_tracks=32,
+                 match_iou=0.5, duplicate_iou=0.7, max_lost=2.0, histogram=None):
+        self.raw_bus = raw_bus
+        self.tracker_factory = tracker_factory
+        self.max_width = max_width
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.max_tracks = max_tracks
+        self.match_iou = match_iou
+        self.duplicate_iou = duplicate_iou
+        self.max_lost = max_lost
+        self.histogram = histogram
+        self.bus = FrameBus()
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="track")
+        self._ids = itertools.count(1)
+        self._capture_size = (0, 0)
+        self.tracks = {}
+
+        # Telemetry
+        self.rate = FrameRate()
+        self.latency = 0.0  # seconds to update every track on the last frame
+        self.last_frame_time = None  # timestamp of the last tracked frame
+        self.pruned = 0
+        self.tracking_size = (0, 0)
+
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def active(self):
+        return bool(self.tracks)
+
+    @property
+    def fps(self):
+        return self.rate.fps
+
+    def add(self, boxes, capture_size, timeout=1.0):
+        """
+        Start tracking boxes (x, y, w, h in capture coordinates) on the
+        newest frame. Returns the track id for each box, None where no
+        tracker could be created.
+        """
+        seq, raw_frame = self.raw_bus.latest()
+        if raw_frame is None:
+            seq, raw_frame = self.raw_bus.wait_for_frame(seq, timeout=timeout)
+        if raw_frame is None:
+            print("No frame available to start tracking.", file=sys.stderr)
+            return [None] * len(boxes)
+
+        image = scale_to_width(raw_frame.array, self.max_width)
+        scale = np.array([image.shape[1] / capture_size[0], image.shape[0] / capture_size[1]] * 2)
+        scaled = np.asarray(boxes, dtype=np.float32).reshape(-1, 4) * scale
+        scaled[:, 2:] = np.maximum(scaled[:, 2:], 1)
+
+        with self._lock:
+            existing = list(self.tracks.values())
+            overlap = iou_matrix(boxes, [t.bbox for t in existing]) if existing else None
+
+        ids = []
+        for i, box in enumerate(boxes):
+            tracker = self.tracker_factory()
+            if tracker is None:
+                print("No suitable tracker available", file=sys.stderr)
+                ids.append(None)
+                continue
+            tracker.init(image, tuple(int(v) for v in scaled[i]))
+
+            # Same target as an existing track: restart that one under its id
+            match = None
+            if overlap is not None and overlap.shape[1]:
+                best = int(overlap[i].argmax())
+                if overlap[i, best] >= self.match_iou:
+                    match = existing[best].id
+            with self._lock:
+                if match is None and len(self.tracks) >= self.max_tracks:
+                    print(f"Already tracking {self.max_tracks} targets", file=sys.stderr)
+                    ids.append(None)
+                    continue
+                track_id = match if match is not None else next(self._ids)
+                self.tracks[track_id] = Track(track_id, tracker, [int(v) for v in box], raw_frame.timestamp)
+                self._capture_size = capture_size
+                self.tracking_size = (image.shape[1], image.shape[0])
+            ids.append(track_id)
+        self._wake.set()
+        return ids
+
+    def remove(self, track_id):
+        with self._lock:
+            return self.tracks.pop(track_id, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self.tracks.clear()
+            self.rate.reset()
+
+    def stop(self):
+        self.running = False
+        self._wake.set()
+        self._pool.shutdown(wait=False)
+
+    def states(self):
+        with self._lock:
+            return [track.as_dict() for track in self.tracks.values()]
+
+    def _run(self):
+        last_seq, _ = self.raw_bus.latest()
+        while self.running:
+            if not self.tracks:
+                self._wake.wait(1.0)
+                self._wake.clear()
+                continue
+
+            last_seq, raw_frame = self.raw_bus.wait_for_frame(last_seq, timeout=1.0)
+            if raw_frame is None:
+                continue
+
+            started = time.monotonic()
+            try:
+                self._update(raw_frame)
+            except Exception as e:
+                print(f"Error in multi tracker: {e}", file=sys.stderr)
+                time.sleep(0.1)
+                continue
+
+            self.latency = time.monotonic() - started
+            if self.histogram is not None:
+                self.histogram.observe(self.latency)
+            self.rate.tick()
+
+    def _update(self, raw_frame):
+        image = scale_to_width(raw_frame.array, self.max_width)
+        with self._lock:
+            tracks = list(self.tracks.values())
+            capture_width, capture_height = self._capture_size
+        if not tracks:
+            return
+
+        # One tracker per task; a tracker is never updated by two threads at once
+        results = list(self._pool.map(lambda track: track.tracker.update(image), tracks))
+        found = np.array([bool(success) for success, _ in results])
+        boxes = np.array([box if success else (0, 0, 0, 0) for success, box in results], dtype=np.float32)
+        boxes *= np.array([capture_width / image.shape[1], capture_height / image.shape[0]] * 2, dtype=np.float32)
+        boxes = boxes.astype(np.int32)
+
+        now = time.monotonic()
+        for track, success, box in zip(tracks, found, boxes):
+            track.updates += 1
+            if success:
+                track.bbox = tuple(int(v) for v in box)
+                track.timestamp = raw_frame.timestamp
+                track.lost = False
+                track.lost_since = None
+            elif not track.lost:
+                track.lost = True
+                track.lost_since = now
+
+        # Prune: lost too long, or drifted onto an older track
+        expired = np.array([t.lost and now - t.lost_since > self.max_lost for t in tracks])
+        overlap = iou_matrix(boxes, boxes)
+        overlap[~found, :] = 0
+        overlap[:, ~found] = 0
+        # Tracks are in creation order, so the later of each duplicate pair goes
+        duplicate = np.triu(overlap >= self.duplicate_iou, k=1).any(axis=0)
+        drop = [track.id for track, gone in zip(tracks, expired | duplicate) if gone]
+
+        with self._lock:
+            for track_id in drop:
+                # Only if it was not replaced by a new box meanwhile
+                if self.tracks.get(track_id) in tracks:
+                    del self.tracks[track_id]
+                    self.pruned += 1
+            states = [track.as_dict() for track in self.tracks.values()]
+
+        self.last_frame_time = raw_frame.timestamp
+        self.bus.publish(json.dumps({"frame_time": raw_frame.timestamp, "tracks": states}))
+
+    def get_telemetry(self):
+        return {
+            "tracks": len(self.tracks),
+            "workers": self.workers,
+            "fps": f"{self.fps:.1f}",
+            "latency_ms": round(self.latency * 1000, 1),
+            "pruned": self.pruned,
+            "frame_time": self.last_frame_time,
+            "resolution": f"{self.tracking_size[0]}x{self.tracking_size[1]}",
+        }
@@ -0,0 +1,108 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+
+class PipelineCache:
+    """
+    Small LRU cache of pre-built pipelines keyed by
+    (width, height, color format, encoder, raw scale, queue depth, appsink
+    max-buffers).
+
+    Cached pipelines are parsed, linked and have their signals connected but
+    are kept in NULL, so they hold no camera or memory resources beyond the
+    element graph. Entries unused for max_idle seconds are evicted and
+    handed to dispose, which must undo what build connected.
+    """
+
+    def __init__(self, build, max_size=3, max_idle=120.0, dispose=None):
+        self._build = build
+        self._dispose = dispose or (lambda pipeline: pipeline.set_state(Gst.State.NULL))
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self._entries = OrderedDict()  # key -> (pipeline, last_used)
+        self._building = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def take(self, key):
+        """Remove and return a cached pipeline for key, or None."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, pipeline):
+        """Park a pipeline that is no longer playing so it can be reused."""
+        pipeline.set_state(Gst.State.NULL)
+        with self._lock:
+            self._entries[key] = (pipeline, time.monotonic())
+            self._entries.move_to_end(key)
+            evicted = self._evict_locked()
+        for old in evicted:
+            self._dispose(old)
+
+    def prepare(self, key):
+        """Build the pipeline for key in the background if it is not cached."""
+        with self._lock:
+            if key in self._entries or key in self._building:
+                return
+            self._building.add(key)
+        threading.Thread(target=self._prepare, args=(key,), daemon=True).start()
+
+    def _prepare(self, key):
+        try:
+            pipeline = self._build(key)
+            if pipeline is not None:
+                self.put(key, pipeline)
+        except Exception as e:
+            print(f"Standby pipeline build failed for {key}: {e}", file=sys.stderr)
+        finally:
+            with self._lock:
+                self._building.discard(key)
+
+    def _evict_locked(self):
+        """Drop stale and surplus entries; returns their pipelines for disposal."""
+        now = time.monotonic()
+        evicted = []
+        for key, (pipeline, last_used) in list(self._entries.items()):
+            if now - last_used > self.max_idle:
+                del self._entries[key]
+                evicted.append(pipeline)
+        while len(self._entries) > self.max_size:
+            evicted.append(self._entries.popitem(last=False)[1][0])
+        return evicted
+
+    def evict_idle(self):
+        with self._lock:
+            evicted = self._evict_locked()
+        for pipeline in evicted:
+            self._dispose(pipeline)
+
+    def clear(self):
+        """Dispose of every cached pipeline, e.g. on shutdown."""
+        with self._lock:
+            evicted = [pipeline for pipeline, _ in self._entries.values()]
+            self._entries.clear()
+        for pipeline in evicted:
+            self._dispose(pipeline)
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries.keys())
+
+    def get_telemetry(self):
+        return {
+            "cached": [list(key) for key in self.keys()],
+            "hits": self.hits,
+            "misses": self.misses,
+        }
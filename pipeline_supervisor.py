@@ -0,0 +1,147 @@
+import sys
+import threading
+import time
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import GLib
+
+
+class PipelineSupervisor:
+    """
+    Keeps capture running. A GLib main loop dispatches the bus watches of
+    every pipeline the camera builds, so errors and EOS on the current
+    pipeline are reported here; a watchdog flags a stall when no sample has
+    arrived for stall_intervals frame intervals. Either way the supervisor
+    restarts the pipeline in place, then rebuilds it, backing off while
+    failures keep coming. Viewers stay subscribed to the frame buses
+    throughout and simply see frames resume.
+    """
+
+    def __init__(self, camera, stall_intervals=15, backoff=0.5, max_backoff=30.0, healthy_after=10.0):
+        self.camera = camera
+        self.stall_intervals = stall_intervals
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.healthy_after = healthy_after
+
+        self._failure = threading.Event()
+        self._reason = None
+        self._consecutive = 0
+        self._last_recovered = 0.0
+
+        # Telemetry
+        self.recovering = False
+        self.restarts = 0
+        self.failed_attempts = 0
+        self.last_reason = None
+        self.last_recovery_ms = None
+
+        self.running = False
+        self._loop = GLib.MainLoop()
+        self._loop_thread = None
+        self._thread = None
+
+    @property
+    def stall_timeout(self):
+        return self.stall_intervals * self.camera.frame_interval()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._loop_thread = threading.Thread(target=self._loop.run, daemon=True)
+        self._loop_thread.start()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        self._failure.set()
+        if self._loop.is_running():
+            self._loop.quit()
+
+    def report_failure(self, reason):
+        """Called from the bus watch; recovery runs on the supervisor thread."""
+        self._reason = reason
+        self._failure.set()
+
+    def _stalled(self):
+        camera = self.camera
+        if camera.paused:
+            return False
+        # A switch in progress has its own timeout and fallback
+        if not camera._switch_lock.acquire(blocking=False):
+            return False
+        try:
+            return time.monotonic() - camera.last_sample_time > self.stall_timeout
+        finally:
+            camera._switch_lock.release()
+
+    def _run(self):
+        while self.running:
+            failed = self._failure.wait(max(0.05, self.stall_timeout / 4))
+            if not self.running:
+                break
+            reason = None
+            if failed:
+                self._failure.clear()
+                reason = self._reason
+            elif self._stalled():
+                reason = f"no samples for {self.stall_timeout * 1000:.0f} ms"
+                self.camera.metrics.pipeline_stalls.inc()
+            if reason is not None:
+                self._recover(reason)
+            # Standby pipelines nobody switched to stay pre-rolled until evicted
+            self.camera.pipeline_cache.evict_idle()
+
+    def _recover(self, reason):
+        camera = self.camera
+        detected = time.monotonic()
+        print(f"Capture failure ({reason}), recovering", file=sys.stderr)
+        self.last_reason = reason
+        self.recovering = True
+        camera.pipeline_status = "Recovering"
+
+        # Failing again soon after a recovery means the fault is persisting
+        if detected - self._last_recovered < self.healthy_after:
+            self._consecutive += 1
+        else:
+            self._consecutive = 0
+        delay = min(self.backoff * 2 ** (self._consecutive - 1), self.max_backoff) if self._consecutive else 0
+
+        attempt = 0
+        while self.running:
+            if delay:
+                time.sleep(delay)
+            # First try restarting the same pipeline, then rebuild it
+            if camera.recover(rebuild=attempt > 0):
+                break
+            attempt += 1
+            self.failed_attempts += 1
+            delay = min(max(delay * 2, self.backoff), self.max_backoff)
+            print(f"Recovery attempt {attempt} failed, retrying in {delay:.1f} s", file=sys.stderr)
+        else:
+            return
+
+        recovery_time = time.monotonic() - detected
+        self.restarts += 1
+        self.last_recovery_ms = round(recovery_time * 1000, 1)
+        self._last_recovered = time.monotonic()
+        self.recovering = False
+        # Anything reported during recovery was about the pipeline we replaced
+        self._failure.clear()
+        camera.metrics.pipeline_restarts.inc()
+        camera.metrics.recovery.observe(recovery_time)
+        camera.pipeline_status = "Playing"
+        print(f"Capture recovered in {self.last_recovery_ms} ms")
+
+    def get_telemetry(self):
+        return {
+            "recovering": self.recovering,
+            "restarts": self.restarts,
+            "failed_attempts": self.failed_attempts,
+            "last_reason": self.last_reason,
+            "last_recovery_ms": self.last_recovery_ms,
+            "stall_timeout_ms": round(self.stall_timeout * 1000, 1),
+        }
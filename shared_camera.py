@@ -0,0 +1,445 @@
+import asyncio
+import itertools
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+from frame_bus import MULTIPART_TRAILER, FrameBus, StreamClient, multipart_header
+from metrics import StageMetrics
+from shared_frame_bus import SharedFrameRing, ring_name
+
+# Server-worker side of the capture service (capture_service.py). Frames
+# and telemetry come from the camera's shared-memory ring; everything that
+# changes the camera goes to the capture process over its control socket.
+
+CONTROL_SOCKET = os.environ.get("AEONBOT_CONTROL_SOCKET", "/tmp/aeonbot-capture.sock")
+
+
+class ControlClient:
+    """JSON-lines requests to the capture service, one persistent connection per worker."""
+
+    def __init__(self, path=CONTROL_SOCKET, timeout=10.0):
+        self.path = path
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        self._sock = sock
+        self._file = sock.makefile("rb")
+
+    def _close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+        self._sock = self._file = None
+
+    def call(self, camera_id, method, *args, **kwargs):
+        """Run method on the capture side and return its result; raises RuntimeError on failure."""
+        request = json.dumps({"camera": camera_id, "method": method, "args": args, "kwargs": kwargs})
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    self._sock.sendall(request.encode() + b"\n")
+                    line = self._file.readline()
+                    if not line:
+                        raise ConnectionError("capture service closed the connection")
+                    break
+                except OSError as e:
+                    self._close()
+                    if attempt:
+                        raise RuntimeError(f"Capture service unavailable: {e}") from e
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+
+class RemoteRecorder:
+    """The capture process's event recorder; clips are read from the same directory."""
+
+    def __init__(self, camera):
+        self.camera = camera
+        recordings_dir = os.environ.get("AEONBOT_RECORDINGS_DIR", "recordings")
+        self.directory = os.path.join(recordings_dir, camera.camera_id)
+
+    def trigger(self, reason, before=5.0, after=5.0):
+        return self.camera.control.call(self.camera.camera_id, "recorder.trigger", reason, before=before, after=after)
+
+    @property
+    def clips(self):
+        return self.camera.control.call(self.camera.camera_id, "recorder.clips")
+
+
+class RemoteServo:
+    """Visual servo running next to the tracker in the capture process."""
+
+    def __init__(self, control):
+        self.control = control
+
+    @property
+    def enabled(self):
+        try:
+            return self.get_telemetry()["enabled"]
+        except RuntimeError:
+            return False
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def enable(self, **settings):
+        self.control.call(None, "servo.enable", **settings)
+
+    def disable(self, reason="disabled"):
+        self.control.call(None, "servo.disable", reason)
+
+    def get_telemetry(self):
+        return self.control.call(None, "servo.get_telemetry")
+
+
+class SharedCamera:
+    """
+    Stands in for a camera in a server worker when capture runs in its own
+    process. Viewers in this worker share one reader thread that follows
+    the ring and republishes each frame, copied out once, on a local frame
+    bus that every /video-feed client here sends from. Telemetry is the last
+    document the capture process wrote to the ring.
+
+    Only the capture-resolution MJPEG stream is shared: simulcast branches,
+    the compressed stream, WebRTC and adaptive quality need in-process
+    capture.
+    """
+
+    def __init__(self, camera_id, control, poll_interval=0.002, demand_interval=0.5, stale_after=3.0):
+        self.camera_id = camera_id
+        self.control = control
+        self.poll_interval = poll_interval
+        self.demand_interval = demand_interval
+        self.stale_after = stale_after
+        self.created_at = time.monotonic()
+        self.metrics = StageMetrics({"camera": camera_id, "worker": str(os.getpid())})
+        self.recorder = RemoteRecorder(self)
+        self.frame_bus = FrameBus(on_subscribers_changed=self._watched)
+        self.raw_bus = FrameBus()  # raw frames stay in the capture process
+        self.branch_buses = {}
+        self.compressed_stream = None
+        self.stream_clients = {}
+        self._client_ids = itertools.count(1)
+        self.cpus = None
+        self.running = True
+        self.started = threading.Event()
+        self.started.set()
+
+        self._ring = None
+        self._ring_lock = threading.Lock()
+        self._next_attach = 0.0
+        self._reader = None
+        self._wake = threading.Event()
+        self._telemetry_seq = 0
+        self._telemetry = {}
+        self.torn_frames = 0
+
+    # Ring access
+
+    @property
+    def ring(self):
+        """The attached ring, or None while the capture service is not running."""
+        with self._ring_lock:
+            ring = self._ring
+            if ring is not None and ring.heartbeat_age() > self.stale_after:
+                # The capture process restarted or died; its new ring is a new segment
+                ring.close()
+                ring = self._ring = None
+            if ring is None and time.monotonic() >= self._next_attach:
+                self._next_attach = time.monotonic() + 1.0
+                try:
+                    ring = self._ring = SharedFrameRing(ring_name(self.camera_id))
+                    self._telemetry_seq = 0
+                except (FileNotFoundError, ValueError):
+                    ring = None
+            return ring
+
+    def _watched(self, count):
+        if count:
+            self.demand()
+            if self._reader is None or not self._reader.is_alive():
+                self._reader = threading.Thread(target=self._follow, daemon=True)
+                self._reader.start()
+            self._wake.set()
+
+    def _follow(self):
+        """Republish ring frames on the local bus while anyone here is watching."""
+        last_seq = 0
+        next_demand = 0.0
+        while self.running:
+            if not self.frame_bus.subscribers:
+                self._wake.wait(1.0)
+                self._wake.clear()
+                continue
+            ring = self.ring
+            if ring is None:
+                time.sleep(0.5)
+                continue
+            now = time.monotonic()
+            if now >= next_demand:
+                ring.touch()
+                next_demand = now + self.demand_interval
+            seq = ring.seq
+            if seq == last_seq:
+                time.sleep(self.poll_interval)
+                continue
+            frame = ring.read(seq)
+            last_seq = seq
+            if frame is None:
+                continue
+            # One copy per frame, shared by every client here: a send that
+            # blocks on a slow client could otherwise see the slot overwritten
+            frame = frame.detach()
+            if frame is None:
+                # Lapped by the producer while copying
+                self.torn_frames += 1
+                continue
+            self.frame_bus.publish(frame)
+
+    def demand(self):
+        ring = self.ring
+        if ring is not None:
+            ring.touch()
+
+    def start_in_background(self):
+        self.demand()
+
+    def in_use(self):
+        return self.frame_bus.subscribers > 0
+
+    @property
+    def latest_sample(self):
+        ring = self.ring
+        if ring is None:
+            return None
+        # A view; the snapshot cache detaches it only when the frame is new
+        return ring.latest()[1]
+
+    # Streaming
+
+    def next_client_id(self):
+        return next(self._client_ids)
+
+    def frame_bus_for(self, size=None):
+        if size is not None:
+            raise ValueError(f"Simulcast {size[0]}x{size[1]} needs in-process capture")
+        return self.frame_bus
+
+    def available_resolutions(self):
+        return [(self.current_width, self.current_height)]
+
+    async def generate_frames_async(self, peer=None, size=None, adaptive=True):
+        """MJPEG generator for /video-feed, sending the frames _follow copied out of shared memory."""
+        frame_bus = self.frame_bus_for(size)
+        client = StreamClient(self.next_client_id(), peer)
+        self.stream_clients[client.client_id] = client
+        frame_bus.subscribe()
+        try:
+            last_seq, _ = frame_bus.latest()
+            while self.running:
+                seq, frame = await frame_bus.wait_for_frame_async(last_seq, timeout=5)
+                if frame is None:
+                    continue
+                if last_seq and seq - last_seq > 1:
+                    client.frames_dropped += seq - last_seq - 1
+                    self.metrics.frames_dropped.inc(seq - last_seq - 1)
+                last_seq = seq
+
+                frame_interval = 1.0 / self.current_fps if self.current_fps else 1.0 / 30
+                started = time.monotonic()
+                yield multipart_header(frame)
+                yield frame.data
+                yield MULTIPART_TRAILER
+                send_time = time.monotonic() - started
+                self.metrics.socket_write.observe(send_time)
+                self.metrics.end_to_end.observe(time.monotonic() - frame.arrival)
+                client.record_send(len(frame), send_time, frame_interval)
+        finally:
+            frame_bus.unsubscribe()
+            self.stream_clients.pop(client.client_id, None)
+
+    # Telemetry from the capture process
+
+    def _read_telemetry(self):
+        ring = self.ring
+        if ring is None:
+            return {}
+        seq, data = ring.read_telemetry(since=self._telemetry_seq)
+        if data is not None:
+            self._telemetry_seq = seq
+            self._telemetry = json.loads(data)
+        return self._telemetry
+
+    @property
+    def pipeline_status(self):
+        if self.ring is None:
+            return "Waiting for capture service"
+        return self._read_telemetry().get("status", "Idle")
+
+    @property
+    def paused(self):
+        return self._read_telemetry().get("idle", False)
+
+    def _resolution(self):
+        resolution = self._read_telemetry().get("resolution", "1280x720")
+        return tuple(map(int, resolution.split("x")))
+
+    @property
+    def current_width(self):
+        return self._resolution()[0]
+
+    @property
+    def current_height(self):
+        return self._resolution()[1]
+
+    @property
+    def current_fps(self):
+        return float(self._read_telemetry().get("fps", 0))
+
+    @property
+    def supported_resolutions(self):
+        resolutions = self._read_telemetry().get("supported_resolutions", [])
+        return [tuple(map(int, r.split("x"))) for r in resolutions]
+
+    @property
+    def startup(self):
+        return self._read_telemetry().get("startup", {"first_frame_ms": None})
+
+    @property
+    def last_switch(self):
+        return self._read_telemetry().get("last_switch")
+
+    @property
+    def tracking_active(self):
+        return self._read_telemetry().get("tracking_active", False)
+
+    def get_capabilities(self):
+        telemetry = self._read_telemetry()
+        return {
+            key: telemetry.get(key, [])
+            for key in ("supported_resolutions", "supported_formats", "supported_encoders")
+        }
+
+    def get_tracking_telemetry(self):
+        telemetry = self._read_telemetry()
+        return {
+            "tracking_active": telemetry.get("tracking_active", False),
+            "tracking_lost": telemetry.get("tracking_lost", False),
+            "tracked_bbox": telemetry.get("tracked_bbox", []),
+            "tracks": telemetry.get("tracks", []),
+            "motion": telemetry.get("motion_gating", {}).get("moving", True),
+        }
+
+    async def track_states(self, interval=0.1):
+        """
+        Track states from the capture process's telemetry, in the same shape
+        as in-process, once per tracked frame the telemetry rate catches.
+        """
+        last = None
+        while self.running:
+            telemetry = self._read_telemetry()
+            frame_time = telemetry.get("multi_tracker", {}).get("frame_time")
+            if frame_time is not None and frame_time != last:
+                last = frame_time
+                yield json.dumps({"frame_time": frame_time, "tracks": telemetry.get("tracks", [])})
+            await asyncio.sleep(interval)
+
+    async def motion_events(self, interval=0.1):
+        """
+        Motion events from the capture process, picked up from its telemetry.
+        Only the newest event is in there, so one of a burst faster than
+        the telemetry interval can be missed.
+        """
+        last = (self._read_telemetry().get("motion_gating") or {}).get("last_event")
+        last_id = last["id"] if last else 0
+        while self.running:
+            await asyncio.sleep(interval)
+            event = (self._read_telemetry().get("motion_gating") or {}).get("last_event")
+            if event and event["id"] != last_id:
+                last_id = event["id"]
+                yield json.dumps(event)
+
+    def get_telemetry(self, include_capabilities=True):
+        telemetry = dict(self._read_telemetry())
+        if not include_capabilities:
+            for key in ("supported_resolutions", "supported_formats", "supported_encoders"):
+                telemetry.pop(key, None)
+        ring = self.ring
+        telemetry["status"] = self.pipeline_status
+        telemetry["shared"] = {
+            "worker": os.getpid(),
+            "ring": ring.get_telemetry() if ring is not None else None,
+            "torn_frames": self.torn_frames,
+        }
+        # Viewers of this worker; the capture process has none of its own
+        telemetry["stream_clients"] = [c.as_dict() for c in list(self.stream_clients.values())]
+        return telemetry
+
+    # Control, forwarded to the capture process
+
+    def _call(self, method, *args, **kwargs):
+        try:
+            return self.control.call(self.camera_id, method, *args, **kwargs)
+        except RuntimeError as e:
+            print(f"Camera {self.camera_id} {method} failed: {e}", file=sys.stderr)
+            return False
+
+    def set_resolution(self, width, height):
+        return self._call("set_resolution", width, height)
+
+    def set_pipeline_settings(self, color_format=None, jpeg_quality=None, encoder=None, bitrate=None):
+        return self._call(
+            "set_pipeline_settings",
+            color_format=color_format, jpeg_quality=jpeg_quality, encoder=encoder, bitrate=bitrate,
+        )
+
+    def start_tracking(self, x, y, w, h):
+        return self._call("start_tracking", x, y, w, h)
+
+    def reset_tracking(self):
+        self._call("reset_tracking")
+
+    def add_tracks(self, boxes):
+        result = self._call("add_tracks", [list(box) for box in boxes])
+        return result if result is not False else [None] * len(boxes)
+
+    def remove_track(self, track_id):
+        return self._call("remove_track", track_id)
+
+    def clear_tracks(self):
+        self._call("clear_tracks")
+
+    def get_tracks(self):
+        return self._read_telemetry().get("tracks", [])
+
+    def set_motion_settings(self, gating=None, threshold=None, min_area=None, hold=None,
+                            keepalive_interval=None):
+        return self._call(
+            "set_motion_settings", gating=gating, threshold=threshold, min_area=min_area,
+            hold=hold, keepalive_interval=keepalive_interval,
+        )
+
+    def close(self):
+        self.running = False
+        self._wake.set()
+        with self._ring_lock:
+            if self._ring is not None:
+                self._ring.close()
+                self._ring = None
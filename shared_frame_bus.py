@@ -0,0 +1,224 @@
+import json
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+# Layout of one camera's shared-memory segment:
+#   header     magic, slot count, slot size, newest seq, reader demand and
+#              producer heartbeat times (time.monotonic is system-wide)
+#   telemetry  seq-locked JSON document, rewritten by the producer
+#   slots      ring of encoded frames, each with its own seq
+# The capture process is the only writer. Readers in any number of server
+# workers map the segment and send frames straight out of it.
+
+MAGIC = b"AEONRNG1"
+HEADER = struct.Struct("<8sIIQdd")
+TELEMETRY_HEADER = struct.Struct("<QI")
+SLOT_HEADER = struct.Struct("<QIdq")
+SLOT_HEADER_SIZE = 64
+TELEMETRY_SIZE = 64 * 1024
+
+SEQ_OFFSET = 16
+DEMAND_OFFSET = 24
+HEARTBEAT_OFFSET = 32
+TELEMETRY_OFFSET = 64
+SLOTS_OFFSET = TELEMETRY_OFFSET + TELEMETRY_SIZE
+
+
+def ring_name(camera_id):
+    return f"aeonbot-frames-{camera_id}"
+
+
+class SharedFrame:
+    """
+    Encoded frame read in place from a ring slot. data is a view into shared
+    memory, so it is only good until the producer laps the ring; valid()
+    says whether the slot still holds this frame, and detach() copies it
+    out.
+    """
+
+    __slots__ = ("ring", "seq", "offset", "data", "pts", "arrival")
+
+    def __init__(self, ring, seq, offset, data, pts, arrival):
+        self.ring = ring
+        self.seq = seq
+        self.offset = offset
+        self.data = data
+        self.pts = pts
+        self.arrival = arrival
+
+    def __len__(self):
+        return self.data.nbytes
+
+    def valid(self):
+        return self.ring is None or self.ring._slot_seq(self.offset) == self.seq
+
+    def detach(self):
+        """A copy that outlives the slot, or None if the slot was overwritten while copying."""
+        data = memoryview(bytes(self.data))
+        if not self.valid():
+            return None
+        return SharedFrame(None, self.seq, self.offset, data, self.pts, self.arrival)
+
+
+class SharedFrameRing:
+    """
+    Fixed-size ring of encoded frames in POSIX shared memory, with sequence
+    counters instead of locks. The producer invalidates a slot, copies the
+    frame in, then publishes the slot's seq and finally the ring's newest
+    seq; a reader checks the slot seq before and after taking its view.
+    """
+
+    def __init__(self, name, slots=8, slot_size=2 * 1024 * 1024, create=False):
+        self.name = name
+        self.create = create
+        if create:
+            try:
+                stale = shared_memory.SharedMemory(name)
+                stale.close()
+                stale.unlink()
+            except FileNotFoundError:
+                pass
+            size = SLOTS_OFFSET + slots * (SLOT_HEADER_SIZE + slot_size)
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+            HEADER.pack_into(self.shm.buf, 0, MAGIC, slots, slot_size, 0, 0.0, time.monotonic())
+            TELEMETRY_HEADER.pack_into(self.shm.buf, TELEMETRY_OFFSET, 0, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name)
+            # Only the creator may unlink; otherwise the resource tracker
+            # removes the segment when the first reader exits
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+            magic, slots, slot_size = HEADER.unpack_from(self.shm.buf, 0)[:3]
+            if magic != MAGIC:
+                self.shm.close()
+                raise ValueError(f"{name} is not a frame ring")
+        self.buf = self.shm.buf
+        self.slots = slots
+        self.slot_size = slot_size
+        self._seq = self.seq
+        self._telemetry_seq = 0
+
+        # Telemetry
+        self.published = 0
+        self.oversized = 0
+
+    def _slot_offset(self, seq):
+        return SLOTS_OFFSET + (seq % self.slots) * (SLOT_HEADER_SIZE + self.slot_size)
+
+    def _slot_seq(self, offset):
+        return struct.unpack_from("<Q", self.buf, offset)[0]
+
+    @property
+    def seq(self):
+        return struct.unpack_from("<Q", self.buf, SEQ_OFFSET)[0]
+
+    # Producer side
+
+    def publish(self, data, pts=None, arrival=None):
+        """Copy one encoded frame into the next slot; returns its seq, or None if it does not fit."""
+        length = len(data)
+        if length > self.slot_size:
+            self.oversized += 1
+            return None
+        seq = self._seq + 1
+        offset = self._slot_offset(seq)
+        struct.pack_into("<Q", self.buf, offset, 0)
+        start = offset + SLOT_HEADER_SIZE
+        self.buf[start:start + length] = data
+        SLOT_HEADER.pack_into(
+            self.buf, offset, seq, length,
+            arrival if arrival is not None else time.monotonic(),
+            pts if pts is not None else -1,
+        )
+        struct.pack_into("<Q", self.buf, SEQ_OFFSET, seq)
+        self._seq = seq
+        self.published += 1
+        return seq
+
+    def write_telemetry(self, fields):
+        data = json.dumps(fields).encode()
+        if len(data) > TELEMETRY_SIZE - TELEMETRY_HEADER.size:
+            return False
+        # Odd while writing, so readers retry instead of reading a torn document
+        self._telemetry_seq += 1
+        struct.pack_into("<Q", self.buf, TELEMETRY_OFFSET, self._telemetry_seq)
+        start = TELEMETRY_OFFSET + TELEMETRY_HEADER.size
+        self.buf[start:start + len(data)] = data
+        self._telemetry_seq += 1
+        TELEMETRY_HEADER.pack_into(self.buf, TELEMETRY_OFFSET, self._telemetry_seq, len(data))
+        struct.pack_into("<d", self.buf, HEARTBEAT_OFFSET, time.monotonic())
+        return True
+
+    def demand_age(self):
+        """Seconds since a reader last asked for frames."""
+        return time.monotonic() - struct.unpack_from("<d", self.buf, DEMAND_OFFSET)[0]
+
+    # Reader side
+
+    def read(self, seq, copy=False):
+        """The frame with seq, or None once it has been overwritten."""
+        if seq <= 0:
+            return None
+        offset = self._slot_offset(seq)
+        slot_seq, length, arrival, pts = SLOT_HEADER.unpack_from(self.buf, offset)
+        if slot_seq != seq:
+            return None
+        start = offset + SLOT_HEADER_SIZE
+        data = self.buf[start:start + length]
+        if copy:
+            data = memoryview(bytes(data))
+        if self._slot_seq(offset) != seq:
+            return None
+        return SharedFrame(self, seq, offset, data, pts if pts >= 0 else None, arrival)
+
+    def latest(self, copy=False):
+        """Return (seq, frame) for the newest frame without waiting."""
+        seq = self.seq
+        return seq, self.read(seq, copy)
+
+    def read_telemetry(self, since=0):
+        """
+        (telemetry seq, JSON bytes) of the last complete document; the bytes
+        are None if nothing has been written or the seq is still since.
+        """
+        start = TELEMETRY_OFFSET + TELEMETRY_HEADER.size
+        for _ in range(10):
+            seq, length = TELEMETRY_HEADER.unpack_from(self.buf, TELEMETRY_OFFSET)
+            if seq == 0 or seq == since:
+                return seq, None
+            if seq % 2:
+                time.sleep(0.0001)
+                continue
+            data = bytes(self.buf[start:start + length])
+            if struct.unpack_from("<Q", self.buf, TELEMETRY_OFFSET)[0] == seq:
+                return seq, data
+        return since, None
+
+    def touch(self):
+        """Tell the producer a reader wants frames."""
+        struct.pack_into("<d", self.buf, DEMAND_OFFSET, time.monotonic())
+
+    def heartbeat_age(self):
+        return time.monotonic() - struct.unpack_from("<d", self.buf, HEARTBEAT_OFFSET)[0]
+
+    def close(self):
+        self.buf = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # a response still holds a frame view; freed with it
+        if self.create:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def get_telemetry(self):
+        return {
+            "name": self.name,
+            "slots": self.slots,
+            "slot_kb": self.slot_size // 1024,
+            "seq": self.seq,
+            "published": self.published,
+            "oversized": self.oversized,
+        }
@@ -0,0 +1,141 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+
+import cv2
+import numpy as np
+
+from shared_frame_bus import SharedFrame
+
+# Reduced JPEG decode factors; decoding at 1/8 scale is far cheaper than a
+# full decode followed by a resize
+DECODE_REDUCTIONS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+
+class Snapshot:
+    """One cached JPEG for a frame and width, with its validators."""
+
+    __slots__ = ("etag", "modified", "last_modified", "future")
+
+    def __init__(self, etag, modified, future):
+        self.etag = etag
+        self.modified = modified  # wall-clock capture time
+        self.last_modified = formatdate(modified, usegmt=True)
+        self.future = future
+
+    def headers(self):
+        return {"ETag": self.etag, "Last-Modified": self.last_modified, "Cache-Control": "no-cache"}
+
+    def not_modified(self, if_none_match=None, if_modified_since=None):
+        """Evaluate conditional request headers; If-None-Match wins when present."""
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or self.etag in tags
+        if if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(self.modified) <= since
+        return False
+
+    async def data(self):
+        return await asyncio.wrap_future(self.future)
+
+
+class SnapshotCache:
+    """
+    Serves the camera's latest encoded frame as a still image. The full
+    frame is the capture JPEG itself, copied once per frame; thumbnails are
+    decoded at reduced scale, resized and re-encoded at most once per frame
+    and width, off the event loop. Entries are keyed by width and evicted
+    least recently used. Validators are known before any work is done, so
+    a conditional request for an unchanged frame costs nothing.
+    """
+
+    def __init__(self, camera, max_entries=8, quality=80, min_width=16):
+        self.camera = camera
+        self.max_entries = max_entries
+        self.quality = quality
+        self.min_width = min_width
+        self._entries = OrderedDict()  # width or None -> (frame arrival, Snapshot)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot")
+        self._epoch = int(time.time())
+
+        # Telemetry
+        self.hits = 0
+        self.renders = 0
+        self.not_modified = 0
+
+    def latest(self, width=None):
+        """Snapshot of the newest frame at width (None for full size), or None."""
+        sample = self.camera.latest_sample
+        if sample is None:
+            return None
+        if width is not None:
+            width = max(self.min_width, width)
+            if width >= self.camera.current_width:
+                width = None
+
+        with self._lock:
+            entry = self._entries.get(width)
+            if entry is not None and entry[0] == sample.arrival:
+                self._entries.move_to_end(width)
+                self.hits += 1
+                return entry[1]
+
+            if isinstance(sample, SharedFrame):
+                # Read in place from the ring; copy it out only now that it is needed
+                sample = sample.detach()
+                if sample is None:
+                    return None
+
+            suffix = f"-{width}" if width is not None else ""
+            etag = f'"{self._epoch:x}-{int(sample.arrival * 1e6):x}{suffix}"'
+            modified = time.time() - (time.monotonic() - sample.arrival)
+            if width is None:
+                future = self._executor.submit(bytes, sample.data)
+            else:
+                future = self._executor.submit(self._thumbnail, sample, width)
+            snapshot = Snapshot(etag, modified, future)
+            self._entries[width] = (sample.arrival, snapshot)
+            self._entries.move_to_end(width)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.renders += 1
+            return snapshot
+
+    def _thumbnail(self, sample, width):
+        flags = cv2.IMREAD_COLOR
+        for factor, reduced in DECODE_REDUCTIONS:
+            if self.camera.current_width // factor >= width:
+                flags = reduced
+                break
+        image = cv2.imdecode(np.frombuffer(sample.data, dtype=np.uint8), flags)
+        if image is None:
+            raise ValueError("Could not decode frame for thumbnail")
+        height = max(1, round(image.shape[0] * width / image.shape[1]))
+        if image.shape[1] != width:
+            image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+        ret, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ret:
+            raise ValueError("Thumbnail encode failed")
+        return buffer.tobytes()
+
+    def get_telemetry(self):
+        with self._lock:
+            cached = [width or "full" for width in self._entries]
+        return {
+            "cached": cached,
+            "hits": self.hits,
+            "renders": self.renders,
+            "not_modified": self.not_modified,
+        }
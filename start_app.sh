@@ -17,9 +17,51 @@ cd "$PROJECT_DIR" || {
 if [ ! -f "main.py" ]; then
     echo "Error: main.py not found in $PROJECT_DIR" >&2
     exit 1
-}
+fi
+
+# AEONBOT_WORKERS > 1 moves capture into capture_service.py, which the
+# workers read through shared memory
+WORKERS="${AEONBOT_WORKERS:-1}"
+if [ "$WORKERS" -gt 1 ]; then
+    CONTROL_SOCKET="${AEONBOT_CONTROL_SOCKET:-/tmp/aeonbot-capture.sock}"
+    rm -f "$CONTROL_SOCKET"
+    python3 capture_service.py &
+    CAPTURE_PID=$!
+    trap 'kill "$CAPTURE_PID" 2>/dev/null || true; wait "$CAPTURE_PID" 2>/dev/null || true' EXIT
+
+    # The control socket appears once every camera's ring has been created
+    for _ in $(seq 1 300); do
+        [ -S "$CONTROL_SOCKET" ] && break
+        if ! kill -0 "$CAPTURE_PID" 2>/dev/null; then
+            echo "Error: capture_service.py exited during startup" >&2
+            exit 1
+        fi
+        sleep 0.1
+    done
+    if [ ! -S "$CONTROL_SOCKET" ]; then
+        echo "Error: capture service not ready after 30 s" >&2
+        exit 1
+    fi
+
+    # uvicorn stays a child so the capture service is stopped when it exits
+    export AEONBOT_CAPTURE=shared
+    python3 -m uvicorn main:app \
+        --host 0.0.0.0 \
+        --port 8000 \
+        --workers "$WORKERS" \
+        --log-level info &
+    UVICORN_PID=$!
+    trap 'kill -TERM "$UVICORN_PID" 2>/dev/null || true' TERM INT
+    status=0
+    wait "$UVICORN_PID" || status=$?
+    # A trapped signal interrupts the first wait; wait for uvicorn to finish
+    if kill -0 "$UVICORN_PID" 2>/dev/null; then
+        status=0
+        wait "$UVICORN_PID" || status=$?
+    fi
+    exit "$status"
+fi
 
-<<<<<<< HEAD
 # Start uvicorn in the foreground
 # This is important for systemd to track the process properly
 exec python3 -m uvicorn main:app \
@@ -27,13 +69,3 @@ exec python3 -m uvicorn main:app \
     --port 8000 \
     --workers 1 \
     --log-level info
-=======
-echo "=== Starting FastAPI server with uvicorn in background ==="
-# Run uvicorn in the background via nohup, output logs to uvicorn.log
-sudo nohup python3 -m uvicorn main:app --host 0.0.0.0 --port 8000 > "$LOG_FILE" 2>&1 &
-
-# Store the process ID
-echo $! > "$PID_FILE"
-echo "Uvicorn server started in background with PID $(cat "$PID_FILE")."
-echo "Logs are being written to $LOG_FILE."
->>>>>>> 3f7e08d (Update)
@@ -0,0 +1,151 @@
+import queue
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from frame_bus import EncodedFrame, RawFrame
+from gstreamer_camera import GStreamerCamera
+
+
+class SyntheticCamera(GStreamerCamera):
+    """
+    Camera backend that draws frames with NumPy and encodes them with
+    cv2.imencode instead of running a GStreamer pipeline. Frames go through
+    the same queue, frame buses and streaming code as the real camera, so
+    load tests measure the server rather than the capture hardware.
+
+    Only JPEG output is offered. With no pipeline every reconfigure() is a
+    "rebuild", which restarts the generator thread with the new settings.
+    """
+
+    def __init__(self, fps=30, start=True, camera_id=None, cpus=None, idle_timeout=None,
+                 motion_gating=False):
+        self.fps = fps
+        self._generation = 0
+        self._generator = None
+        super().__init__(
+            source_element="synthetic", start=start, camera_id=camera_id,
+            cpus=cpus, idle_timeout=idle_timeout, motion_gating=motion_gating,
+        )
+
+    def _probe_capabilities(self):
+        encoders = {
+            "jpegenc": {"name": "JPEG", "mime_type": "image/jpeg", "element": "jpegenc"}
+        }
+        return encoders, ["RGBx"]
+
+    def frame_interval(self):
+        return 1.0 / self.fps
+
+    def create_pipeline(self):
+        """Restart the generator with the current settings and wait for its first frame."""
+        self._generation += 1
+        target = self.samples_received + 1
+        self._generator = threading.Thread(
+            target=self._generate, args=(self._generation,), daemon=True
+        )
+        self._generator.start()
+        self.pipeline_key = self._pipeline_key()
+        self.pipeline_string = f"synthetic {self.current_width}x{self.current_height}@{self.fps}"
+        with self._sample_cond:
+            started = self._sample_cond.wait_for(lambda: self.samples_received >= target, 5)
+        self.pipeline_status = "Playing" if started else "Error"
+        return started
+
+    def _stop_capture(self):
+        # A newer generation makes the running generator exit
+        self._generation += 1
+
+    def _background(self, width, height):
+        """Static gradient the moving block is drawn over."""
+        x = np.linspace(0, 255, width, dtype=np.uint8)
+        y = np.linspace(0, 255, height, dtype=np.uint8)
+        image = np.empty((height, width, 3), dtype=np.uint8)
+        image[:, :, 0] = x[np.newaxis, :]
+        image[:, :, 1] = y[:, np.newaxis]
+        image[:, :, 2] = 128
+        return image
+
+    def _generate(self, generation):
+        width, height = self.current_width, self.current_height
+        raw_size = (
+            max(2, int(width * self.raw_scale) // 2 * 2),
+            max(2, int(height * self.raw_scale) // 2 * 2),
+        )
+        background = self._background(width, height)
+        block = max(8, height // 8)
+        interval = 1.0 / self.fps
+        next_frame = time.monotonic()
+        index = 0
+
+        while self.running and generation == self._generation:
+            try:
+                image = background.copy()
+                x = (index * 8) % (width - block)
+                y = (index * 5) % (height - block)
+                image[y:y + block, x:x + block] = 255
+                cv2.putText(image, str(index), (16, 48), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 0), 3)
+                pts = int(index * interval * 1e9)
+                self._publish(image, self.jpeg_quality, pts, raw_size)
+            except Exception as e:
+                print(f"Error in synthetic camera: {e}", file=sys.stderr)
+
+            index += 1
+            next_frame += interval
+            delay = next_frame - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Fell behind; do not try to catch up with a burst
+                next_frame = time.monotonic()
+
+    def _publish(self, image, quality, pts, raw_size):
+        # The motion detector needs every raw frame, gated or not
+        raw = cv2.resize(image, raw_size, interpolation=cv2.INTER_AREA)
+        self.raw_bus.publish(RawFrame.from_array(raw, pts))
+        if self.level_bus.subscribers:
+            # Full-size source for adaptive levels, like the GStreamer raw tap
+            self.level_bus.publish(RawFrame.from_array(image, pts))
+        if not self._encode_allowed():
+            return
+
+        arrival = time.monotonic()
+        ret, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ret:
+            return
+        self.metrics.encode.observe(time.monotonic() - arrival)
+
+        with self._sample_cond:
+            self.samples_received += 1
+            self.last_sample_time = time.monotonic()
+            self._sample_cond.notify_all()
+        self.metrics.frames_received.inc()
+        self.metrics.bytes_received.inc(len(buffer))
+
+        self.frame_count += 1
+        elapsed_time = time.time() - self.start_time
+        if elapsed_time >= 1.0:
+            self.current_fps = self.frame_count / elapsed_time
+            self.frame_count = 0
+            self.start_time = time.time()
+
+        try:
+            self.frame_queue.put_nowait(EncodedFrame(buffer, pts, arrival))
+        except queue.Full:
+            self.metrics.queue_full.inc()
+
+        # Scaled simulcast branches are only encoded while someone watches them
+        for size in self._simulcast_sizes(self.current_width, self.current_height):
+            bus = self.branch_buses[size]
+            if bus.subscribers and self._encode_allowed(size):
+                scaled = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+                ret, branch_buffer = cv2.imencode('.jpg', scaled, [cv2.IMWRITE_JPEG_QUALITY, quality])
+                if ret:
+                    bus.publish(EncodedFrame(branch_buffer, pts, arrival))
+
+    def __del__(self):
+        self.running = False
+        super().__del__()
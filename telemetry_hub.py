@@ -0,0 +1,137 @@
+import json
+import sys
+import threading
+import time
+
+from frame_bus import FrameBus
+
+_MISSING = object()
+
+
+class TelemetryUpdate:
+    """One published change set, plus the full state it produced."""
+
+    __slots__ = ("delta", "state", "_snapshot")
+
+    def __init__(self, changed, state):
+        self.delta = json.dumps(changed)
+        self.state = state
+        self._snapshot = None
+
+    @property
+    def snapshot(self):
+        # Encoded at most once, however many clients need to resync
+        if self._snapshot is None:
+            self._snapshot = json.dumps(self.state)
+        return self._snapshot
+
+
+class TelemetryHub:
+    """
+    Single telemetry producer shared by every SSE and WebSocket subscriber.
+    One thread samples the camera, diffs against the last state and
+    publishes only the changed fields on a FrameBus; clients get the static
+    capabilities and a full snapshot on connect, then deltas. A client that
+    falls behind gets a fresh snapshot instead of the deltas it missed.
+
+    Tracking fields are sampled every fast_interval, the rest every
+    interval. The thread idles while nobody is subscribed.
+    """
+
+    def __init__(self, camera, interval=1.0, fast_interval=0.1):
+        self.camera = camera
+        self.interval = interval
+        self.fast_interval = fast_interval
+        self.bus = FrameBus(on_subscribers_changed=self._subscribers_changed)
+
+        self._state = {}
+        self._capabilities = None
+        self._wake = threading.Event()
+        self.updates = 0
+
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _subscribers_changed(self, count):
+        if count:
+            self._wake.set()
+
+    def capabilities(self):
+        if self._capabilities is None:
+            self._capabilities = json.dumps(self.camera.get_capabilities())
+        return self._capabilities
+
+    def _run(self):
+        next_full = 0.0
+        while self.running:
+            if not self.bus.subscribers:
+                self._wake.wait(1.0)
+                self._wake.clear()
+                # Start over with a full sample once someone subscribes
+                next_full = 0.0
+                continue
+
+            started = time.monotonic()
+            try:
+                if started >= next_full:
+                    fields = self.camera.get_telemetry(include_capabilities=False)
+                    next_full = started + self.interval
+                else:
+                    fields = self.camera.get_tracking_telemetry()
+                self._publish_changes(fields)
+            except Exception as e:
+                print(f"Error in telemetry hub: {e}", file=sys.stderr)
+
+            remaining = self.fast_interval - (time.monotonic() - started)
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def _publish_changes(self, fields):
+        changed = {
+            key: value for key, value in fields.items()
+            if self._state.get(key, _MISSING) != value
+        }
+        if not changed:
+            return
+        self._state.update(changed)
+        self.updates += 1
+        self.bus.publish(TelemetryUpdate(changed, dict(self._state)))
+
+    async def events(self, timeout=15):
+        """
+        Yield (event, data) pairs for one subscriber: "capabilities" and
+        "snapshot" first, then "delta" per change, with data already JSON.
+        """
+        self.bus.subscribe()
+        try:
+            yield "capabilities", self.capabilities()
+
+            seq, update = self.bus.latest()
+            while update is None:
+                seq, update = await self.bus.wait_for_frame_async(seq, timeout=timeout)
+            yield "snapshot", update.snapshot
+
+            while True:
+                new_seq, update = await self.bus.wait_for_frame_async(seq, timeout=timeout)
+                if update is None:
+                    continue
+                if new_seq == seq + 1:
+                    yield "delta", update.delta
+                else:
+                    yield "snapshot", update.snapshot
+                seq = new_seq
+        finally:
+            self.bus.unsubscribe()
+
+    def stop(self):
+        self.running = False
+        self._wake.set()
+
+    def get_telemetry(self):
+        return {
+            "subscribers": self.bus.subscribers,
+            "updates": self.updates,
+            "interval": self.interval,
+            "fast_interval": self.fast_interval,
+        }
@@ -0,0 +1,112 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from camera_registry import CameraRegistry
+
+# Runs several videotestsrc cameras through the registry, as main.py does
+# with AEONBOT_CAMERAS. Checks that capture starts only for a camera with a
+# viewer, that cameras run side by side at their own rate, that a camera
+# without viewers pauses after the idle timeout while the others keep going,
+# that a new viewer resumes it, and reports the cores each camera was given.
+
+PATTERNS = ["ball", "smpte", "snow", "pinwheel"]
+
+
+def count_frames(bus, duration):
+    """Frames published on bus over duration seconds."""
+    seq, _ = bus.latest()
+    first = seq
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        seq, frame = bus.wait_for_frame(seq, timeout=deadline - time.monotonic())
+    return seq - first
+
+
+def wait_until(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def thread_cores(thread):
+    try:
+        return sorted(os.sched_getaffinity(thread.native_id))
+    except (AttributeError, OSError, TypeError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test several cameras through the camera registry")
+    parser.add_argument("--cameras", type=int, default=2, choices=range(2, len(PATTERNS) + 1))
+    parser.add_argument("--idle-timeout", type=float, default=2.0, help="seconds before an unwatched camera pauses")
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds to count frames")
+    args = parser.parse_args()
+
+    registry = CameraRegistry(
+        [(f"cam{i}", f"videotestsrc:{PATTERNS[i]}") for i in range(args.cameras)],
+        idle_timeout=args.idle_timeout,
+    )
+    contexts = list(registry)
+    first, others = contexts[0], contexts[1:]
+    results = []
+
+    try:
+        # 1. Only the watched camera starts
+        first.camera.frame_bus.subscribe()
+        started = wait_until(lambda: first.camera.started.is_set(), 10.0)
+        ok = started and not any(c.camera.started.is_set() for c in others)
+        print(f"Lazy start: {'✓' if ok else '✗'} {first.id} started, "
+              f"{sum(c.camera.started.is_set() for c in others)} unwatched cameras started")
+        results.append(ok)
+
+        # 2. All cameras produce frames at once
+        for context in others:
+            context.camera.frame_bus.subscribe()
+        wait_until(lambda: all(c.camera.started.is_set() for c in contexts), 10.0)
+        counts = {c.id: count_frames(c.camera.frame_bus, args.duration) for c in contexts}
+        ok = all(count > 0 for count in counts.values())
+        rates = {camera_id: round(count / args.duration, 1) for camera_id, count in counts.items()}
+        print(f"Concurrent capture: {'✓' if ok else '✗'} fps {rates}")
+        results.append(ok)
+
+        # 3. An unwatched camera pauses; the rest keep running
+        first.camera.frame_bus.unsubscribe()
+        paused = wait_until(lambda: first.camera.paused, args.idle_timeout + 5.0)
+        still_running = all(count_frames(c.camera.frame_bus, 0.5) > 0 for c in others)
+        ok = paused and still_running
+        print(f"Idle pause: {'✓' if ok else '✗'} {first.id} {first.camera.pipeline_status}, "
+              f"others {'running' if still_running else 'stalled'}")
+        results.append(ok)
+
+        # 4. A new viewer resumes it
+        resumed_at = time.monotonic()
+        first.camera.frame_bus.subscribe()
+        resumed = wait_until(lambda: not first.camera.paused and first.camera.pipeline_status == "Playing", 10.0)
+        resume_ms = (time.monotonic() - resumed_at) * 1000
+        frames = count_frames(first.camera.frame_bus, args.duration) if resumed else 0
+        ok = resumed and frames > 0
+        print(f"Resume: {'✓' if ok else '✗'} resumed in {resume_ms:.0f} ms, {frames} frames after")
+        results.append(ok)
+
+        # Core assignment is informational: it depends on the machine
+        for context in contexts:
+            camera = context.camera
+            print(f"  {context.id}: assigned {sorted(camera.cpus) if camera.cpus else 'any'}, "
+                  f"producer thread on {thread_cores(camera.processing_thread)}")
+        print(json.dumps(registry.get_telemetry(), indent=2))
+    finally:
+        for context in contexts:
+            context.camera.running = False
+        registry.stop()
+
+    ok = all(results)
+    print(f"Multi-camera: {'✓ Success' if ok else '✗ Failed'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
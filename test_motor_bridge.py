@@ -0,0 +1,169 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from motor_bridge import COMMAND_TOPIC, STATUS_TOPIC, MotorBridge
+from mqtt_client import (
+    CONNACK, CONNECT, DISCONNECT, PINGREQ, PINGRESP, PUBLISH, SUBACK,
+    MQTTClient, packet, parse_publish, read_packet,
+)
+
+# Tests the motor bridge against an in-process MQTT broker and a simulated
+# ESP32 that echoes every command it handles on the status topic, as
+# aeonbot.ino does. Checks that a joystick burst is coalesced to the tick
+# rate with the newest command delivered last, that an isolated command and
+# a stop go out immediately, and that round-trip latency is recorded.
+
+
+class Broker:
+    """Just enough of an MQTT 3.1.1 broker for QoS 0 publish/subscribe."""
+
+    def __init__(self):
+        self.subscriptions = {}  # topic -> set of writers
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                header, body = await read_packet(reader)
+                kind = header & 0xF0
+                if kind == CONNECT:
+                    writer.write(packet(CONNACK, b"\x00\x00"))
+                elif kind == PUBLISH:
+                    topic, _ = parse_publish(header, body)
+                    for subscriber in self.subscriptions.get(topic, ()):
+                        subscriber.write(packet(header, body))
+                elif kind == 0x80:  # SUBSCRIBE
+                    topic_length = int.from_bytes(body[2:4], "big")
+                    self.subscriptions.setdefault(body[4:4 + topic_length].decode(), set()).add(writer)
+                    writer.write(packet(SUBACK, body[:2] + b"\x00"))
+                elif kind == PINGREQ:
+                    writer.write(packet(PINGRESP))
+                elif kind == DISCONNECT:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for subscribers in self.subscriptions.values():
+                subscribers.discard(writer)
+            writer.close()
+
+
+class SimulatedESP32:
+    """Subscribes to the command topic and acks each command after a delay."""
+
+    def __init__(self, port, processing_delay=0.005):
+        self.processing_delay = processing_delay
+        self.received = []
+        self.client = MQTTClient("127.0.0.1", port, client_id="esp32", on_message=self._on_message)
+
+    async def start(self):
+        await self.client.connect()
+        await self.client.subscribe(COMMAND_TOPIC)
+
+    def _on_message(self, topic, payload):
+        command = payload.decode()
+        self.received.append((time.monotonic(), command))
+        asyncio.get_running_loop().call_later(
+            self.processing_delay, self.client.publish, STATUS_TOPIC, json.dumps({"ack": command})
+        )
+
+
+async def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        await asyncio.sleep(0.001)
+    return condition()
+
+
+async def run(args):
+    broker = Broker()
+    port = await broker.start()
+    esp32 = SimulatedESP32(port)
+    await esp32.start()
+    bridge = MotorBridge("127.0.0.1", port, tick=args.tick)
+    bridge.start()
+    if not await wait_until(lambda: bridge.connected):
+        print("Bridge did not connect")
+        return False
+    await asyncio.sleep(0.05)  # let the status subscription settle
+
+    results = []
+
+    # 1. An isolated command goes out without waiting for a tick
+    sent = time.monotonic()
+    bridge.submit("forward:80")
+    delivered = await wait_until(lambda: any(c == "forward:80" for _, c in esp32.received))
+    latency = (esp32.received[-1][0] - sent) * 1000 if delivered else None
+    ok = delivered and latency < args.tick * 1000
+    print(f"Isolated command: {'✓' if ok else '✗'} delivered in {latency and round(latency, 2)} ms")
+    results.append(ok)
+    await asyncio.sleep(args.tick * 2)
+
+    # 2. A joystick burst is coalesced to at most one publish per tick
+    esp32.received.clear()
+    published = bridge.metrics.commands_published.value
+    burst_start = time.monotonic()
+    last = None
+    while time.monotonic() - burst_start < args.burst:
+        last = f"joystick:{int((time.monotonic() - burst_start) * 360) % 360}:75"
+        bridge.submit(last)
+        await asyncio.sleep(1 / args.rate)
+    await wait_until(lambda: esp32.received and esp32.received[-1][1] == last)
+    sent_count = bridge.metrics.commands_published.value - published
+    submitted = int(args.burst * args.rate)
+    limit = args.burst / args.tick + 2
+    ok = sent_count <= limit and esp32.received[-1][1] == last
+    print(f"Burst: {'✓' if ok else '✗'} ~{submitted} commands coalesced into {sent_count} publishes "
+          f"(limit {limit:.0f}), newest delivered last")
+    results.append(ok)
+
+    # 3. Stop bypasses the tick even mid-burst
+    bridge.submit("joystick:0:100")
+    sent = time.monotonic()
+    bridge.submit("stop:0")
+    delivered = await wait_until(lambda: any(c == "stop:0" for _, c in esp32.received))
+    latency = (next(t for t, c in esp32.received if c == "stop:0") - sent) * 1000 if delivered else None
+    ok = delivered and latency < args.tick * 1000 and esp32.received[-1][1] == "stop:0"
+    print(f"Stop: {'✓' if ok else '✗'} delivered in {latency and round(latency, 2)} ms, nothing after it")
+    results.append(ok)
+
+    # 4. Round trips measured from the ESP32 echo
+    await asyncio.sleep(0.1)
+    counts, total = bridge.metrics.round_trip.snapshot()
+    samples = sum(counts)
+    ok = samples > 0 and bridge.last_round_trip is not None
+    mean = total / samples * 1000 if samples else None
+    print(f"Round trip: {'✓' if ok else '✗'} {samples} samples, mean {mean and round(mean, 2)} ms "
+          f"(simulated processing {esp32.processing_delay * 1000:.0f} ms)")
+    results.append(ok)
+
+    print(json.dumps(bridge.get_telemetry(), indent=2))
+    await bridge.stop()
+    await esp32.client.disconnect()
+    await asyncio.sleep(0.05)  # let the broker see both disconnects
+    broker.server.close()
+    await broker.server.wait_closed()
+    return all(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test the motor command bridge against an in-process broker")
+    parser.add_argument("--tick", type=float, default=0.05, help="bridge coalescing tick in seconds")
+    parser.add_argument("--rate", type=float, default=500.0, help="joystick commands per second in the burst")
+    parser.add_argument("--burst", type=float, default=1.0, help="burst length in seconds")
+    args = parser.parse_args()
+
+    ok = asyncio.run(run(args))
+    print(f"Motor bridge: {'✓ Success' if ok else '✗ Failed'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
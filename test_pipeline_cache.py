@@ -0,0 +1,88 @@
+import sys
+import time
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+from gstreamer_camera import GStreamerCamera
+from pipeline_cache import PipelineCache
+
+# Idle eviction for the standby pipeline cache. First the cache on its own,
+# with stand-in pipelines, then a videotestsrc camera whose supervisor has
+# to evict the standby pipelines it pre-built once they have been unused
+# for max_idle seconds, without any further switch parking a pipeline.
+
+SOURCE = "videotestsrc is-live=true pattern=ball"
+
+
+class FakePipeline:
+    """Only what the cache calls on a pipeline."""
+
+    def __init__(self, key):
+        self.key = key
+
+    def set_state(self, state):
+        return Gst.StateChangeReturn.SUCCESS
+
+
+def wait_until(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def check_cache(max_idle=0.3):
+    disposed = []
+    cache = PipelineCache(FakePipeline, max_idle=max_idle, dispose=disposed.append)
+    fresh, stale = FakePipeline("fresh"), FakePipeline("stale")
+    cache.put("stale", stale)
+    time.sleep(max_idle + 0.1)
+    cache.put("fresh", fresh)
+    # The put evicted the stale entry; nothing is put after the fresh one
+    time.sleep(max_idle / 2)
+    cache.evict_idle()
+    first = disposed == [stale] and cache.keys() == ["fresh"]
+    time.sleep(max_idle)
+    cache.evict_idle()
+    ok = first and disposed == [stale, fresh] and not cache.keys()
+    print(f"Cache eviction: {'✓' if ok else '✗'} disposed {[p.key for p in disposed]}, cached {cache.keys()}")
+    return ok
+
+
+def check_camera(max_idle=1.0):
+    camera = GStreamerCamera(source_element=SOURCE, start=False)
+    cache = camera.pipeline_cache
+    cache.max_idle = max_idle
+    disposed = []
+    dispose = cache._dispose
+    cache._dispose = lambda pipeline: (disposed.append(pipeline), dispose(pipeline))
+    try:
+        if not camera.start():
+            print("Camera eviction: ✗ pipeline failed to start")
+            return False
+        prepared = wait_until(lambda: cache.keys(), 10.0)
+        standby = len(cache.keys())
+        if not prepared:
+            print("Camera eviction: ✗ no standby pipeline was prepared (one encoder only?)")
+            return False
+        evicted = wait_until(lambda: not cache.keys(), max_idle + 5.0)
+        ok = evicted and len(disposed) >= standby
+        print(f"Camera eviction: {'✓' if ok else '✗'} {standby} standby pipelines, "
+              f"{len(disposed)} disposed, {len(cache.keys())} still cached")
+        return ok
+    finally:
+        camera.close()
+
+
+def main():
+    Gst.init(None)
+    results = [check_cache(), check_camera()]
+    ok = all(results)
+    print(f"Pipeline cache: {'✓ Success' if ok else '✗ Failed'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,75 +1,294 @@
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import time
+
 import gi
 gi.require_version('Gst', '1.0')
 from gi.repository import Gst
-import time
-import sys
 
-def test_pipeline(pipeline_string, timeout=10):
-    print(f"\nTesting pipeline: {pipeline_string}")
+from gstreamer_camera import GStreamerCamera
+from metrics import quantile
+
+# Headless pipeline benchmark. Every configuration is built by
+# GStreamerCamera.create_pipeline, the same path the server uses, with
+# videotestsrc standing in for libcamerasrc. Results are written as JSON so
+# runs on different commits can be compared with --compare.
+
+SOURCE = "videotestsrc is-live=true pattern=ball"
+
+BASELINE = {
+    "resolution": (1280, 720),
+    "color_format": "RGBx",
+    "encoder": "jpegenc",
+    "jpeg_quality": 85,
+    "queue_buffers": 2,
+    "sink_max_buffers": 0,
+    "motion_gating": "off",
+}
+
+SWEEP = {
+    "resolution": [(640, 480), (1280, 720), (1920, 1080)],
+    "color_format": ["RGBx", "I420", "NV12", "YUY2"],
+    "encoder": ["jpegenc", "x264enc", "vp8enc", "vp9enc"],
+    "jpeg_quality": [50, 70, 85, 95],
+    "queue_buffers": [1, 2, 5],
+    "sink_max_buffers": [0, 1, 3],
+    # Gating on, with the videotestsrc scene moving or switched to a still pattern
+    "motion_gating": ["off", "moving", "still"],
+}
+
+STILL_PATTERN = "smpte"
+
+
+def configurations(full=False):
+    """
+    One setting varied at a time around BASELINE, or with full=True the
+    whole cross product.
+    """
+    if full:
+        names = list(SWEEP)
+        for values in itertools.product(*(SWEEP[name] for name in names)):
+            yield dict(zip(names, values))
+        return
+
+    seen = set()
+    for name, values in SWEEP.items():
+        for value in values:
+            config = dict(BASELINE, **{name: value})
+            key = tuple(sorted(config.items()))
+            if key not in seen:
+                seen.add(key)
+                yield config
+
+
+def config_label(config):
+    width, height = config["resolution"]
+    label = (
+        f'{width}x{height} {config["color_format"]} {config["encoder"]} '
+        f'q{config["jpeg_quality"]} queue={config["queue_buffers"]} '
+        f'sink={config["sink_max_buffers"]}'
+    )
+    # Ungated labels stay as they were, so older result files still compare
+    if config.get("motion_gating", "off") != "off":
+        label += f' motion={config["motion_gating"]}'
+    return label
+
+
+def scene_sources(camera):
+    """videotestsrc elements of the running pipeline."""
+    return [
+        element for element in camera.pipeline.iterate_elements()
+        if element.get_factory().get_name() == "videotestsrc"
+    ]
+
+
+def start_config(camera, config):
+    """Build and start the pipeline for config; returns (success, startup seconds, cache hit)."""
+    camera.current_width, camera.current_height = config["resolution"]
+    camera.color_format = config["color_format"]
+    camera.current_encoder = config["encoder"]
+    camera.jpeg_quality = config["jpeg_quality"]
+    camera.queue_buffers = config["queue_buffers"]
+    camera.sink_max_buffers = config["sink_max_buffers"]
+    camera.set_motion_settings(gating=config["motion_gating"] != "off")
+
+    hits = camera.pipeline_cache.hits
+    started = time.monotonic()
+    success = camera.create_pipeline()
+    return success, time.monotonic() - started, camera.pipeline_cache.hits > hits
+
+
+def snapshot(camera):
+    metrics = camera.metrics
+    counts, latency_sum = metrics.capture.snapshot()
+    return {
+        "time": time.monotonic(),
+        "cpu": time.process_time(),
+        "frames": camera.samples_received,
+        "bytes": metrics.bytes_received.value,
+        "stream_bytes": metrics.stream_bytes.value,
+        "queue_full": metrics.queue_full.value,
+        "frames_gated": metrics.frames_gated.value,
+        "latency_counts": counts,
+        "latency_sum": latency_sum,
+    }
+
+
+def measure(camera, duration):
+    before = snapshot(camera)
+    time.sleep(duration)
+    after = snapshot(camera)
+
+    elapsed = after["time"] - before["time"]
+    frames = after["frames"] - before["frames"]
+    counts = [b - a for a, b in zip(before["latency_counts"], after["latency_counts"])]
+    observed = sum(counts)
+    buckets = camera.metrics.capture.buckets
+
+    def latency_ms(q):
+        value = quantile(buckets, counts, q)
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        "fps": round(frames / elapsed, 2),
+        "frames": frames,
+        "latency_ms": {
+            "mean": round((after["latency_sum"] - before["latency_sum"]) / observed * 1000, 2) if observed else None,
+            "p50": latency_ms(0.5),
+            "p95": latency_ms(0.95),
+            "p99": latency_ms(0.99),
+        },
+        "cpu_percent": round((after["cpu"] - before["cpu"]) / elapsed * 100, 1),
+        "bytes_per_frame": round((after["bytes"] - before["bytes"]) / frames) if frames else None,
+        "mjpeg_kbps": round((after["bytes"] - before["bytes"]) * 8 / elapsed / 1000, 1),
+        "frames_gated": after["frames_gated"] - before["frames_gated"],
+        "stream_kbps": round((after["stream_bytes"] - before["stream_bytes"]) * 8 / elapsed / 1000, 1),
+        "queue_full": after["queue_full"] - before["queue_full"],
+    }
+
+
+def run_config(camera, config, duration, warmup):
+    result = {"config": dict(config, resolution=list(config["resolution"])), "label": config_label(config)}
+    if config["encoder"] not in camera.supported_encoders:
+        result.update(success=False, error="encoder not available")
+        return result
+
+    success, startup, cache_hit = start_config(camera, config)
+    result.update(success=success, startup_ms=round(startup * 1000, 1), cache_hit=cache_hit)
+    if not success:
+        result["error"] = "pipeline failed to start"
+        return result
+
+    # A still scene: the pattern is put back afterwards, since the pipeline
+    # may be reused from the cache
+    still = []
+    if config["motion_gating"] == "still":
+        still = [(source, source.get_property("pattern")) for source in scene_sources(camera)]
+        if not still:
+            result.update(success=False, error="still scene needs a videotestsrc source")
+            return result
+        for source, _ in still:
+            Gst.util_set_object_arg(source, "pattern", STILL_PATTERN)
     try:
-        pipeline = Gst.parse_launch(pipeline_string)
-        sink = pipeline.get_by_name('sink')
-        
-        if not sink:
-            return False, "Failed to create sink element"
-        
-        ret = pipeline.set_state(Gst.State.PLAYING)
-        if ret == Gst.StateChangeReturn.FAILURE:
-            return False, "Failed to start pipeline"
-        
-        # Wait for pipeline to start
-        ret = pipeline.get_state(timeout * Gst.SECOND)
-        if ret[0] == Gst.StateChangeReturn.SUCCESS:
-            print("Pipeline started successfully!")
-            time.sleep(2)  # Let it run briefly
-            pipeline.set_state(Gst.State.NULL)
-            return True, "Success"
-        else:
-            return False, f"Pipeline failed to start: {ret[0]}"
-            
-    except Exception as e:
-        return False, str(e)
+        # Long enough for the detector's hold time to pass on a still scene
+        time.sleep(max(warmup, camera.motion.hold + 1.0) if still else warmup)
+        result.update(measure(camera, duration))
     finally:
-        if 'pipeline' in locals():
-            pipeline.set_state(Gst.State.NULL)
+        for source, pattern in still:
+            source.set_property("pattern", pattern)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous_path, results):
+    """Print fps, latency and CPU changes against an earlier results file."""
+    with open(previous_path) as f:
+        previous = {r["label"]: r for r in json.load(f)["results"] if r.get("success")}
+
+    print(f"\nComparison against {previous_path}:")
+    for result in results:
+        old = previous.get(result["label"])
+        if not result.get("success") or old is None:
+            continue
+        print(
+            f'{result["label"]:<55} '
+            f'fps {old["fps"]:>6} -> {result["fps"]:<6} '
+            f'p50 {old["latency_ms"]["p50"]} -> {result["latency_ms"]["p50"]} ms  '
+            f'cpu {old["cpu_percent"]} -> {result["cpu_percent"]}%'
+        )
+
+
+def compare_gating(results):
+    """Print MJPEG bandwidth and CPU of each gated run against the same configuration ungated."""
+    ungated = {
+        r["label"]: r for r in results
+        if r.get("success") and r["config"]["motion_gating"] == "off"
+    }
+    gated = [r for r in results if r.get("success") and r["config"]["motion_gating"] != "off"]
+    if not gated:
+        return
+
+    print("\nMotion gating:")
+    for result in gated:
+        old = ungated.get(config_label(dict(result["config"], motion_gating="off")))
+        if old is None:
+            continue
+        print(
+            f'{result["label"]:<55} '
+            f'kbit/s {old["mjpeg_kbps"]} -> {result["mjpeg_kbps"]}  '
+            f'cpu {old["cpu_percent"]} -> {result["cpu_percent"]}%  '
+            f'gated {result["frames_gated"]} frames'
+        )
+
 
 def main():
-    Gst.init(None)
-    
-    pipelines = [
-        # Pipeline 1: Test pattern with tee
-        '''videotestsrc ! video/x-raw,width=1280,height=720 ! 
-           tee name=t ! queue ! videoconvert ! jpegenc quality=85 ! 
-           appsink name=sink emit-signals=true sync=false''',
-           
-        # Pipeline 2: Test pattern with lower resolution
-        '''videotestsrc ! video/x-raw,width=640,height=480 ! 
-           videoconvert ! jpegenc quality=85 ! 
-           appsink name=sink emit-signals=true sync=false''',
-           
-        # Pipeline 3: Test pattern with specific format
-        '''videotestsrc ! video/x-raw,width=1280,height=720,format=I420 ! 
-           videoconvert ! jpegenc quality=85 ! 
-           appsink name=sink emit-signals=true sync=false''',
-           
-        # Pipeline 4: Test pattern with queue settings
-        '''videotestsrc ! video/x-raw,width=1280,height=720 ! 
-           queue max-size-buffers=1 leaky=downstream ! 
-           videoconvert ! jpegenc quality=85 ! 
-           appsink name=sink emit-signals=true sync=false max-buffers=1 drop=true''',
-           
-        # Pipeline 5: Test pattern with framerate
-        '''videotestsrc ! video/x-raw,width=1280,height=720,framerate=30/1 ! 
-           videoconvert ! jpegenc quality=85 ! 
-           appsink name=sink emit-signals=true sync=false'''
-    ]
-    
-    print("Testing GStreamer pipelines...\n")
-    
-    for i, pipeline in enumerate(pipelines, 1):
-        success, message = test_pipeline(pipeline)
-        print(f"Pipeline {i}: {'✓ Success' if success else '✗ Failed'} - {message}")
-        print("-" * 80)
+    parser = argparse.ArgumentParser(description="Benchmark camera pipeline configurations")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds measured per configuration")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds discarded after each start")
+    parser.add_argument("--full", action="store_true", help="sweep the full cross product")
+    parser.add_argument("--source", default=SOURCE, help="source element description")
+    parser.add_argument("--output", help="results file (default: pipeline-benchmark-<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    output = args.output or f"pipeline-benchmark-{commit or 'local'}.json"
+
+    camera = GStreamerCamera(source_element=args.source)
+    results = []
+    try:
+        for config in configurations(args.full):
+            result = run_config(camera, config, args.duration, args.warmup)
+            results.append(result)
+            if result["success"]:
+                print(
+                    f'{result["label"]:<55} ✓ {result["fps"]:6.1f} fps  '
+                    f'p50 {result["latency_ms"]["p50"]} ms  p99 {result["latency_ms"]["p99"]} ms  '
+                    f'cpu {result["cpu_percent"]}%  {result["bytes_per_frame"]} B/frame  '
+                    f'{result["mjpeg_kbps"]} kbit/s  startup {result["startup_ms"]} ms'
+                )
+            else:
+                print(f'{result["label"]:<55} ✗ {result["error"]}')
+    finally:
+        camera.running = False
+        camera.tracker_worker.stop()
+        if camera.pipeline is not None:
+            camera.pipeline.set_state(Gst.State.NULL)
+
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "gstreamer": Gst.version_string(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "source": args.source,
+        "duration": args.duration,
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(results)} results to {output}")
+
+    compare_gating(results)
+    if args.compare:
+        compare(args.compare, results)
+
+    failed = [r for r in results if not r["success"] and r.get("error") != "encoder not available"]
+    sys.exit(1 if failed else 0)
+
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,129 @@
+import sys
+import threading
+import time
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst, GLib
+
+from gstreamer_camera import GStreamerCamera
+
+# Fault-injection test for the pipeline supervisor. A videotestsrc camera
+# runs with one viewer subscribed to the frame bus for the whole test while
+# errors, EOS and a silent stall are injected into the capture source. Each
+# fault must be recovered from, and the same viewer must see frames resume.
+
+SOURCE = "videotestsrc is-live=true pattern=ball"
+
+
+class Viewer:
+    """Stays subscribed across every restart, like an open /video-feed."""
+
+    def __init__(self, camera):
+        self.camera = camera
+        self.arrivals = []
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        bus = self.camera.frame_bus
+        bus.subscribe()
+        try:
+            last_seq, _ = bus.latest()
+            while self.running:
+                last_seq, frame = bus.wait_for_frame(last_seq, timeout=1)
+                if frame is not None:
+                    self.arrivals.append(time.monotonic())
+        finally:
+            bus.unsubscribe()
+
+    def first_frame_after(self, t):
+        return next((a for a in self.arrivals if a > t), None)
+
+    def alive(self):
+        return self._thread.is_alive()
+
+
+def capture_source(camera):
+    caps = camera.pipeline.get_by_name('capture_caps')
+    return caps.get_static_pad('sink').get_peer().get_parent_element()
+
+
+def inject_error(camera):
+    source = capture_source(camera)
+    error = GLib.Error.new_literal(Gst.ResourceError.quark(), "Injected capture error", Gst.ResourceError.READ)
+    source.post_message(Gst.Message.new_error(source, error, "injected by test_recovery"))
+
+
+def inject_eos(camera):
+    capture_source(camera).send_event(Gst.Event.new_eos())
+
+
+def inject_stall(camera):
+    # Drop every buffer without any error: only the watchdog can notice
+    pad = capture_source(camera).get_static_pad('src')
+    pad.add_probe(Gst.PadProbeType.BUFFER, lambda pad, info: Gst.PadProbeReturn.DROP)
+
+
+SCENARIOS = [
+    ("error", inject_error),
+    ("eos", inject_eos),
+    ("stall", inject_stall),
+]
+
+
+def run_scenario(camera, viewer, name, inject, timeout=20):
+    supervisor = camera.supervisor
+    restarts = supervisor.restarts
+    injected = time.monotonic()
+    inject(camera)
+
+    while supervisor.restarts == restarts and time.monotonic() - injected < timeout:
+        time.sleep(0.01)
+    # Frames must reach the viewer that was connected before the fault
+    deadline = time.monotonic() + 2
+    resumed = None
+    while resumed is None and time.monotonic() < deadline:
+        resumed = viewer.first_frame_after(injected + 0.05)
+        time.sleep(0.01)
+
+    recovered = supervisor.restarts > restarts and resumed is not None and viewer.alive()
+    gap_ms = round((resumed - injected) * 1000, 1) if resumed else None
+    print(
+        f"{name:<6} {'✓ recovered' if recovered else '✗ not recovered'}  "
+        f"viewer gap {gap_ms} ms, supervisor recovery {supervisor.last_recovery_ms} ms "
+        f"({supervisor.last_reason})"
+    )
+    return recovered
+
+
+def main():
+    camera = GStreamerCamera(source_element=SOURCE)
+    # Space the faults out less than a real deployment would, without backoff
+    camera.supervisor.healthy_after = 1.0
+    viewer = Viewer(camera)
+    time.sleep(1)
+
+    results = []
+    try:
+        for name, inject in SCENARIOS:
+            results.append(run_scenario(camera, viewer, name, inject))
+            time.sleep(1.5)
+    finally:
+        viewer.running = False
+        camera.running = False
+        camera.supervisor.stop()
+        if camera.pipeline is not None:
+            camera.pipeline.set_state(Gst.State.NULL)
+
+    telemetry = camera.supervisor.get_telemetry()
+    print(f"Restarts: {telemetry['restarts']}, failed attempts: {telemetry['failed_attempts']}, "
+          f"stall timeout {telemetry['stall_timeout_ms']} ms")
+    ok = all(results)
+    print(f"Pipeline recovery: {'✓ Success' if ok else '✗ Failed'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import math
+import sys
+import time
+
+import numpy as np
+
+from metrics import quantile
+from motor_bridge import MotorBridge
+from test_motor_bridge import Broker, SimulatedESP32, wait_until
+from visual_servo import VisualServo
+
+# Closed-loop servo test without a robot. A videotestsrc ball (or the
+# synthetic camera's moving block) is found by thresholding the raw frame
+# and handed to the tracker; the servo then steers through the motor bridge
+# to an in-process broker and a simulated ESP32. Checks that commands turn
+# toward the target, stay within the rate limit, that latency from frame to
+# published command is measured, and that disabling sends a stop.
+
+VIDEOTESTSRC = "videotestsrc is-live=true pattern=ball"
+
+
+def create_camera(name):
+    if name == "synthetic":
+        from synthetic_camera import SyntheticCamera
+        return SyntheticCamera()
+    from gstreamer_camera import GStreamerCamera
+    return GStreamerCamera(source_element=VIDEOTESTSRC)
+
+
+def find_target(camera, timeout=5.0):
+    """Bounding box of the bright target in capture coordinates, or None."""
+    bus = camera.raw_bus
+    bus.subscribe()
+    try:
+        seq, frame = bus.latest()
+        if frame is None:
+            seq, frame = bus.wait_for_frame(seq, timeout=timeout)
+    finally:
+        bus.unsubscribe()
+    if frame is None:
+        return None
+    ys, xs = np.nonzero(frame.array.min(axis=2) > 240)
+    if not len(xs):
+        return None
+    scale = camera.current_width / frame.array.shape[1]
+    x, y = xs.min(), ys.min()
+    return (int(x * scale), int(y * scale),
+            int((xs.max() - x + 1) * scale), int((ys.max() - y + 1) * scale))
+
+
+def turn_of(command):
+    """Signed turn component of a joystick command."""
+    _, angle, speed = command.split(":")
+    return math.sin(math.radians(float(angle))) * float(speed)
+
+
+async def run(args, camera):
+    broker = Broker()
+    port = await broker.start()
+    esp32 = SimulatedESP32(port)
+    await esp32.start()
+    bridge = MotorBridge("127.0.0.1", port)
+    bridge.start()
+    servo = VisualServo(camera, bridge, max_rate=args.rate)
+    servo.start()
+    if not await wait_until(lambda: bridge.connected):
+        print("Bridge did not connect")
+        return False
+    await asyncio.sleep(0.05)
+
+    servo.enable()
+    started = time.monotonic()
+    await asyncio.sleep(args.duration)
+    elapsed = time.monotonic() - started
+    servo.disable()
+    await wait_until(lambda: esp32.received and esp32.received[-1][1] == "stop:0")
+
+    results = []
+    commands = [c for _, c in esp32.received if c.startswith("joystick:")]
+    rate = len(commands) / elapsed
+    ok = bool(commands) and rate <= args.rate * 1.1
+    print(f"Commands: {'✓' if ok else '✗'} {len(commands)} in {elapsed:.1f} s "
+          f"({rate:.1f}/s, limit {args.rate:.0f}/s)")
+    results.append(ok)
+
+    # Outside the deadband the turn must point at the target
+    steering = [(error, turn) for _, error, turn in servo.history if abs(error) > servo.deadband * 2 and turn]
+    agree = sum(1 for error, turn in steering if (error > 0) == (turn > 0))
+    ratio = agree / len(steering) if steering else 0.0
+    ok = ratio >= 0.8
+    print(f"Direction: {'✓' if ok else '✗'} {agree}/{len(steering)} commands turn toward the target")
+    results.append(ok)
+
+    counts, _ = bridge.metrics.servo_latency.snapshot()
+    buckets = bridge.metrics.servo_latency.buckets
+    p50, p99 = quantile(buckets, counts, 0.5), quantile(buckets, counts, 0.99)
+    ok = sum(counts) > 0
+    print(f"Frame to command: {'✓' if ok else '✗'} p50 {p50 and round(p50 * 1000, 1)} ms, "
+          f"p99 {p99 and round(p99 * 1000, 1)} ms over {sum(counts)} commands")
+    results.append(ok)
+
+    ok = bridge.last_round_trip is not None
+    print(f"Round trip: {'✓' if ok else '✗'} last {bridge.get_telemetry()['last_round_trip_ms']} ms")
+    results.append(ok)
+
+    ok = esp32.received[-1][1] == "stop:0"
+    print(f"Disable: {'✓' if ok else '✗'} stop sent last")
+    results.append(ok)
+
+    final_turns = [turn_of(c) for c in commands[-5:]]
+    print(f"Last turns: {[round(t, 1) for t in final_turns]}, tracker {camera.tracker_worker.get_telemetry()}")
+
+    servo.stop()
+    await bridge.stop()
+    await esp32.client.disconnect()
+    await asyncio.sleep(0.05)
+    broker.server.close()
+    await broker.server.wait_closed()
+    return all(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test the visual servo loop against a moving target")
+    parser.add_argument("--camera", default="videotestsrc", choices=["videotestsrc", "synthetic"])
+    parser.add_argument("--rate", type=float, default=10.0, help="maximum servo commands per second")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds to servo")
+    args = parser.parse_args()
+
+    camera = create_camera(args.camera)
+    try:
+        bbox = find_target(camera)
+        if bbox is None or not camera.start_tracking(*bbox):
+            print(f"Could not start tracking (target {bbox})")
+            ok = False
+        else:
+            print(f"Tracking target at {bbox}")
+            ok = asyncio.run(run(args, camera))
+    finally:
+        camera.running = False
+        camera.supervisor.stop()
+        camera.tracker_worker.stop()
+
+    print(f"Visual servo: {'✓ Success' if ok else '✗ Failed'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import asyncio
+import statistics
+import sys
+import time
+
+from aiortc import RTCPeerConnection
+
+from gstreamer_camera import GStreamerCamera
+from webrtc_handler import WebRTCManager
+
+# Loopback test for the WebRTC path: a videotestsrc camera feeds
+# WebRTCManager, and a local receiving peer measures delivery and latency.
+
+SOURCE = "videotestsrc is-live=true pattern=ball"
+
+
+def record_capture_times(source):
+    """Map each output pts to the monotonic time its frame was captured."""
+    captured_at = {}
+    video_frame = source.video_frame
+
+    def recording(seq, raw_frame):
+        frame = video_frame(seq, raw_frame)
+        captured_at.setdefault(frame.pts, raw_frame.timestamp)
+        return frame
+
+    source.video_frame = recording
+    return captured_at
+
+
+async def run_loopback(manager, frames=150, timeout=30):
+    captured_at = record_capture_times(manager.source)
+    receiver = RTCPeerConnection()
+    receiver.addTransceiver("video", direction="recvonly")
+    received = asyncio.get_running_loop().create_future()
+
+    @receiver.on("track")
+    def on_track(track):
+        if not received.done():
+            received.set_result(track)
+
+    await receiver.setLocalDescription(await receiver.createOffer())
+    pc, answer = await manager.create_answer(receiver.localDescription.sdp)
+    await receiver.setRemoteDescription(answer)
+
+    sender = manager.tracks[pc]
+    track = await asyncio.wait_for(received, timeout)
+
+    arrivals = []
+    latencies = []
+    first_recv_pts = None
+    first_sent_pts = None
+    start = time.monotonic()
+    try:
+        while len(arrivals) < frames and time.monotonic() - start < timeout:
+            frame = await asyncio.wait_for(track.recv(), timeout)
+            now = time.monotonic()
+            arrivals.append(now)
+
+            # RTP timestamps carry an offset; align on the first frame
+            if first_recv_pts is None:
+                first_recv_pts = frame.pts
+                first_sent_pts = min(captured_at)
+            captured = captured_at.get(first_sent_pts + frame.pts - first_recv_pts)
+            if captured is not None:
+                latencies.append(now - captured)
+    finally:
+        await receiver.close()
+        await manager.close(pc)
+
+    return arrivals, latencies, sender
+
+
+def report(arrivals, latencies, sender):
+    if len(arrivals) < 2:
+        print("No frames delivered")
+        return False
+
+    duration = arrivals[-1] - arrivals[0]
+    gaps = [b - a for a, b in zip(arrivals, arrivals[1:])]
+    print(f"Frames received: {len(arrivals)} (sent {sender.frames_sent}, "
+          f"skipped at source {sender.frames_dropped})")
+    print(f"Delivery rate:   {(len(arrivals) - 1) / duration:.1f} fps")
+    print(f"Inter-arrival:   p50 {statistics.median(gaps) * 1000:.1f} ms, "
+          f"max {max(gaps) * 1000:.1f} ms")
+    if latencies:
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        print(f"Latency:         p50 {statistics.median(latencies) * 1000:.1f} ms, "
+              f"p99 {p99 * 1000:.1f} ms ({len(latencies)} matched frames)")
+    return True
+
+
+def main():
+    camera = GStreamerCamera(source_element=SOURCE)
+    manager = WebRTCManager(camera.raw_bus)
+    try:
+        results = asyncio.run(run_loopback(manager))
+    finally:
+        camera.running = False
+    ok = report(*results)
+    print(f"WebRTC loopback: {'✓ Success' if ok else '✗ Failed'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
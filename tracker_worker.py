@@ -0,0 +1,181 @@
+import sys
+import threading
+import time
+
+import cv2
+
+
+def scale_to_width(image, max_width):
+    """Scale a raw frame down to at most max_width, keeping its aspect ratio."""
+    height, width = image.shape[:2]
+    if max_width and width > max_width:
+        scaled_height = max(1, round(height * max_width / width))
+        image = cv2.resize(image, (max_width, scaled_height), interpolation=cv2.INTER_AREA)
+    return image
+
+
+class FrameRate:
+    """Updates per second, counted over windows of at least a second."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.fps = 0.0
+        self._count = 0
+        self._window_start = time.monotonic()
+
+    def tick(self):
+        self._count += 1
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed >= 1.0:
+            self.fps = self._count / elapsed
+            self._count = 0
+            self._window_start = now
+
+
+class TrackerWorker:
+    """
+    Runs the OpenCV tracker on its own thread, decoupled from the video
+    stream. The worker always takes the newest raw frame from a FrameBus,
+    tracks on a copy scaled down to at most max_width, and publishes the bbox
+    in capture coordinates together with the time of the frame it came from.
+    """
+
+    def __init__(self, raw_bus, tracker_factory, max_width=640, max_fps=None, histogram=None, on_lost=None, on_update=None):
+        self.raw_bus = raw_bus
+        self.on_lost = on_lost  # called when an active track is lost
+        self.on_update = on_update  # called after every tracker update
+        self.histogram = histogram
+        self.tracker_factory = tracker_factory
+        self.max_width = max_width
+        self.max_fps = max_fps
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._tracker = None
+        self._capture_size = (0, 0)
+
+        self.active = False
+        self.lost = False
+        self.bbox = (0, 0, 0, 0)
+        self.bbox_timestamp = 0.0  # time.monotonic() of the source frame
+
+        # Telemetry
+        self.rate = FrameRate()
+        self.latency = 0.0  # seconds spent in the last tracker.update()
+        self.tracking_size = (0, 0)
+
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def fps(self):
+        return self.rate.fps
+
+    def start(self, bbox, capture_size, timeout=1.0) -> bool:
+        """Initialize a new tracker on the newest frame. bbox is in capture coordinates."""
+        seq, raw_frame = self.raw_bus.latest()
+        if raw_frame is None:
+            seq, raw_frame = self.raw_bus.wait_for_frame(seq, timeout=timeout)
+        if raw_frame is None:
+            print("No frame available to start tracking.", file=sys.stderr)
+            return False
+
+        tracker = self.tracker_factory()
+        if tracker is None:
+            print("No suitable tracker available", file=sys.stderr)
+            return False
+
+        image = scale_to_width(raw_frame.array, self.max_width)
+        capture_width, capture_height = capture_size
+        sx = image.shape[1] / capture_width
+        sy = image.shape[0] / capture_height
+        (x, y, w, h) = bbox
+        tracker.init(image, (int(x * sx), int(y * sy), max(1, int(w * sx)), max(1, int(h * sy))))
+
+        with self._lock:
+            self._tracker = tracker
+            self._capture_size = capture_size
+            self.tracking_size = (image.shape[1], image.shape[0])
+            self.bbox = tuple(bbox)
+            self.bbox_timestamp = raw_frame.timestamp
+            self.lost = False
+            self.active = True
+        self._wake.set()
+        print(f"{type(tracker).__name__} tracker initialized with bbox:", self.bbox)
+        return True
+
+    def reset(self):
+        with self._lock:
+            self._tracker = None
+            self.active = False
+            self.lost = False
+            self.bbox = (0, 0, 0, 0)
+            self.bbox_timestamp = 0.0
+            self.rate.reset()
+        self._wake.clear()
+
+    def stop(self):
+        self.running = False
+        self._wake.set()
+
+    def _run(self):
+        last_seq, _ = self.raw_bus.latest()
+        while self.running:
+            if not self.active:
+                self._wake.wait(1.0)
+                continue
+
+            last_seq, raw_frame = self.raw_bus.wait_for_frame(last_seq, timeout=1.0)
+            if raw_frame is None:
+                continue
+
+            started = time.monotonic()
+            try:
+                with self._lock:
+                    if self._tracker is None:
+                        continue
+                    image = scale_to_width(raw_frame.array, self.max_width)
+                    success, box = self._tracker.update(image)
+                    was_lost = self.lost
+                    self.lost = not success
+                    if success:
+                        capture_width, capture_height = self._capture_size
+                        sx = capture_width / image.shape[1]
+                        sy = capture_height / image.shape[0]
+                        (x, y, w, h) = box
+                        self.bbox = (int(x * sx), int(y * sy), int(w * sx), int(h * sy))
+                        self.bbox_timestamp = raw_frame.timestamp
+            except Exception as e:
+                print(f"Error in tracker worker: {e}", file=sys.stderr)
+                time.sleep(0.1)
+                continue
+
+            if self.lost and not was_lost and self.on_lost is not None:
+                self.on_lost()
+            if self.on_update is not None:
+                self.on_update()
+
+            self.latency = time.monotonic() - started
+            if self.histogram is not None:
+                self.histogram.observe(self.latency)
+            self.rate.tick()
+
+            if self.max_fps:
+                remaining = 1.0 / self.max_fps - (time.monotonic() - started)
+                if remaining > 0:
+                    time.sleep(remaining)
+
+    def get_telemetry(self):
+        return {
+            "active": self.active,
+            "lost": self.lost,
+            "bbox": list(self.bbox),
+            "bbox_age_ms": round((time.monotonic() - self.bbox_timestamp) * 1000, 1) if self.bbox_timestamp else None,
+            "fps": f"{self.fps:.1f}",
+            "latency_ms": round(self.latency * 1000, 1),
+            "resolution": f"{self.tracking_size[0]}x{self.tracking_size[1]}",
+        }
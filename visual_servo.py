@@ -0,0 +1,194 @@
+import asyncio
+import math
+import time
+from collections import deque
+
+
+class PID:
+    """PID controller with output clamping and integral anti-windup."""
+
+    def __init__(self, kp, ki=0.0, kd=0.0, limit=1.0):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.limit = limit
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.previous = None
+
+    def update(self, error, dt):
+        derivative = 0.0
+        if self.previous is not None and dt > 0:
+            derivative = (error - self.previous) / dt
+        self.previous = error
+        integral = self.integral + error * dt
+        output = self.kp * error + self.ki * integral + self.kd * derivative
+        if abs(output) < self.limit:
+            # Only integrate while unsaturated
+            self.integral = integral
+        return max(-self.limit, min(self.limit, output))
+
+
+def slew(current, target, max_step):
+    return current + max(-max_step, min(max_step, target - current))
+
+
+class VisualServo:
+    """
+    Turns the robot to keep the tracked target centred. Runs on the event
+    loop and wakes on every tracker update: the horizontal centring error
+    drives a PID for turning, and optionally the bbox width drives a second
+    PID that approaches until the target fills target_size of the frame.
+    Outputs are slew-limited and sent as joystick commands through the
+    motor bridge at no more than max_rate per second. A lost or stale
+    target stops the motors.
+    """
+
+    def __init__(self, camera, bridge, max_rate=10.0, max_speed=60, deadband=0.05,
+                 max_accel=2.0, timeout=0.5, target_size=None):
+        self.camera = camera
+        self.bridge = bridge
+        self.max_rate = max_rate
+        self.max_speed = max_speed  # joystick speed percent at full output
+        self.deadband = deadband
+        self.max_accel = max_accel  # output change per second
+        self.timeout = timeout
+        self.target_size = target_size
+        self.turn_pid = PID(kp=1.2, ki=0.1, kd=0.05)
+        self.forward_pid = PID(kp=2.0, ki=0.0, kd=0.1)
+
+        self.enabled = False
+        self.driving = False
+        self.turn = 0.0
+        self.forward = 0.0
+        self._wake = asyncio.Event()
+        self._loop = None
+        self._task = None
+        self._last_timestamp = None
+
+        # Telemetry
+        self.error = None
+        self.last_command = None
+        self.last_latency = None
+        self.stop_reason = None
+        self.history = deque(maxlen=200)  # (frame time, error, turn) per command
+
+    def start(self):
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self.camera.tracker_worker.on_update = self._notify
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        self.camera.tracker_worker.on_update = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _notify(self):
+        """Called on the tracker thread after each update."""
+        if self.enabled:
+            try:
+                self._loop.call_soon_threadsafe(self._wake.set)
+            except RuntimeError:
+                pass  # event loop already closed
+
+    def enable(self, **settings):
+        for name in ("max_rate", "max_speed", "deadband", "max_accel", "target_size"):
+            if settings.get(name) is not None:
+                setattr(self, name, settings[name])
+        for name in ("kp", "ki", "kd"):
+            if settings.get(name) is not None:
+                setattr(self.turn_pid, name, settings[name])
+        self._reset()
+        self.enabled = True
+        self.stop_reason = None
+
+    def disable(self, reason="disabled"):
+        self.enabled = False
+        self._halt(reason)
+
+    def _reset(self):
+        self.turn_pid.reset()
+        self.forward_pid.reset()
+        self.turn = self.forward = 0.0
+        self._last_timestamp = None
+
+    def _halt(self, reason):
+        if self.driving:
+            self.bridge.submit("stop:0")
+            self.driving = False
+            self.last_command = "stop:0"
+        self.stop_reason = reason
+        self._reset()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.timeout)
+            except asyncio.TimeoutError:
+                if self.enabled and self.driving:
+                    self._halt("no tracker updates")
+                continue
+            self._wake.clear()
+            if not self.enabled:
+                continue
+
+            worker = self.camera.tracker_worker
+            if not worker.active or worker.lost:
+                self._halt("target lost")
+                continue
+            timestamp, bbox = worker.bbox_timestamp, worker.bbox
+            if timestamp == self._last_timestamp:
+                continue
+            if time.monotonic() - timestamp > self.timeout:
+                self._halt("stale bbox")
+                continue
+
+            dt = timestamp - self._last_timestamp if self._last_timestamp else 1.0 / self.max_rate
+            self._last_timestamp = timestamp
+            self._step(bbox, timestamp, dt)
+            # Rate limit; updates arriving meanwhile collapse into the newest
+            await asyncio.sleep(1.0 / self.max_rate)
+
+    def _step(self, bbox, timestamp, dt):
+        width = self.camera.current_width
+        x, _, w, _ = bbox
+        self.error = ((x + w / 2) - width / 2) / (width / 2)
+        error = 0.0 if abs(self.error) < self.deadband else self.error
+
+        turn = self.turn_pid.update(error, dt)
+        forward = 0.0
+        if self.target_size:
+            # Only ever approach; backing away is left to the operator
+            forward = max(0.0, self.forward_pid.update(self.target_size - w / width, dt))
+        self.turn = slew(self.turn, turn, self.max_accel * dt)
+        self.forward = slew(self.forward, forward, self.max_accel * dt)
+
+        magnitude = min(1.0, math.hypot(self.turn, self.forward))
+        # aeonbot.ino: angle 0 drives forward, 90 turns right in place
+        angle = math.degrees(math.atan2(self.turn, self.forward)) % 360
+        command = f"joystick:{round(angle)}:{round(magnitude * self.max_speed)}"
+        if magnitude == 0 and not self.driving:
+            return  # already still; QoS 0 repeats only matter while moving
+        self.bridge.submit(command, origin=timestamp)
+        self.driving = magnitude > 0
+        self.last_command = command
+        self.last_latency = time.monotonic() - timestamp
+        self.history.append((timestamp, self.error, self.turn))
+
+    def get_telemetry(self):
+        return {
+            "enabled": self.enabled,
+            "driving": self.driving,
+            "error": round(self.error, 3) if self.error is not None else None,
+            "turn": round(self.turn, 3),
+            "forward": round(self.forward, 3),
+            "last_command": self.last_command,
+            "last_latency_ms": round(self.last_latency * 1000, 1) if self.last_latency is not None else None,
+            "stop_reason": self.stop_reason,
+            "max_rate": self.max_rate,
+            "gains": {"kp": self.turn_pid.kp, "ki": self.turn_pid.ki, "kd": self.turn_pid.kd},
+        }
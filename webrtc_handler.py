@@ -1,60 +1,182 @@
 import asyncio
-from aiortc import RTCPeerConnection, RTCSessionDescription, VideoStreamTrack
-from aiortc.contrib.media import MediaPlayer, MediaRecorder
-from fastapi import WebSocket
+import fractions
 
-class WebRTCStream(VideoStreamTrack):
-    def __init__(self, camera):
+import av
+from aiortc import MediaStreamTrack, RTCPeerConnection, RTCSessionDescription
+from aiortc.mediastreams import MediaStreamError
+from fastapi import WebSocket, WebSocketDisconnect
+
+VIDEO_CLOCK_RATE = 90000
+VIDEO_TIME_BASE = fractions.Fraction(1, VIDEO_CLOCK_RATE)
+
+
+class SharedVideoSource:
+    """
+    Turns raw capture frames from a FrameBus into av.VideoFrames, once per
+    frame no matter how many peers are connected. Timestamps come from the
+    buffer PTS, so frames keep the pacing of the camera. A rebuilt or
+    restarted pipeline starts its PTS near zero again; the output clock is
+    then re-based to carry on from the last frame, so it never goes back.
+    """
+
+    def __init__(self, raw_bus):
+        self.raw_bus = raw_bus
+        self._cached_seq = 0
+        self._cached_frame = None
+        self._origin = None
+        self._last_timestamp = None  # source ns of the last frame
+        self._last_output = 0  # output ns of the last frame
+        self._last_arrival = 0.0
+        self.rebases = 0
+
+    def _timestamp_ns(self, raw_frame):
+        if raw_frame.pts is not None and 0 <= raw_frame.pts < 2 ** 63:
+            return raw_frame.pts
+        return int(raw_frame.timestamp * 1e9)
+
+    def video_frame(self, seq, raw_frame):
+        if seq == self._cached_seq and self._cached_frame is not None:
+            return self._cached_frame
+
+        timestamp = self._timestamp_ns(raw_frame)
+        if self._origin is None:
+            self._origin = timestamp
+        elif timestamp <= self._last_timestamp:
+            # New pipeline: continue from the last output time, advanced by
+            # the wall-clock time between the two frames
+            elapsed = max(1, int((raw_frame.timestamp - self._last_arrival) * 1e9))
+            self._origin = timestamp - (self._last_output + elapsed)
+            self.rebases += 1
+        output = timestamp - self._origin
+        self._last_timestamp = timestamp
+        self._last_output = output
+        self._last_arrival = raw_frame.timestamp
+
+        frame = av.VideoFrame.from_ndarray(raw_frame.array, format="bgr24")
+        frame.pts = output * VIDEO_CLOCK_RATE // 1_000_000_000
+        frame.time_base = VIDEO_TIME_BASE
+
+        self._cached_seq = seq
+        self._cached_frame = frame
+        return frame
+
+
+class WebRTCStream(MediaStreamTrack):
+    """Video track for one peer, always sending the newest capture frame."""
+
+    kind = "video"
+
+    def __init__(self, source):
         super().__init__()
-        self.camera = camera
+        self.source = source
+        self._last_seq, _ = source.raw_bus.latest()
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.last_sent_pts = None
+        # Counts as a viewer, so a lazily started camera begins capturing
+        source.raw_bus.subscribe()
+
+    def stop(self):
+        if self.readyState == "live":
+            self.source.raw_bus.unsubscribe()
+        super().stop()
 
     async def recv(self):
-        frame = await self.camera.get_frame()
-        return frame
+        while True:
+            if self.readyState != "live":
+                raise MediaStreamError
+            seq, raw_frame = await self.source.raw_bus.wait_for_frame_async(self._last_seq, timeout=5)
+            if raw_frame is None:
+                continue
+            if self._last_seq and seq - self._last_seq > 1:
+                self.frames_dropped += seq - self._last_seq - 1
+            self._last_seq = seq
+
+            frame = self.source.video_frame(seq, raw_frame)
+            # Never hand the encoder a timestamp that goes backwards
+            if self.last_sent_pts is not None and frame.pts <= self.last_sent_pts:
+                continue
+            self.last_sent_pts = frame.pts
+            self.frames_sent += 1
+            return frame
+
 
 class WebRTCManager:
-    def __init__(self):
+    def __init__(self, raw_bus):
+        self.source = SharedVideoSource(raw_bus)
         self.pcs = set()
+        self.tracks = {}
+
+    async def create_answer(self, sdp, type="offer"):
+        """Create a peer connection for a remote offer and return its answer."""
+        pc = RTCPeerConnection()
+        self.pcs.add(pc)
+        print("PeerConnection created")
+
+        @pc.on("connectionstatechange")
+        async def on_connectionstatechange():
+            print(f"Connection state changed to {pc.connectionState}")
+            if pc.connectionState in ("failed", "closed"):
+                await self.close(pc)
 
-    async def offer(self, websocket: WebSocket, camera):
+        track = WebRTCStream(self.source)
+        self.tracks[pc] = track
+        pc.addTrack(track)
+
+        await pc.setRemoteDescription(RTCSessionDescription(sdp=sdp, type=type))
+        answer = await pc.createAnswer()
+        await pc.setLocalDescription(answer)
+        return pc, pc.localDescription
+
+    async def offer(self, websocket: WebSocket):
+        """
+        WebSocket signaling: receive the offer SDP as text, send the answer
+        SDP back, and keep the peer connection alive until the socket closes.
+        """
+        pc = None
         try:
             print("WebSocket connection established")
-            pc = RTCPeerConnection()
-            self.pcs.add(pc)
-            print("PeerConnection created")
-
-            @pc.on("iceconnectionstatechange")
-            async def on_iceconnectionstatechange():
-                print(f"ICE connection state changed to {pc.iceConnectionState}")
-                if pc.iceConnectionState == "failed":
-                    print("ICE connection failed, closing PeerConnection")
-                    await pc.close()
-                    self.pcs.discard(pc)
-
-            # Add video track
-            video = WebRTCStream(camera)
-            pc.addTrack(video)
-            print("Video track added")
-
-            # Handle offer
             offer = await websocket.receive_text()
             print("Received offer")
-            await pc.setRemoteDescription(RTCSessionDescription(sdp=offer, type="offer"))
-
-            # Create answer
-            answer = await pc.createAnswer()
-            await pc.setLocalDescription(answer)
-            print("Created answer")
-
-            # Send answer
-            await websocket.send_text(pc.localDescription.sdp)
+            pc, answer = await self.create_answer(offer)
+            await websocket.send_text(answer.sdp)
             print("Sent answer")
 
+            # Any further message or a disconnect ends the session
+            await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
         except Exception as e:
             print(f"WebRTC error: {str(e)}")
-            await websocket.close()
+        finally:
+            if pc is not None:
+                await self.close(pc)
+            try:
+                await websocket.close()
+            except RuntimeError:
+                pass
+
+    async def close(self, pc):
+        if pc not in self.pcs:
+            return
+        self.pcs.discard(pc)
+        track = self.tracks.pop(pc, None)
+        if track is not None:
+            track.stop()
+        await pc.close()
 
     async def cleanup(self):
-        for pc in self.pcs:
-            await pc.close()
-        self.pcs.clear() 
\ No newline at end of file
+        await asyncio.gather(*(self.close(pc) for pc in list(self.pcs)))
+
+    def get_telemetry(self):
+        return {
+            "peers": len(self.pcs),
+            "tracks": [
+                {
+                    "state": pc.connectionState,
+                    "frames_sent": track.frames_sent,
+                    "frames_dropped": track.frames_dropped,
+                }
+                for pc, track in list(self.tracks.items())
+            ],
+        }